@@ -19,10 +19,16 @@ Module dedicated functions/classes dealing with rate limiting requests.
 
 import collections
 import copy
+import fcntl
+import hashlib
 import math
+import mmap
+import os
 import re
+import struct
 import time
 
+from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import importutils
 from six.moves import http_client
@@ -32,10 +38,11 @@ import webob.exc
 from cinder.api.openstack import wsgi
 from cinder.api.views import limits as limits_views
 from cinder.api import xmlutil
-from cinder.i18n import _
+from cinder.i18n import _, _LW
 from cinder import quota
 from cinder.wsgi import common as base_wsgi
 
+LOG = logging.getLogger(__name__)
 QUOTAS = quota.QUOTAS
 LIMITS_PREFIX = "limits."
 
@@ -148,35 +155,49 @@ class Limit(object):
         @param verb: string http verb (POST, GET, etc.)
         @param url: string URL
         """
-        if self.verb != verb or not re.match(self.regex, url):
+        if not self.matches(verb, url):
             return
 
-        now = self._get_time()
+        self.water_level, self.last_request, delay = self.update(
+            self.water_level, self.last_request, self._get_time())
+        return delay
 
-        if self.last_request is None:
-            self.last_request = now
+    def matches(self, verb, url):
+        """Whether a request with verb to url counts against this limit."""
+        return self.verb == verb and re.match(self.regex, url) is not None
 
-        leak_value = now - self.last_request
+    def update(self, water_level, last_request, now):
+        """Account for a request made at now in a bucket of this limit.
 
-        self.water_level -= leak_value
-        self.water_level = max(self.water_level, 0)
-        self.water_level += self.request_value
+        @param water_level: Water level of the bucket
+        @param last_request: Time of the last request of the bucket, or None
+        @param now: Time of the request
+        @return: Tuple of the new water level and time of the last request
+                 of the bucket, and of the delay before the request can be
+                 made (None if it can be made now)
+        """
+        if last_request is None:
+            last_request = now
+
+        leak_value = now - last_request
 
-        difference = self.water_level - self.capacity
+        water_level -= leak_value
+        water_level = max(water_level, 0)
+        water_level += self.request_value
 
-        self.last_request = now
+        difference = water_level - self.capacity
 
         if difference > 0:
-            self.water_level -= self.request_value
+            water_level -= self.request_value
             self.next_request = now + difference
-            return difference
+            return water_level, now, difference
 
         cap = self.capacity
-        water = self.water_level
         val = self.value
 
-        self.remaining = math.floor(((cap - water) / cap) * val)
+        self.remaining = math.floor(((cap - water_level) / cap) * val)
         self.next_request = now
+        return water_level, now, None
 
     def _get_time(self):
         """Retrieve the current time. Broken out for testability."""
@@ -213,7 +234,8 @@ DEFAULT_LIMITS = [
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """Rate-limits requests passing through this middleware.
 
-    All limit information is stored in memory for this implementation.
+    Limit information is stored in memory unless a limiter sharing it
+    between processes, such as `SharedMemoryLimiter`, is selected.
     """
 
     def __init__(self, application, limits=None, limiter=None, **kwargs):
@@ -369,6 +391,210 @@ class Limiter(object):
         return result
 
 
+class LocalBucketTable(object):
+    """Buckets of the limits of a single process.
+
+    Updates are not locked: they do not yield to other green threads.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+
+    def update(self, key, limit, now):
+        """Account for a request in the bucket key of limit.
+
+        @return: Delay before the request can be made, None if it can be
+                 made now
+        """
+        water_level, last_request = self._buckets.get(key, (0, None))
+        water_level, last_request, delay = limit.update(water_level,
+                                                        last_request, now)
+        self._buckets[key] = (water_level, last_request)
+        return delay
+
+
+class SharedBucketTable(object):
+    """Buckets of the limits shared by the processes of a host.
+
+    The buckets are kept in a table of fixed size slots in a memory mapped
+    file. A slot holds a hash of the bucket key, its water level and the
+    time of its last request, and is found by open addressing from the hash
+    of the key. Slots of drained buckets are reused by other keys. Updates
+    hold a POSIX record lock on the table, which excludes the other
+    processes using the file.
+    """
+
+    SLOT = struct.Struct('=Qdd')
+    PROBES = 8
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.slots = int(slots)
+        self.size = self.SLOT.size * self.slots
+        self._hashes = {}
+        self._pid = None
+        self._fd = None
+
+    def _open(self):
+        # Descriptors inherited from a parent process are not used, so that
+        # each worker holds its own locks.
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self._fd = fd
+        self._pid = os.getpid()
+        self._map = mmap.mmap(fd, self.size)
+
+    def _read_slot(self, offset):
+        return self.SLOT.unpack_from(self._map, offset)
+
+    def _write_slot(self, offset, key_hash, water_level, last_request):
+        self.SLOT.pack_into(self._map, offset, key_hash, water_level,
+                            last_request)
+
+    def _hash(self, key):
+        key_hash = self._hashes.get(key)
+        if key_hash is None:
+            digest = hashlib.md5(key.encode('utf-8')).digest()
+            # 0 marks free slots
+            key_hash = struct.unpack('=Q', digest[:8])[0] or 1
+            self._hashes[key] = key_hash
+        return key_hash
+
+    def update(self, key, limit, now):
+        """Account for a request in the bucket key of limit.
+
+        @return: Delay before the request can be made, None if it can be
+                 made now
+        """
+        if self._pid != os.getpid():
+            self._open()
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            free = None
+            for probe in range(self.PROBES):
+                offset = ((start + probe) % self.slots) * self.SLOT.size
+                slot_hash, water_level, last_request = self._read_slot(offset)
+                if slot_hash == key_hash:
+                    break
+                if free is None and (not slot_hash or
+                                     water_level <= now - last_request):
+                    free = offset
+            else:
+                if free is None:
+                    LOG.warning(_LW('Rate limit table %s is full, requests '
+                                    'are not limited.'), self.path)
+                    return None
+                offset = free
+                water_level, last_request = 0, None
+
+            water_level, last_request, delay = limit.update(water_level,
+                                                            last_request, now)
+            self._write_slot(offset, key_hash, water_level, last_request)
+            return delay
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+class FileBucketTable(SharedBucketTable):
+    """Buckets of the limits shared through a file.
+
+    Same table as `SharedBucketTable`, read and written with system calls
+    instead of being memory mapped, for file systems where shared mappings
+    are not coherent between the hosts or processes using the file.
+    """
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def _read_slot(self, offset):
+        os.lseek(self._fd, offset, os.SEEK_SET)
+        return self.SLOT.unpack(os.read(self._fd, self.SLOT.size))
+
+    def _write_slot(self, offset, key_hash, water_level, last_request):
+        os.lseek(self._fd, offset, os.SEEK_SET)
+        os.write(self._fd, self.SLOT.pack(key_hash, water_level,
+                                          last_request))
+
+
+class BucketLimiter(Limiter):
+    """Rate-limit checking class which keeps the buckets in a table.
+
+    The `Limit` objects of the users only hold the rates to display, the
+    water levels are kept by the table, one bucket per user and limit.
+    """
+
+    def __init__(self, limits, **kwargs):
+        super(BucketLimiter, self).__init__(limits, **kwargs)
+        self.table = self._create_table(**kwargs)
+
+    def _create_table(self, **kwargs):
+        return LocalBucketTable()
+
+    def check_for_delay(self, verb, url, username=None):
+        """Check the given verb/user/user triplet for limit.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        delays = []
+        now = None
+
+        for index, limit in enumerate(self.levels[username]):
+            if not limit.matches(verb, url):
+                continue
+            if now is None:
+                now = limit._get_time()
+            key = '%s/%d' % (username, index)
+            delay = self.table.update(key, limit, now)
+            if delay:
+                delays.append((delay, limit.error_message))
+
+        if delays:
+            delays.sort()
+            return delays[0]
+
+        return None, None
+
+
+class SharedMemoryLimiter(BucketLimiter):
+    """Rate-limit checking class shared by the API workers of a host.
+
+    Set ``limiter = cinder.api.v2.limits.SharedMemoryLimiter`` in the
+    ratelimit filter of api-paste.ini. ``limiter_path`` and
+    ``limiter_slots`` set the file in shared memory holding the buckets
+    and its number of slots.
+    """
+
+    DEFAULT_PATH = '/dev/shm/cinder-api-limits'
+
+    def _create_table(self, limiter_path=None, limiter_slots=4096,
+                      **kwargs):
+        return SharedBucketTable(limiter_path or self.DEFAULT_PATH,
+                                 limiter_slots)
+
+
+class FileLimiter(BucketLimiter):
+    """Rate-limit checking class sharing the buckets through a file.
+
+    ``limiter_path`` is the file holding the buckets, ``limiter_slots`` its
+    number of slots.
+    """
+
+    def _create_table(self, limiter_path=None, limiter_slots=4096,
+                      **kwargs):
+        if not limiter_path:
+            raise ValueError("limiter_path must be set to use a "
+                             "FileLimiter")
+        return FileBucketTable(limiter_path, limiter_slots)
+
+
 class WsgiLimiter(object):
     """Rate-limit checking from a WSGI application.
 
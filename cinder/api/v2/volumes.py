@@ -249,12 +249,16 @@ class VolumeController(wsgi.Controller):
             except (ValueError, SyntaxError):
                 LOG.debug('Could not evaluate value %s, assuming string', v)
 
+        # The summary view only shows the id and name of the volumes, so
+        # none of their relationships need to be loaded for it.
+        columns_to_join = None if is_detail else []
         volumes = self.volume_api.get_all(context, marker, limit,
                                           sort_keys=sort_keys,
                                           sort_dirs=sort_dirs,
                                           filters=filters,
                                           viewable_admin_meta=True,
-                                          offset=offset)
+                                          offset=offset,
+                                          columns_to_join=columns_to_join)
 
         volumes = [dict(vol) for vol in volumes]
 
@@ -22,11 +22,16 @@
 """
 
 import abc
+import collections
 import hashlib
 import json
 import os
+import sys
 
 import eventlet
+from eventlet import queue
+from eventlet import semaphore
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_service import loopingcall
@@ -46,12 +51,116 @@ chunkedbackup_service_opts = [
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
                help='Compression algorithm (None to disable)'),
+    cfg.IntOpt('backup_chunk_workers',
+               default=1,
+               help='Number of backup chunks that are hashed, compressed '
+                    'and written to the backup repository concurrently. '
+                    'A value of 1 processes one chunk at a time.'),
+    cfg.IntOpt('backup_chunk_queue_depth',
+               default=2,
+               help='Number of chunks read from the volume ahead of the '
+                    'chunk workers when backup_chunk_workers is greater '
+                    'than 1.'),
+    cfg.IntOpt('backup_chunk_max_inflight_bytes',
+               default=512 * units.Mi,
+               help='Maximum amount of chunk data, in bytes, held in memory '
+                    'by the backup chunk workers and their queue. At least '
+                    'one chunk is always allowed in flight.'),
+    cfg.IntOpt('backup_restore_prefetch_depth',
+               default=1,
+               help='Number of backup objects fetched and decompressed '
+                    'concurrently ahead of the one being written to the '
+                    'volume during a restore. A value of 1 restores one '
+                    'object at a time.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(chunkedbackup_service_opts)
 
 
+class _ChunkPipeline(object):
+    """Bounded pipeline processing backup chunks concurrently.
+
+       The caller is the reader stage and feeds chunks through submit().
+       A fixed number of worker greenthreads take them off a bounded queue
+       and run the process function on them. The number of chunks held in
+       the queue and by the workers is capped by max_inflight. The first
+       worker failure is re-raised to the reader on its next submit() or
+       on wait().
+    """
+
+    def __init__(self, process, workers, queue_depth, max_inflight):
+        self._process = process
+        self._workers = workers
+        self._queue = queue.LightQueue(max(1, queue_depth))
+        self._inflight = semaphore.Semaphore(max(1, max_inflight))
+        self._exc_info = None
+        self._stopped = False
+        self._pool = eventlet.GreenPool(workers)
+        for _i in range(workers):
+            self._pool.spawn_n(self._worker)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                # Once a chunk has failed the backup is lost, so only drain
+                # the queue.
+                if self._exc_info is None:
+                    self._process(*job)
+            except Exception:
+                if self._exc_info is None:
+                    self._exc_info = sys.exc_info()
+            finally:
+                self._inflight.release()
+
+    def _reraise(self):
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+
+    def submit(self, *job):
+        self._reraise()
+        self._inflight.acquire()
+        self._queue.put(job)
+
+    def wait(self, reraise=True):
+        """Wait for all submitted chunks and stop the workers."""
+        if not self._stopped:
+            self._stopped = True
+            for _i in range(self._workers):
+                self._queue.put(None)
+            self._pool.waitall()
+        if reraise:
+            self._reraise()
+
+
+def _prefetch(func, items, depth):
+    """Yield func(item) for each item, in order, computing ahead.
+
+       Up to depth calls run in their own greenthreads while the caller
+       consumes earlier results, so at most depth results are held at any
+       time. Exceptions are raised when the failed result is reached.
+    """
+    if depth <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pending = collections.deque()
+    try:
+        for item in items:
+            pending.append(eventlet.spawn(func, item))
+            if len(pending) >= depth:
+                yield pending.popleft().wait()
+        while pending:
+            yield pending.popleft().wait()
+    finally:
+        for thread in pending:
+            thread.kill()
+
+
 @six.add_metaclass(abc.ABCMeta)
 class ChunkedBackupDriver(driver.BackupDriver):
     """Abstract chunked backup driver.
@@ -99,6 +208,10 @@ class ChunkedBackupDriver(driver.BackupDriver):
         self.compressor = \
             self._get_compressor(CONF.backup_compression_algorithm)
         self.support_force_delete = True
+        self.chunk_workers = CONF.backup_chunk_workers
+        self.chunk_queue_depth = CONF.backup_chunk_queue_depth
+        self.chunk_max_inflight_bytes = CONF.backup_chunk_max_inflight_bytes
+        self.restore_prefetch_depth = CONF.backup_restore_prefetch_depth
 
     # To create your own "chunked" backup driver, implement the following
     # abstract methods.
@@ -295,8 +408,15 @@ class ChunkedBackupDriver(driver.BackupDriver):
                 volume_size_bytes)
 
     def _backup_chunk(self, backup, container, data, data_offset,
-                      object_meta, extra_metadata):
-        """Backup data chunk based on the object metadata and offset."""
+                      object_meta, extra_metadata, pipeline=None,
+                      shalist=None):
+        """Backup data chunk based on the object metadata and offset.
+
+           The chunk's entry is added to the object list straight away so
+           that the list keeps the order of the volume data. When a pipeline
+           is given, compressing and writing the chunk is left to it; the
+           entry and the optional shalist are then filled in by the worker.
+        """
         object_prefix = object_meta['prefix']
         object_list = object_meta['list']
 
@@ -306,31 +426,98 @@ class ChunkedBackupDriver(driver.BackupDriver):
         obj[object_name] = {}
         obj[object_name]['offset'] = data_offset
         obj[object_name]['length'] = len(data)
+        object_list.append(obj)
+        object_id += 1
+        object_meta['list'] = object_list
+        object_meta['id'] = object_id
+
+        if pipeline is not None:
+            pipeline.submit(container, object_name, obj[object_name], data,
+                            extra_metadata, shalist)
+            return
+
+        self._write_chunk(container, object_name, obj[object_name], data,
+                          extra_metadata)
+
+        LOG.debug('Calling eventlet.sleep(0)')
+        eventlet.sleep(0)
+
+    def _write_chunk(self, container, object_name, object_info, data,
+                     extra_metadata, shalist=None, offload=False):
+        """Compress and write a chunk, recording how it was stored.
+
+           With offload set, hashing and compression run on native threads
+           so that several chunks can use separate CPUs at the same time.
+        """
         LOG.debug('Backing up chunk of data from volume.')
-        algorithm, output_data = self._prepare_output_data(data)
-        obj[object_name]['compression'] = algorithm
+        if shalist is not None:
+            if offload:
+                shalist.extend(tpool.execute(self._calculate_sha, data))
+            else:
+                shalist.extend(self._calculate_sha(data))
+        algorithm, output_data = self._prepare_output_data(data,
+                                                           offload=offload)
+        object_info['compression'] = algorithm
         LOG.debug('About to put_object')
         with self.get_object_writer(
                 container, object_name, extra_metadata=extra_metadata
         ) as writer:
             writer.write(output_data)
-        md5 = hashlib.md5(data).hexdigest()
-        obj[object_name]['md5'] = md5
+        if offload:
+            md5 = tpool.execute(self._calculate_md5, data)
+        else:
+            md5 = self._calculate_md5(data)
+        object_info['md5'] = md5
         LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
                   {'object_name': object_name, 'md5': md5})
-        object_list.append(obj)
-        object_id += 1
-        object_meta['list'] = object_list
-        object_meta['id'] = object_id
-
-        LOG.debug('Calling eventlet.sleep(0)')
-        eventlet.sleep(0)
 
-    def _prepare_output_data(self, data):
+    def _process_chunk(self, container, object_name, object_info, data,
+                       extra_metadata, shalist):
+        """Pipeline worker stage for a single chunk."""
+        self._write_chunk(container, object_name, object_info, data,
+                          extra_metadata, shalist=shalist, offload=True)
+
+    def _create_pipeline(self):
+        """Return a chunk pipeline, or None when chunks are done serially."""
+        if self.chunk_workers <= 1:
+            return None
+        max_inflight = self.chunk_max_inflight_bytes // self.chunk_size_bytes
+        LOG.debug('Using backup chunk pipeline with %(workers)d workers, '
+                  'queue depth %(depth)d and %(inflight)d chunks in flight.',
+                  {'workers': self.chunk_workers,
+                   'depth': self.chunk_queue_depth,
+                   'inflight': max(1, max_inflight)})
+        return _ChunkPipeline(self._process_chunk, self.chunk_workers,
+                              self.chunk_queue_depth, max_inflight)
+
+    @staticmethod
+    def _calculate_md5(data):
+        return hashlib.md5(data).hexdigest()
+
+    def _calculate_sha(self, data):
+        """Calculate SHA256 of a data chunk, one per sha block."""
+        shalist = []
+        off = 0
+        datalen = len(data)
+        while off < datalen:
+            chunk_start = off
+            chunk_end = chunk_start + self.sha_block_size_bytes
+            if chunk_end > datalen:
+                chunk_end = datalen
+            chunk = data[chunk_start:chunk_end]
+            sha = hashlib.sha256(chunk).hexdigest()
+            shalist.append(sha)
+            off += self.sha_block_size_bytes
+        return shalist
+
+    def _prepare_output_data(self, data, offload=False):
         if self.compressor is None:
             return 'none', data
         data_size_bytes = len(data)
-        compressed_data = self.compressor.compress(data)
+        if offload:
+            compressed_data = tpool.execute(self.compressor.compress, data)
+        else:
+            compressed_data = self.compressor.compress(data)
         comp_size_bytes = len(compressed_data)
         algorithm = CONF.backup_compression_algorithm.lower()
         if comp_size_bytes >= data_size_bytes:
@@ -461,87 +648,113 @@ class ChunkedBackupDriver(driver.BackupDriver):
             timer.start(interval=self.backup_timer_interval)
 
         sha256_list = object_sha256['sha256s']
+        # With the chunk pipeline, full backup chunks are hashed by the
+        # workers; each chunk gets its own list so that the order of the
+        # hashes does not depend on which worker finishes first.
+        pending_shas = []
+        pipeline = self._create_pipeline()
         shaindex = 0
         is_backup_canceled = False
-        while True:
-            # First of all, we check the status of this backup. If it
-            # has been changed to delete or has been deleted, we cancel the
-            # backup process to do forcing delete.
-            backup = objects.Backup.get_by_id(self.context, backup.id)
-            if 'deleting' == backup.status or 'deleted' == backup.status:
-                is_backup_canceled = True
-                # To avoid the chunk left when deletion complete, need to
-                # clean up the object of chunk again.
-                self.delete(backup)
-                LOG.debug('Cancel the backup process of %s.', backup.id)
-                break
-            data_offset = volume_file.tell()
-            data = volume_file.read(self.chunk_size_bytes)
-            if data == b'':
-                break
-
-            # Calculate new shas with the datablock.
-            shalist = []
-            off = 0
-            datalen = len(data)
-            while off < datalen:
-                chunk_start = off
-                chunk_end = chunk_start + self.sha_block_size_bytes
-                if chunk_end > datalen:
-                    chunk_end = datalen
-                chunk = data[chunk_start:chunk_end]
-                sha = hashlib.sha256(chunk).hexdigest()
-                shalist.append(sha)
-                off += self.sha_block_size_bytes
-            sha256_list.extend(shalist)
-
-            # If parent_backup is not None, that means an incremental
-            # backup will be performed.
-            if parent_backup:
-                # Find the extent that needs to be backed up.
-                extent_off = -1
-                for idx, sha in enumerate(shalist):
-                    if sha != parent_backup_shalist[shaindex]:
-                        if extent_off == -1:
-                            # Start of new extent.
-                            extent_off = idx * self.sha_block_size_bytes
+        try:
+            while True:
+                # First of all, we check the status of this backup. If it
+                # has been changed to delete or has been deleted, we cancel
+                # the backup process to do forcing delete.
+                backup = objects.Backup.get_by_id(self.context, backup.id)
+                if 'deleting' == backup.status or 'deleted' == backup.status:
+                    is_backup_canceled = True
+                    # Let chunks already handed to the pipeline land before
+                    # cleaning up so that none of them is left behind.
+                    if pipeline is not None:
+                        pipeline.wait(reraise=False)
+                        pipeline = None
+                    # To avoid the chunk left when deletion complete, need to
+                    # clean up the object of chunk again.
+                    self.delete(backup)
+                    LOG.debug('Cancel the backup process of %s.', backup.id)
+                    break
+                data_offset = volume_file.tell()
+                data = volume_file.read(self.chunk_size_bytes)
+                if data == b'':
+                    break
+
+                # If parent_backup is not None, that means an incremental
+                # backup will be performed.
+                if parent_backup:
+                    # Calculate new shas with the datablock.
+                    if pipeline is not None:
+                        shalist = tpool.execute(self._calculate_sha, data)
                     else:
-                        if extent_off != -1:
-                            # We've reached the end of extent.
-                            extent_end = idx * self.sha_block_size_bytes
-                            segment = data[extent_off:extent_end]
-                            self._backup_chunk(backup, container, segment,
-                                               data_offset + extent_off,
-                                               object_meta,
-                                               extra_metadata)
-                            extent_off = -1
-                    shaindex += 1
-
-                # The last extent extends to the end of data buffer.
-                if extent_off != -1:
-                    extent_end = datalen
-                    segment = data[extent_off:extent_end]
-                    self._backup_chunk(backup, container, segment,
-                                       data_offset + extent_off,
-                                       object_meta, extra_metadata)
+                        shalist = self._calculate_sha(data)
+                    sha256_list.extend(shalist)
+
+                    # Find the extent that needs to be backed up.
+                    datalen = len(data)
                     extent_off = -1
-            else:  # Do a full backup.
-                self._backup_chunk(backup, container, data, data_offset,
-                                   object_meta, extra_metadata)
-
-            # Notifications
-            total_block_sent_num += self.data_block_num
-            counter += 1
-            if counter == self.data_block_num:
-                # Send the notification to Ceilometer when the chunk
-                # number reaches the data_block_num.  The backup percentage
-                # is put in the metadata as the extra information.
-                self._send_progress_notification(self.context, backup,
-                                                 object_meta,
-                                                 total_block_sent_num,
-                                                 volume_size_bytes)
-                # Reset the counter
-                counter = 0
+                    for idx, sha in enumerate(shalist):
+                        if sha != parent_backup_shalist[shaindex]:
+                            if extent_off == -1:
+                                # Start of new extent.
+                                extent_off = idx * self.sha_block_size_bytes
+                        else:
+                            if extent_off != -1:
+                                # We've reached the end of extent.
+                                extent_end = idx * self.sha_block_size_bytes
+                                segment = data[extent_off:extent_end]
+                                self._backup_chunk(backup, container, segment,
+                                                   data_offset + extent_off,
+                                                   object_meta,
+                                                   extra_metadata,
+                                                   pipeline=pipeline)
+                                extent_off = -1
+                        shaindex += 1
+
+                    # The last extent extends to the end of data buffer.
+                    if extent_off != -1:
+                        extent_end = datalen
+                        segment = data[extent_off:extent_end]
+                        self._backup_chunk(backup, container, segment,
+                                           data_offset + extent_off,
+                                           object_meta, extra_metadata,
+                                           pipeline=pipeline)
+                        extent_off = -1
+                elif pipeline is not None:  # Do a pipelined full backup.
+                    shalist = []
+                    pending_shas.append(shalist)
+                    self._backup_chunk(backup, container, data, data_offset,
+                                       object_meta, extra_metadata,
+                                       pipeline=pipeline, shalist=shalist)
+                else:  # Do a full backup.
+                    sha256_list.extend(self._calculate_sha(data))
+                    self._backup_chunk(backup, container, data, data_offset,
+                                       object_meta, extra_metadata)
+
+                # Notifications
+                total_block_sent_num += self.data_block_num
+                counter += 1
+                if counter == self.data_block_num:
+                    # Send the notification to Ceilometer when the chunk
+                    # number reaches the data_block_num.  The backup
+                    # percentage is put in the metadata as the extra
+                    # information.
+                    self._send_progress_notification(self.context, backup,
+                                                     object_meta,
+                                                     total_block_sent_num,
+                                                     volume_size_bytes)
+                    # Reset the counter
+                    counter = 0
+
+            if pipeline is not None:
+                pipeline.wait()
+                pipeline = None
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                timer.stop()
+                if pipeline is not None:
+                    pipeline.wait(reraise=False)
+
+        for shalist in pending_shas:
+            sha256_list.extend(shalist)
 
         # Stop the timer.
         timer.stop()
@@ -586,7 +799,9 @@ class ChunkedBackupDriver(driver.BackupDriver):
                     'does not match object list stored in metadata.')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
+        offload = self.restore_prefetch_depth > 1
+
+        def _fetch_object(metadata_object):
             object_name, obj = list(metadata_object.items())[0]
             LOG.debug('restoring object. backup: %(backup_id)s, '
                       'container: %(container)s, object name: '
@@ -604,14 +819,21 @@ class ChunkedBackupDriver(driver.BackupDriver):
                 body = reader.read()
             compression_algorithm = metadata_object[object_name]['compression']
             decompressor = self._get_compressor(compression_algorithm)
-            volume_file.seek(obj['offset'])
             if decompressor is not None:
                 LOG.debug('decompressing data using %s algorithm',
                           compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
-            else:
-                volume_file.write(body)
+                if offload:
+                    body = tpool.execute(decompressor.decompress, body)
+                else:
+                    body = decompressor.decompress(body)
+            return obj, body
+
+        # Objects are fetched and decompressed ahead of time, but written
+        # here one at a time so that only this thread touches volume_file.
+        for obj, data in _prefetch(_fetch_object, metadata_objects,
+                                   self.restore_prefetch_depth):
+            volume_file.seek(obj['offset'])
+            volume_file.write(data)
 
             # force flush every write to avoid long blocking write on close
             volume_file.flush()
@@ -670,12 +892,12 @@ class ChunkedBackupDriver(driver.BackupDriver):
             current_backup = prev_backup
 
         # Do a full restore first, then layer the incremental backups
-        # on top of it in order.
-        index = len(backup_list) - 1
-        while index >= 0:
-            backup1 = backup_list[index]
-            index = index - 1
-            metadata = self._read_metadata(backup1)
+        # on top of it in order. The metadata of the later backups in the
+        # chain is read while the earlier ones are being restored.
+        backup_list.reverse()
+        metadata_list = _prefetch(self._read_metadata, backup_list,
+                                  self.restore_prefetch_depth)
+        for backup1, metadata in six.moves.zip(backup_list, metadata_list):
             restore_func(backup1, volume_id, metadata, volume_file)
 
             volume_meta = metadata.get('volume_meta', None)
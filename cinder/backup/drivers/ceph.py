@@ -42,13 +42,16 @@ was deemed the safest action to take. It is therefore recommended to always
 restore to a new volume (default).
 """
 
+import errno
 import fcntl
 import os
 import re
+import stat
 import subprocess
 import time
 
 import eventlet
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -88,12 +91,44 @@ service_opts = [
                help='RBD stripe count to use when creating a backup image.'),
     cfg.BoolOpt('restore_discard_excess_bytes', default=True,
                 help='If True, always discard excess bytes when restoring '
-                     'volumes i.e. pad with zeroes.')
+                     'volumes i.e. pad with zeroes.'),
+    cfg.BoolOpt('backup_ceph_sparse_transfer', default=False,
+                help='If True, full backups and restores only copy the '
+                     'extents of the source which hold data, skipping '
+                     'unallocated ranges and ranges of zeroes, and punch '
+                     'holes in the destination for the skipped ranges on '
+                     'restore. Reads and writes are overlapped.'),
+    cfg.IntOpt('backup_ceph_connection_pool_size', default=0,
+               help='Maximum number of idle connections to the backup Ceph '
+                    'cluster kept open for each pool, to be reused by later '
+                    'backups and restores. Set to 0 to disable connection '
+                    'pooling.'),
+    cfg.IntOpt('backup_ceph_connection_pool_idle_timeout', default=300,
+               help='Number of seconds after which an idle pooled '
+                    'connection to the backup Ceph cluster is closed.')
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
 
+# lseek() whence values to find the data extents of sparse files, which
+# Python 2 does not define.
+SEEK_DATA = getattr(os, 'SEEK_DATA', 3)
+SEEK_HOLE = getattr(os, 'SEEK_HOLE', 4)
+
+# NOTE: the backup manager creates a driver for every request, so pooled
+# connections are kept at the module level to outlive the drivers.
+_rados_pool = None
+
+
+def _get_rados_pool():
+    global _rados_pool
+    if _rados_pool is None and CONF.backup_ceph_connection_pool_size > 0:
+        _rados_pool = rbd_driver.RADOSConnectionPool(
+            CONF.backup_ceph_connection_pool_size,
+            CONF.backup_ceph_connection_pool_idle_timeout)
+    return _rados_pool
+
 
 class VolumeMetadataBackup(object):
 
@@ -234,20 +269,33 @@ class CephBackupDriver(driver.BackupDriver):
 
     def _connect_to_rados(self, pool=None):
         """Establish connection to the backup Ceph cluster."""
+        pool_to_open = utils.convert_str(pool or self._ceph_backup_pool)
+        rados_pool = _get_rados_pool()
+        if rados_pool is not None:
+            key = (self._ceph_backup_user, self._ceph_backup_conf,
+                   pool_to_open)
+            return rados_pool.get(key, self._open_rados_connection,
+                                  pool_to_open)
+        return self._open_rados_connection(pool_to_open)
+
+    def _open_rados_connection(self, pool):
         client = self.rados.Rados(rados_id=self._ceph_backup_user,
                                   conffile=self._ceph_backup_conf)
         try:
             client.connect()
-            pool_to_open = utils.convert_str(pool or self._ceph_backup_pool)
-            ioctx = client.open_ioctx(pool_to_open)
+            ioctx = client.open_ioctx(pool)
             return client, ioctx
         except self.rados.Error:
             # shutdown cannot raise an exception
             client.shutdown()
             raise
 
-    def _disconnect_from_rados(self, client, ioctx):
+    def _disconnect_from_rados(self, client, ioctx, discard=False):
         """Terminate connection with the backup Ceph cluster."""
+        rados_pool = _get_rados_pool()
+        if rados_pool is not None:
+            rados_pool.put(client, ioctx, discard=discard)
+            return
         # closing an ioctx cannot raise an exception
         ioctx.close()
         client.shutdown()
@@ -281,7 +329,7 @@ class CephBackupDriver(driver.BackupDriver):
             if self._file_is_rbd(volume):
                 volume.rbd_image.discard(offset, length)
             else:
-                zeroes = '\0' * length
+                zeroes = b'\0' * self.chunk_size
                 chunks = int(length / self.chunk_size)
                 for chunk in range(0, chunks):
                     LOG.debug("Writing zeroes chunk %d", chunk)
@@ -292,12 +340,22 @@ class CephBackupDriver(driver.BackupDriver):
 
                 rem = int(length % self.chunk_size)
                 if rem:
-                    zeroes = '\0' * rem
+                    zeroes = b'\0' * rem
                     volume.write(zeroes)
                     volume.flush()
 
-    def _transfer_data(self, src, src_name, dest, dest_name, length):
-        """Transfer data between files (Python IO objects)."""
+    def _transfer_data(self, src, src_name, dest, dest_name, length,
+                       dest_is_zeroed=False):
+        """Transfer data between files (Python IO objects).
+
+        dest_is_zeroed tells that dest reads as zeroes, e.g. because it was
+        just created, so that ranges of zeroes need not be written to it.
+        """
+        if CONF.backup_ceph_sparse_transfer:
+            self._transfer_data_sparse(src, src_name, dest, dest_name, length,
+                                       dest_is_zeroed)
+            return
+
         LOG.debug("Transferring data between '%(src)s' and '%(dest)s'",
                   {'src': src_name, 'dest': dest_name})
 
@@ -343,6 +401,139 @@ class CephBackupDriver(driver.BackupDriver):
                 # yield to any other pending backups
                 eventlet.sleep(0)
 
+    @staticmethod
+    def _get_file_data_extents(fd, length):
+        """Return the (offset, length) extents of a file holding data."""
+        extents = []
+        offset = 0
+        try:
+            while offset < length:
+                try:
+                    start = os.lseek(fd, offset, SEEK_DATA)
+                except OSError as e:
+                    # There is no data past offset
+                    if e.errno == errno.ENXIO:
+                        break
+                    raise
+                if start >= length:
+                    break
+                end = min(os.lseek(fd, start, SEEK_HOLE), length)
+                extents.append((start, end - start))
+                offset = end
+        except OSError:
+            LOG.debug("SEEK_DATA/SEEK_HOLE not supported, reading the whole "
+                      "file.")
+            return [(0, length)]
+        return extents
+
+    def _get_data_extents(self, src, length):
+        """Return the extents of src which may hold data, and its length.
+
+        The extents are (offset, length) tuples; ranges outside of them read
+        as zeroes: unallocated extents of RBD images and holes of sparse
+        files. Sources which cannot tell are returned as a single extent. The
+        length returned is the smallest of length and of the size of src, if
+        known.
+        """
+        if self._file_is_rbd(src):
+            length = min(length, src.rbd_image.size())
+            extents = []
+
+            def _add_extent(offset, extent_length, exists):
+                if not exists:
+                    return
+                if extents and sum(extents[-1]) == offset:
+                    offset, extent_length = (extents[-1][0],
+                                             extents[-1][1] + extent_length)
+                    extents.pop()
+                extents.append((offset, extent_length))
+
+            try:
+                src.rbd_image.diff_iterate(0, length, None, _add_extent)
+            except AttributeError:
+                LOG.debug("diff_iterate not supported by this version of "
+                          "librbd, reading the whole image.")
+                return [(0, length)], length
+            return extents, length
+
+        try:
+            fd = src.fileno()
+        except (AttributeError, EnvironmentError, ValueError):
+            return [(0, length)], length
+        src_stat = os.fstat(fd)
+        if stat.S_ISREG(src_stat.st_mode):
+            length = min(length, src_stat.st_size)
+        return self._get_file_data_extents(fd, length), length
+
+    def _transfer_data_sparse(self, src, src_name, dest, dest_name, length,
+                              dest_is_zeroed):
+        """Transfer the data extents of src to dest.
+
+        Chunks of zeroes are not written; unless dest_is_zeroed they, and
+        the ranges of src without data, are discarded from dest instead. The
+        next chunk is read while the current one is written and dest is only
+        flushed once at the end.
+        """
+        LOG.debug("Transferring data extents between '%(src)s' and "
+                  "'%(dest)s'", {'src': src_name, 'dest': dest_name})
+
+        extents, src_end = self._get_data_extents(src, length)
+        chunks = []
+        for offset, extent_length in extents:
+            end = offset + extent_length
+            chunks.extend((chunk_offset,
+                           min(self.chunk_size, end - chunk_offset))
+                          for chunk_offset in range(offset, end,
+                                                    self.chunk_size))
+        LOG.debug("%(chunks)s chunks holding data out of %(length)s bytes to "
+                  "be transferred", {'chunks': len(chunks), 'length': length})
+
+        def _read(offset, size):
+            src.seek(offset)
+            return src.read(size)
+
+        def _write(offset, data):
+            dest.seek(offset)
+            dest.write(data)
+
+        def _discard(offset, end):
+            if not dest_is_zeroed and end > offset:
+                dest.seek(offset)
+                self._discard_bytes(dest, offset, end - offset)
+
+        # Start of the range of zeroes not written to dest yet
+        zeroes_from = 0
+        transferred = 0
+        pending = None
+        if chunks:
+            pending = eventlet.spawn(tpool.execute, _read, *chunks[0])
+        for index, (offset, size) in enumerate(chunks):
+            data = pending.wait()
+            end_of_src = len(data) < size
+            if end_of_src:
+                src_end = offset + len(data)
+            elif index + 1 < len(chunks):
+                pending = eventlet.spawn(tpool.execute, _read,
+                                         *chunks[index + 1])
+
+            if data and data.count(b'\0') != len(data):
+                _discard(zeroes_from, offset)
+                tpool.execute(_write, offset, data)
+                transferred += len(data)
+                zeroes_from = offset + len(data)
+            if end_of_src:
+                break
+
+        # If we have reached the end of source, only discard the extraneous
+        # bytes of the destination if trim is enabled.
+        if src_end < length and not CONF.restore_discard_excess_bytes:
+            _discard(zeroes_from, src_end)
+        else:
+            _discard(zeroes_from, length)
+        dest.flush()
+        LOG.debug("Transferred %(transferred)s bytes out of %(length)s",
+                  {'transferred': transferred, 'length': length})
+
     def _create_base_image(self, name, size, rados_client):
         """Create a base backup image.
 
@@ -716,7 +907,7 @@ class CephBackupDriver(driver.BackupDriver):
                                                        self._ceph_backup_conf)
                 rbd_fd = rbd_driver.RBDImageIOWrapper(rbd_meta)
                 self._transfer_data(src_volume, src_name, rbd_fd, backup_name,
-                                    length)
+                                    length, dest_is_zeroed=True)
             finally:
                 dest_rbd.close()
 
@@ -35,11 +35,16 @@
                                None (to disable), zlib and bz2 (default: zlib)
 :backup_swift_ca_cert_file: The location of the CA certificate file to use
                             for swift client requests (default: None)
+:backup_swift_concurrency: The number of Swift objects written or read at
+                           the same time, over as many connections
+                           (default: 1)
 """
 
 import hashlib
 import socket
 
+import eventlet
+from eventlet import pools
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
@@ -50,6 +55,7 @@ from cinder.backup import chunkeddriver
 from cinder import exception
 from cinder.i18n import _
 from cinder.i18n import _LE
+from cinder.i18n import _LW
 
 LOG = logging.getLogger(__name__)
 
@@ -107,12 +113,104 @@ swiftbackup_service_opts = [
                default=None,
                help='Location of the CA certificate file to use for swift '
                     'client requests.'),
+    cfg.IntOpt('backup_swift_concurrency',
+               default=1,
+               help='Number of Swift objects written during a backup or '
+                    'read during a restore at the same time, each over a '
+                    'connection of a pool kept for the whole operation. '
+                    'Failed object requests are retried on a new '
+                    'connection with an exponential backoff. A value of 1 '
+                    'uses a single connection and one object at a time.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(swiftbackup_service_opts)
 
 
+class _SwiftConnectionPool(pools.Pool):
+    """Bounded pool of Swift connections, used like a single connection.
+
+    Each request takes a connection from the pool, so that up to max_size
+    requests are in flight at once. Connections are kept between requests
+    and reuse their HTTP connection. A request failing with a connection
+    or server error is retried on a new connection after an exponential
+    backoff. The pooled connections do not retry by themselves, so a
+    request failing with 401 is retried once at once on a new connection,
+    which authenticates again like a single connection would.
+    """
+
+    def __init__(self, connect, max_size, retries, backoff):
+        super(_SwiftConnectionPool, self).__init__(max_size=max_size,
+                                                   order_as_stack=True)
+        self._connect = connect
+        self.retries = retries
+        self.backoff = backoff
+
+    def create(self):
+        return self._connect()
+
+    @staticmethod
+    def _is_transient(err):
+        if isinstance(err, swift.ClientException):
+            return err.http_status is None or err.http_status >= 500
+        return True
+
+    @staticmethod
+    def _is_unauthorized(err):
+        return (isinstance(err, swift.ClientException) and
+                err.http_status == 401)
+
+    def _retry(self, request, *args, **kwargs):
+        backoff = self.backoff
+        reauthenticated = False
+        attempt = 0
+        while True:
+            conn = self.get()
+            try:
+                return request(conn, *args, **kwargs)
+            except (socket.error, swift.ClientException) as err:
+                if self._is_unauthorized(err) and not reauthenticated:
+                    # The token expired, get a new one.
+                    reauthenticated = True
+                    conn = self.create()
+                    continue
+                if attempt == self.retries or not self._is_transient(err):
+                    raise
+                LOG.warning(_LW('Swift request failed, retrying in '
+                                '%(backoff)s seconds: %(err)s'),
+                            {'backoff': backoff, 'err': err})
+                # The connection may be broken, do not reuse it.
+                conn = self.create()
+            finally:
+                self.put(conn)
+            eventlet.sleep(backoff)
+            backoff *= 2
+            attempt += 1
+
+    def put_container(self, container):
+        return self._retry(lambda conn: conn.put_container(container))
+
+    def get_container(self, container, **kwargs):
+        return self._retry(lambda conn: conn.get_container(container,
+                                                           **kwargs))
+
+    def put_object(self, container, obj, contents, **kwargs):
+        position = contents.tell()
+
+        def _put_object(conn):
+            contents.seek(position)
+            return conn.put_object(container, obj, contents, **kwargs)
+
+        return self._retry(_put_object)
+
+    def get_object(self, container, obj, **kwargs):
+        return self._retry(lambda conn: conn.get_object(container, obj,
+                                                        **kwargs))
+
+    def delete_object(self, container, obj):
+        return self._retry(lambda conn: conn.delete_object(container, obj))
+
+
 class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
     """Provides backup, restore and delete of backup objects within Swift."""
 
@@ -159,21 +257,36 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                               "but %(param)s not set"),
                           {'param': 'backup_swift_user'})
                 raise exception.ParameterNotFound(param='backup_swift_user')
-            self.conn = swift.Connection(
+        concurrency = CONF.backup_swift_concurrency
+        if concurrency > 1:
+            # The pool retries whole object requests itself.
+            self.conn = _SwiftConnectionPool(
+                lambda: self._create_connection(retries=0), concurrency,
+                self.swift_attempts, self.swift_backoff)
+            self.chunk_workers = max(self.chunk_workers, concurrency)
+            self.restore_prefetch_depth = max(self.restore_prefetch_depth,
+                                              concurrency)
+        else:
+            self.conn = self._create_connection()
+
+    def _create_connection(self, retries=None):
+        if retries is None:
+            retries = self.swift_attempts
+        if CONF.backup_swift_auth == 'single_user':
+            return swift.Connection(
                 authurl=CONF.backup_swift_url,
                 auth_version=CONF.backup_swift_auth_version,
                 tenant_name=CONF.backup_swift_tenant,
                 user=CONF.backup_swift_user,
                 key=CONF.backup_swift_key,
-                retries=self.swift_attempts,
+                retries=retries,
                 starting_backoff=self.swift_backoff,
                 cacert=CONF.backup_swift_ca_cert_file)
-        else:
-            self.conn = swift.Connection(retries=self.swift_attempts,
-                                         preauthurl=self.swift_url,
-                                         preauthtoken=self.context.auth_token,
-                                         starting_backoff=self.swift_backoff,
-                                         cacert=CONF.backup_swift_ca_cert_file)
+        return swift.Connection(retries=retries,
+                                preauthurl=self.swift_url,
+                                preauthtoken=self.context.auth_token,
+                                starting_backoff=self.swift_backoff,
+                                cacert=CONF.backup_swift_ca_cert_file)
 
     class SwiftObjectWriter(object):
         def __init__(self, container, object_name, conn):
@@ -17,15 +17,18 @@
 LVM class for performing LVM operations.
 """
 
+import collections
 import itertools
 import math
 import os
 import re
+import time
 
 from os_brick import executor
 from oslo_concurrency import processutils as putils
 from oslo_log import log as logging
 from oslo_utils import excutils
+from oslo_utils import units
 
 from cinder import exception
 from cinder.i18n import _LE, _LI
@@ -41,7 +44,8 @@ class LVM(executor.Executor):
 
     def __init__(self, vg_name, root_helper, create_vg=False,
                  physical_volumes=None, lvm_type='default',
-                 executor=putils.execute, lvm_conf=None):
+                 executor=putils.execute, lvm_conf=None,
+                 inventory_resync_interval=0):
 
         """Initialize the LVM object.
 
@@ -55,9 +59,17 @@ class LVM(executor.Executor):
         :param physical_volumes: List of PVs to build VG on
         :param lvm_type: VG and Volume type (default, or thin)
         :param executor: Execute method to use, None uses common/processutils
+        :param inventory_resync_interval: If > 0, keep the LVs of the VG in
+                                          memory and reload them with lvs
+                                          at most every that many seconds
 
         """
         super(LVM, self).__init__(execute=executor, root_helper=root_helper)
+        # LVs of the VG by name, kept current by the operations of this
+        # object between reloads. None when they have to be reloaded.
+        self.inventory_resync_interval = inventory_resync_interval
+        self._inventory = None
+        self._inventory_time = 0
         self.vg_name = vg_name
         self.pv_list = []
         self.vg_size = 0.0
@@ -301,10 +313,60 @@ class LVM(executor.Executor):
         :returns: List of Dictionaries with LV info
 
         """
+        if self.inventory_resync_interval > 0:
+            inventory = self._get_inventory()
+            if lv_name is None:
+                return [dict(lv) for lv in inventory.values()]
+            lv = inventory.get(lv_name)
+            return [dict(lv)] if lv is not None else []
+
         return self.get_lv_info(self._root_helper,
                                 self.vg_name,
                                 lv_name)
 
+    def _get_inventory(self):
+        """Return the LVs of the VG by name, reloading them if needed."""
+        now = time.time()
+        if (self._inventory is None or
+                now - self._inventory_time >= self.inventory_resync_interval):
+            lvs = self.get_lv_info(self._root_helper, self.vg_name)
+            self._inventory = collections.OrderedDict(
+                (lv['name'], lv) for lv in lvs)
+            self._inventory_time = now
+        return self._inventory
+
+    @staticmethod
+    def _size_str_to_g(size_str):
+        """Convert an lvcreate size string to GB, None if not understood."""
+        match = re.match(r'^(\d+(?:\.\d+)?)([kmgt]?)$', str(size_str).lower())
+        if match is None:
+            return None
+        # lvcreate sizes are in megabytes by default
+        factors = {'k': 1.0 / units.Mi, 'm': 1.0 / units.Ki,
+                   '': 1.0 / units.Ki, 'g': 1, 't': units.Ki}
+        return float(match.group(1)) * factors[match.group(2)]
+
+    def _inventory_set(self, name, size_str):
+        """Record an LV created or resized by this object."""
+        if self._inventory is None:
+            return
+        size = self._size_str_to_g(size_str)
+        if size is None:
+            self._inventory = None
+            return
+        self._inventory[name] = {'vg': self.vg_name, 'name': name,
+                                 'size': '%.2f' % size}
+
+    def _inventory_remove(self, name):
+        if self._inventory is not None:
+            self._inventory.pop(name, None)
+
+    def _inventory_rename(self, name, new_name):
+        if self._inventory is not None and name in self._inventory:
+            lv = self._inventory.pop(name)
+            lv['name'] = new_name
+            self._inventory[new_name] = lv
+
     def get_volume(self, name):
         """Get reference object of volume specified by name.
 
@@ -436,8 +498,7 @@ class LVM(executor.Executor):
             # We need info on both the thin pool and the volumes,
             # therefore we should provide only self.vg_name, but not
             # self.vg_thin_pool here.
-            for lv in self.get_lv_info(self._root_helper,
-                                       self.vg_name):
+            for lv in self.get_volumes():
                 lvsize = lv['size']
                 # get_lv_info runs "lvs" command with "--nosuffix".
                 # This removes "g" from "1.00g" and only outputs "1.00".
@@ -513,6 +574,7 @@ class LVM(executor.Executor):
         self._execute(*cmd,
                       root_helper=self._root_helper,
                       run_as_root=True)
+        self._inventory_set(name, size_str)
 
         self.vg_thin_pool = name
         return size_str
@@ -553,6 +615,7 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
+        self._inventory_set(name, size_str)
 
     @utils.retry(putils.ProcessExecutionError)
     def create_lv_snapshot(self, name, source_lv_name, lv_type='default'):
@@ -584,6 +647,7 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
+        self._inventory_set(name, '%sg' % source_lvref['size'])
 
     def _mangle_lv_name(self, name):
         # Linux LVM reserves name that starts with snapshot, so that
@@ -695,6 +759,7 @@ class LVM(executor.Executor):
                 root_helper=self._root_helper, run_as_root=True)
             LOG.debug('Successfully deleted volume: %s after '
                       'udev settle.', name)
+        self._inventory_remove(name)
 
     def revert(self, snapshot_name):
         """Revert an LV from snapshot.
@@ -705,6 +770,8 @@ class LVM(executor.Executor):
         self._execute('lvconvert', '--merge',
                       snapshot_name, root_helper=self._root_helper,
                       run_as_root=True)
+        # The snapshot goes away once merged
+        self._inventory = None
 
     def lv_has_snapshot(self, name):
         cmd = LVM.LVM_CMD_PREFIX + ['lvdisplay', '--noheading', '-C', '-o',
@@ -737,6 +804,7 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
+        self._inventory_set(lv_name, new_size)
 
     def vg_mirror_free_space(self, mirror_count):
         free_capacity = 0.0
@@ -775,3 +843,4 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
+        self._inventory_rename(lv_name, new_name)
@@ -15,6 +15,7 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import json
 import os
 import sys
 
@@ -179,6 +180,55 @@ def verify_rtslib():
                                      member)
 
 
+# Commands which can be given to batch
+BATCH_COMMANDS = ('create', 'delete', 'add-initiator', 'delete-initiator')
+
+
+def batch(commands):
+    """Run several commands in a single process.
+
+    Each line of commands is a JSON list with a command and its arguments,
+    as they would be given on the command line. A failed command does not
+    stop the other ones.
+
+    :returns: number of failed commands
+    """
+    failures = 0
+    for line in commands:
+        line = line.strip()
+        if not line:
+            continue
+        args = None
+        try:
+            args = json.loads(line)
+            if not args or args[0] not in BATCH_COMMANDS:
+                raise RtstoolError(_('Invalid batch command'))
+            main([sys.argv[0]] + args)
+        except (Exception, SystemExit) as exc:
+            # SystemExit is raised by usage on invalid arguments. The line
+            # may hold CHAP credentials, only the target is printed.
+            print(_('Error: %(command)s %(target)s failed: %(exc)s')
+                  % {'command': _get_batch_command(args),
+                     'target': _get_batch_target(args), 'exc': exc})
+            failures += 1
+    return failures
+
+
+def _get_batch_command(args):
+    if isinstance(args, list) and args:
+        return args[0]
+    return _('invalid command')
+
+
+def _get_batch_target(args):
+    """Return the target IQN a batch command works on, or ''."""
+    if not isinstance(args, list):
+        return ''
+    # create takes the backing device before the IQN
+    index = 2 if args[:1] == ['create'] else 1
+    return args[index] if len(args) > index else ''
+
+
 def usage():
     print("Usage:")
     print(sys.argv[0] +
@@ -192,6 +242,8 @@ def usage():
     print(sys.argv[0] + " delete [iqn]")
     print(sys.argv[0] + " verify")
     print(sys.argv[0] + " save [path_to_file]")
+    print(sys.argv[0] + " restore [path_to_file]")
+    print(sys.argv[0] + " batch < [json_command_lines]")
     sys.exit(1)
 
 
@@ -224,6 +276,26 @@ def save_to_file(destination_file):
                            {'file_path': destination_file, 'exc': exc})
 
 
+def restore_from_file(configuration_file):
+    rtsroot = rtslib_fb.root.RTSRoot()
+    # If no file is given use rtslib default save file
+    if not configuration_file:
+        configuration_file = rtslib_fb.root.default_save_file
+
+    try:
+        errors = rtsroot.restore_from_file(configuration_file)
+    except (OSError, IOError, ValueError,
+            rtslib_fb.utils.RTSLibError) as exc:
+        raise RtstoolError(_('Could not restore configuration from '
+                             '%(file_path)s: %(exc)s'),
+                           {'file_path': configuration_file, 'exc': exc})
+    if errors:
+        raise RtstoolError(_('Could not restore configuration from '
+                             '%(file_path)s: %(exc)s'),
+                           {'file_path': configuration_file,
+                            'exc': '; '.join(errors)})
+
+
 def parse_optional_create(argv):
     optional_args = {}
 
@@ -315,6 +387,20 @@ def main(argv=None):
         save_to_file(destination_file)
         return 0
 
+    elif argv[1] == 'restore':
+        if len(argv) > 3:
+            usage()
+
+        configuration_file = argv[2] if len(argv) > 2 else None
+        restore_from_file(configuration_file)
+        return 0
+
+    elif argv[1] == 'batch':
+        if len(argv) > 2:
+            usage()
+
+        return 1 if batch(sys.stdin) else 0
+
     else:
         usage()
 
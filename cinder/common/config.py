@@ -186,6 +186,12 @@ global_opts = [
     cfg.BoolOpt('no_snapshot_gb_quota',
                 default=False,
                 help='Whether snapshots count against gigabyte quota'),
+    cfg.BoolOpt('quota_reserve_batched',
+                default=False,
+                help='Lock only the quota usages a reservation changes '
+                     'instead of all the quota usages of the project, '
+                     'refresh them with grouped queries and insert the '
+                     'reservations in bulk'),
     cfg.StrOpt('transfer_api_class',
                default='cinder.transfer.api.API',
                help='The full class name of the volume transfer API class'),
@@ -31,7 +31,8 @@ LOG = logging.getLogger(__name__)
 
 # copied from glance/db/sqlalchemy/api.py
 def paginate_query(query, model, limit, sort_keys, marker=None,
-                   sort_dir=None, sort_dirs=None, offset=None):
+                   sort_dir=None, sort_dirs=None, offset=None,
+                   marker_values=None):
     """Returns a query with sorting / pagination criteria added.
 
     Pagination works by requiring a unique sort_key, specified by sort_keys.
@@ -47,7 +48,12 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
 
     Typically, the id of the last row is used as the client-facing pagination
     marker, then the actual marker object must be fetched from the db and
-    passed in to us as marker.
+    passed in to us as marker. Callers that only read the sort key values of
+    that row can pass them as marker_values instead.
+
+    The criteria are also bounded by the first sort key, (k1 >= X1) when
+    ascending, so that the database can seek to the marker in an index on
+    the sort keys instead of scanning all the rows before it.
 
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
@@ -57,6 +63,9 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
                     results after this value.
     :param sort_dir: direction in which results should be sorted (asc, desc)
     :param sort_dirs: per-column array of sort_dirs, corresponding to sort_keys
+    :param offset: number of items to skip
+    :param marker_values: values of the sort keys of the marker, in the same
+                          order as sort_keys; replaces marker
 
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
@@ -93,12 +102,14 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         query = query.order_by(sort_dir_func(sort_key_attr))
 
     # Add pagination
-    if marker is not None:
+    if marker is not None and marker_values is None:
         marker_values = []
         for sort_key in sort_keys:
             v = getattr(marker, sort_key)
             marker_values.append(v)
 
+    if marker_values is not None:
+
         # Build up an array of sort criteria as in the docstring
         criteria_list = []
         for i in range(0, len(sort_keys)):
@@ -120,6 +131,17 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
             criteria_list.append(criteria)
 
         f = sqlalchemy.sql.or_(*criteria_list)
+
+        # Every criteria above implies this range on the first sort key,
+        # spelling it out lets the database seek instead of scan.  It is
+        # skipped for NULL, which the criteria compare with IS NULL.
+        if marker_values[0] is not None:
+            model_attr = getattr(model, sort_keys[0])
+            if sort_dirs[0] == 'desc':
+                f = sqlalchemy.sql.and_(model_attr <= marker_values[0], f)
+            else:
+                f = sqlalchemy.sql.and_(model_attr >= marker_values[0], f)
+
         query = query.filter(f)
 
     if limit is not None:
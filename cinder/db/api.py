@@ -206,11 +206,12 @@ def volume_get(context, volume_id):
 
 
 def volume_get_all(context, marker, limit, sort_keys=None, sort_dirs=None,
-                   filters=None, offset=None):
+                   filters=None, offset=None, columns_to_join=None):
     """Get all volumes."""
     return IMPL.volume_get_all(context, marker, limit, sort_keys=sort_keys,
                                sort_dirs=sort_dirs, filters=filters,
-                               offset=offset)
+                               offset=offset,
+                               columns_to_join=columns_to_join)
 
 
 def volume_get_all_by_host(context, host, filters=None):
@@ -225,13 +226,14 @@ def volume_get_all_by_group(context, group_id, filters=None):
 
 def volume_get_all_by_project(context, project_id, marker, limit,
                               sort_keys=None, sort_dirs=None, filters=None,
-                              offset=None):
+                              offset=None, columns_to_join=None):
     """Get all volumes belonging to a project."""
     return IMPL.volume_get_all_by_project(context, project_id, marker, limit,
                                           sort_keys=sort_keys,
                                           sort_dirs=sort_dirs,
                                           filters=filters,
-                                          offset=offset)
+                                          offset=offset,
+                                          columns_to_join=columns_to_join)
 
 
 def volume_get_iscsi_target_num(context, volume_id):
@@ -248,6 +250,15 @@ def volume_update(context, volume_id, values):
     return IMPL.volume_update(context, volume_id, values)
 
 
+def volumes_update(context, values_list):
+    """Set the given properties on a list of volumes and update them.
+
+    Each dict of values must contain the id of the volume to update; all
+    the updates are done in a single transaction.
+    """
+    return IMPL.volumes_update(context, values_list)
+
+
 def volume_attachment_update(context, attachment_id, values):
     return IMPL.volume_attachment_update(context, attachment_id, values)
 
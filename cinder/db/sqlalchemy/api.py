@@ -41,8 +41,10 @@ from sqlalchemy import MetaData
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload, joinedload_all
 from sqlalchemy.orm import RelationshipProperty
+from sqlalchemy.orm import subqueryload
 from sqlalchemy.schema import Table
 from sqlalchemy.sql.expression import desc
+from sqlalchemy.sql.expression import false
 from sqlalchemy.sql.expression import literal_column
 from sqlalchemy.sql.expression import true
 from sqlalchemy.sql import func
@@ -330,6 +332,47 @@ QUOTA_SYNC_FUNCTIONS = {
 }
 
 
+def _sync_quota_usages(context, project_id, resources, session):
+    """Refresh the usages of several resources at once.
+
+    The volume, snapshot and gigabytes usages of all the volume types are
+    computed from one grouped query per table, other resources go through
+    their own sync routine.
+    """
+    loaders = {'volumes': _volume_data_by_volume_type,
+               'snapshots': _snapshot_data_by_volume_type}
+    data = {}
+
+    def _get_data(name, volume_type_id):
+        if name not in data:
+            data[name] = loaders[name](context, project_id, session)
+        if volume_type_id:
+            return data[name].get(volume_type_id, (0, 0))
+        return (sum(count for count, _size in data[name].values()),
+                sum(size for _count, size in data[name].values()))
+
+    updates = {}
+    for resource in resources:
+        sync = QUOTA_SYNC_FUNCTIONS[resource.sync]
+        volume_type_id = getattr(resource, 'volume_type_id', None)
+        if sync is _sync_volumes:
+            updates[resource.name] = _get_data('volumes', volume_type_id)[0]
+        elif sync is _sync_snapshots:
+            updates[resource.name] = _get_data('snapshots', volume_type_id)[0]
+        elif sync is _sync_gigabytes:
+            gigs = _get_data('volumes', volume_type_id)[1]
+            if not CONF.no_snapshot_gb_quota:
+                gigs += _get_data('snapshots', volume_type_id)[1]
+            updates[resource.name] = gigs
+        else:
+            volume_type_name = getattr(resource, 'volume_type_name', None)
+            updates.update(sync(context, project_id,
+                                volume_type_id=volume_type_id,
+                                volume_type_name=volume_type_name,
+                                session=session))
+    return updates
+
+
 ###################
 
 
@@ -757,6 +800,23 @@ def _reservation_create(context, uuid, usage, project_id, resource, delta,
     return reservation_ref
 
 
+def _reservations_create(context, usages, project_id, deltas, expire,
+                         session):
+    """Insert the reservations for all the deltas in a single statement."""
+    now = timeutils.utcnow()
+    values = [{'uuid': str(uuid.uuid4()),
+               'usage_id': usages[resource].id,
+               'project_id': project_id,
+               'resource': resource,
+               'delta': delta,
+               'expire': expire,
+               'created_at': now,
+               'deleted': False}
+              for resource, delta in deltas.items()]
+    session.execute(models.Reservation.__table__.insert(), values)
+    return [value['uuid'] for value in values]
+
+
 ###################
 
 
@@ -765,12 +825,15 @@ def _reservation_create(context, uuid, usage, project_id, resource, delta,
 # code always acquires the lock on quota_usages before acquiring the lock
 # on reservations.
 
-def _get_quota_usages(context, session, project_id):
+def _get_quota_usages(context, session, project_id, resources=None):
     # Broken out for testability
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-        filter_by(project_id=project_id).\
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+        filter_by(project_id=project_id)
+    if resources is not None:
+        query = query.filter(models.QuotaUsage.resource.in_(resources))
+    rows = query.order_by(models.QuotaUsage.id).\
         with_lockmode('update').\
         all()
     return {row.resource: row for row in rows}
@@ -787,9 +850,50 @@ def quota_reserve(context, resources, quotas, deltas, expire,
             project_id = context.project_id
 
         # Get the current usages
-        usages = _get_quota_usages(context, session, project_id)
+        batched = CONF.quota_reserve_batched
+        if batched:
+            # Only lock the usages we are about to change, other
+            # reservations for the project can go on in parallel.
+            usages = _get_quota_usages(context, session, project_id,
+                                       resources=list(deltas))
+        else:
+            usages = _get_quota_usages(context, session, project_id)
+
+        def _update_usages(updates):
+            for res, in_use in updates.items():
+                # Make sure we have a destination for the usage!
+                if res not in usages and batched:
+                    usages.update(_get_quota_usages(context, session,
+                                                    project_id,
+                                                    resources=[res]))
+                if res not in usages:
+                    usages[res] = _quota_usage_create(
+                        elevated,
+                        project_id,
+                        res,
+                        0, 0,
+                        until_refresh or None,
+                        session=session
+                    )
+
+                # Update the usage
+                usages[res].in_use = in_use
+                usages[res].until_refresh = until_refresh or None
+
+                # Because more than one resource may be refreshed
+                # by the call to the sync routine, and we don't
+                # want to double-sync, we make sure all refreshed
+                # resources are dropped from the work set.
+                work.discard(res)
+
+                # NOTE(Vek): We make the assumption that the sync
+                #            routine actually refreshes the
+                #            resources that it is the sync routine
+                #            for.  We don't check, because this is
+                #            a best-effort mechanism.
 
         # Handle usage refresh
+        to_refresh = []
         work = set(deltas.keys())
         while work:
             resource = work.pop()
@@ -818,7 +922,9 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                 refresh = True
 
             # OK, refresh the usage
-            if refresh:
+            if refresh and batched:
+                to_refresh.append(resources[resource])
+            elif refresh:
                 # Grab the sync routine
                 sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
                 volume_type_id = getattr(resources[resource],
@@ -829,33 +935,11 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                                volume_type_id=volume_type_id,
                                volume_type_name=volume_type_name,
                                session=session)
-                for res, in_use in updates.items():
-                    # Make sure we have a destination for the usage!
-                    if res not in usages:
-                        usages[res] = _quota_usage_create(
-                            elevated,
-                            project_id,
-                            res,
-                            0, 0,
-                            until_refresh or None,
-                            session=session
-                        )
-
-                    # Update the usage
-                    usages[res].in_use = in_use
-                    usages[res].until_refresh = until_refresh or None
-
-                    # Because more than one resource may be refreshed
-                    # by the call to the sync routine, and we don't
-                    # want to double-sync, we make sure all refreshed
-                    # resources are dropped from the work set.
-                    work.discard(res)
-
-                    # NOTE(Vek): We make the assumption that the sync
-                    #            routine actually refreshes the
-                    #            resources that it is the sync routine
-                    #            for.  We don't check, because this is
-                    #            a best-effort mechanism.
+                _update_usages(updates)
+
+        if to_refresh:
+            _update_usages(_sync_quota_usages(elevated, project_id,
+                                              to_refresh, session))
 
         # Check for deltas that would go negative
         unders = [r for r, delta in deltas.items()
@@ -879,16 +963,23 @@ def quota_reserve(context, resources, quotas, deltas, expire,
 
         # Create the reservations
         if not overs:
-            reservations = []
-            for resource, delta in deltas.items():
-                reservation = _reservation_create(elevated,
-                                                  str(uuid.uuid4()),
-                                                  usages[resource],
-                                                  project_id,
-                                                  resource, delta, expire,
-                                                  session=session)
-                reservations.append(reservation.uuid)
+            if batched:
+                reservations = _reservations_create(elevated, usages,
+                                                    project_id, deltas,
+                                                    expire, session)
+            else:
+                reservations = []
+                for resource, delta in deltas.items():
+                    reservation = _reservation_create(elevated,
+                                                      str(uuid.uuid4()),
+                                                      usages[resource],
+                                                      project_id,
+                                                      resource, delta,
+                                                      expire,
+                                                      session=session)
+                    reservations.append(reservation.uuid)
 
+            for resource, delta in deltas.items():
                 # Also update the reserved quantity
                 # NOTE(Vek): Again, we are only concerned here about
                 #            positive increments.  Here, though, we're
@@ -1143,6 +1234,22 @@ def _volume_data_get_for_project(context, project_id, volume_type_id=None,
     return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def _volume_data_by_volume_type(context, project_id, session=None):
+    rows = model_query(context,
+                       func.count(models.Volume.id),
+                       func.sum(models.Volume.size),
+                       models.Volume.volume_type_id,
+                       read_deleted="no",
+                       session=session).\
+        filter_by(project_id=project_id).\
+        group_by(models.Volume.volume_type_id).\
+        all()
+
+    return {volume_type_id: (count or 0, size or 0)
+            for count, size, volume_type_id in rows}
+
+
 @require_admin_context
 def _backup_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -1319,8 +1426,37 @@ def volume_detached(context, volume_id, attachment_id):
             volume_ref.save(session=session)
 
 
+# Relationships loaded by the volume listings when the caller doesn't say
+# which ones it needs.
+VOLUME_LIST_COLUMNS_TO_JOIN = ('volume_metadata', 'volume_admin_metadata',
+                               'volume_type', 'volume_attachment',
+                               'consistencygroup')
+
+
 @require_context
-def _volume_get_query(context, session=None, project_only=False):
+def _volume_get_query(context, session=None, project_only=False,
+                      columns_to_join=None):
+    """Return the query for volumes with their relationships eager loaded.
+
+    :param columns_to_join: relationships to load, all of them when None.
+                            Only the many-to-one relationships in the list
+                            are joined, collections are each loaded with a
+                            separate query so that they don't multiply the
+                            rows of the volumes query.
+    """
+    if columns_to_join is not None:
+        query = model_query(context, models.Volume, session=session,
+                            project_only=project_only)
+        for column in columns_to_join:
+            if (column == 'volume_admin_metadata' and
+                    not is_admin_context(context)):
+                continue
+            if column in ('volume_type', 'consistencygroup'):
+                query = query.options(joinedload(column))
+            else:
+                query = query.options(subqueryload(column))
+        return query
+
     if is_admin_context(context):
         return model_query(context, models.Volume, session=session,
                            project_only=project_only).\
@@ -1406,7 +1542,7 @@ def volume_get(context, volume_id):
 
 @require_admin_context
 def volume_get_all(context, marker, limit, sort_keys=None, sort_dirs=None,
-                   filters=None, offset=None):
+                   filters=None, offset=None, columns_to_join=None):
     """Retrieves all volumes.
 
     If no sort parameters are specified then the returned volumes are sorted
@@ -1425,13 +1561,20 @@ def volume_get_all(context, marker, limit, sort_keys=None, sort_dirs=None,
                     or sets cause an 'IN' operation, while exact matching
                     is used for other values, see _process_volume_filters
                     function for more information
+    :param offset: number of items to skip
+    :param columns_to_join: relationships of the volumes to load, see
+                            _volume_get_query; defaults to
+                            VOLUME_LIST_COLUMNS_TO_JOIN
     :returns: list of matching volumes
     """
+    if columns_to_join is None:
+        columns_to_join = VOLUME_LIST_COLUMNS_TO_JOIN
     session = get_session()
     with session.begin():
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
-                                         sort_keys, sort_dirs, filters, offset)
+                                         sort_keys, sort_dirs, filters, offset,
+                                         columns_to_join=columns_to_join)
         # No volumes would match, return empty list
         if query is None:
             return []
@@ -1497,7 +1640,7 @@ def volume_get_all_by_group(context, group_id, filters=None):
 @require_context
 def volume_get_all_by_project(context, project_id, marker, limit,
                               sort_keys=None, sort_dirs=None, filters=None,
-                              offset=None):
+                              offset=None, columns_to_join=None):
     """Retrieves all volumes in a project.
 
     If no sort parameters are specified then the returned volumes are sorted
@@ -1517,8 +1660,14 @@ def volume_get_all_by_project(context, project_id, marker, limit,
                     or sets cause an 'IN' operation, while exact matching
                     is used for other values, see _process_volume_filters
                     function for more information
+    :param offset: number of items to skip
+    :param columns_to_join: relationships of the volumes to load, see
+                            _volume_get_query; defaults to
+                            VOLUME_LIST_COLUMNS_TO_JOIN
     :returns: list of matching volumes
     """
+    if columns_to_join is None:
+        columns_to_join = VOLUME_LIST_COLUMNS_TO_JOIN
     session = get_session()
     with session.begin():
         authorize_project_context(context, project_id)
@@ -1527,7 +1676,8 @@ def volume_get_all_by_project(context, project_id, marker, limit,
         filters['project_id'] = project_id
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
-                                         sort_keys, sort_dirs, filters, offset)
+                                         sort_keys, sort_dirs, filters, offset,
+                                         columns_to_join=columns_to_join)
         # No volumes would match, return empty list
         if query is None:
             return []
@@ -1536,7 +1686,8 @@ def volume_get_all_by_project(context, project_id, marker, limit,
 
 def _generate_paginate_query(context, session, marker, limit, sort_keys,
                              sort_dirs, filters, offset=None,
-                             paginate_type=models.Volume):
+                             paginate_type=models.Volume,
+                             columns_to_join=None):
     """Generate the query to include the filters and the paginate options.
 
     Returns a query with sorting / pagination criteria added or None
@@ -1557,6 +1708,8 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
                     function for more information
     :param offset: number of items to skip
     :param paginate_type: type of pagination to generate
+    :param columns_to_join: relationships to load, only supported by the
+                            volume query
     :returns: updated query or None
     """
     get_query, process_filters, get = PAGINATION_HELPERS[paginate_type]
@@ -1564,22 +1717,49 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
     sort_keys, sort_dirs = process_sort_params(sort_keys,
                                                sort_dirs,
                                                default_dir='desc')
-    query = get_query(context, session=session)
+    if columns_to_join is not None:
+        query = get_query(context, session=session,
+                          columns_to_join=columns_to_join)
+    else:
+        query = get_query(context, session=session)
 
     if filters:
         query = process_filters(query, filters)
         if query is None:
             return None
 
-    marker_volume = None
+    marker_values = None
     if marker is not None:
-        marker_volume = get(context, marker, session)
+        marker_values = _get_marker_values(context, session, paginate_type,
+                                           get, marker, sort_keys)
 
     return sqlalchemyutils.paginate_query(query, paginate_type, limit,
                                           sort_keys,
-                                          marker=marker_volume,
                                           sort_dirs=sort_dirs,
-                                          offset=offset)
+                                          offset=offset,
+                                          marker_values=marker_values)
+
+
+def _get_marker_values(context, session, model, get, marker, sort_keys):
+    """Read the values of the sort keys of the marker.
+
+    Only the sort columns are selected, the marker is looked up with the same
+    project and deleted restrictions as the getter of the model, which is
+    only called to raise the right NotFound exception.
+    """
+    try:
+        columns = [getattr(model, sort_key) for sort_key in sort_keys]
+    except AttributeError:
+        raise exception.InvalidInput(reason='Invalid sort key')
+
+    values = model_query(context, *columns, session=session,
+                         project_only=True).\
+        filter_by(id=marker).\
+        first()
+    if values is None:
+        marker_item = get(context, marker, session)
+        values = [getattr(marker_item, sort_key) for sort_key in sort_keys]
+    return list(values)
 
 
 def _process_volume_filters(query, filters):
@@ -1642,14 +1822,8 @@ def _process_volume_filters(query, filters):
     # Iterate over all filters, special case the filter if necessary
     for key, value in filters.items():
         if key == 'metadata':
-            # model.VolumeMetadata defines the backref to Volumes as
-            # 'volume_metadata' or 'volume_admin_metadata', use those as
-            # column attribute keys
-            col_attr = getattr(models.Volume, 'volume_metadata')
-            col_ad_attr = getattr(models.Volume, 'volume_admin_metadata')
-            for k, v in value.items():
-                query = query.filter(or_(col_attr.any(key=k, value=v),
-                                         col_ad_attr.any(key=k, value=v)))
+            # Applied last, joining changes what filter_by applies to
+            continue
         elif isinstance(value, (list, tuple, set, frozenset)):
             # Looking for values in a list; apply to query directly
             column_attr = getattr(models.Volume, key)
@@ -1661,9 +1835,41 @@ def _process_volume_filters(query, filters):
     # Apply simple exact matches
     if filter_dict:
         query = query.filter_by(**filter_dict)
+
+    if filters.get('metadata'):
+        matches = _volume_metadata_matches(filters['metadata'])
+        query = query.join(matches,
+                           models.Volume.id == matches.c.volume_id).\
+            reset_joinpoint()
     return query
 
 
+def _volume_metadata_matches(metadata):
+    """Return the ids of the volumes having all the metadata pairs.
+
+    A pair matches the user or the admin metadata of a volume. The pairs are
+    looked up through the (key, value) indexes of both metadata tables, then
+    grouped by volume to keep the volumes which matched every pair.
+    """
+    selects = []
+    for model in (models.VolumeMetadata, models.VolumeAdminMetadata):
+        table = model.__table__
+        pairs = [sqlalchemy.and_(table.c.key == key, table.c.value == value)
+                 for key, value in metadata.items()]
+        selects.append(
+            sqlalchemy.select([table.c.volume_id, table.c.key]).
+            where(table.c.deleted == false()).
+            where(or_(*pairs)))
+
+    # UNION drops pairs found in both tables, so every matching volume has
+    # exactly one row per key left.
+    pairs = sqlalchemy.union(*selects).alias('metadata_pairs')
+    return sqlalchemy.select([pairs.c.volume_id]).\
+        group_by(pairs.c.volume_id).\
+        having(func.count() == len(metadata)).\
+        alias('metadata_matches')
+
+
 def process_sort_params(sort_keys, sort_dirs, default_keys=None,
                         default_dir='asc'):
     """Process the sort parameters to include default keys.
@@ -1773,6 +1979,21 @@ def volume_update(context, volume_id, values):
         return volume_ref
 
 
+@require_context
+def volumes_update(context, values_list):
+    session = get_session()
+    with session.begin():
+        for values in values_list:
+            values = values.copy()
+            volume_id = values.pop('id')
+            result = model_query(context, models.Volume, session=session,
+                                 read_deleted="no").\
+                filter_by(id=volume_id).\
+                update(values)
+            if not result:
+                raise exception.VolumeNotFound(volume_id=volume_id)
+
+
 @require_context
 def volume_attachment_update(context, attachment_id, values):
     session = get_session()
@@ -2251,6 +2472,24 @@ def _snapshot_data_get_for_project(context, project_id, volume_type_id=None,
     return (result[0] or 0, result[1] or 0)
 
 
+@require_context
+def _snapshot_data_by_volume_type(context, project_id, session=None):
+    authorize_project_context(context, project_id)
+    rows = model_query(context,
+                       func.count(models.Snapshot.id),
+                       func.sum(models.Snapshot.volume_size),
+                       models.Volume.volume_type_id,
+                       read_deleted="no",
+                       session=session).\
+        filter_by(project_id=project_id).\
+        outerjoin('volume').\
+        group_by(models.Volume.volume_type_id).\
+        all()
+
+    return {volume_type_id: (count or 0, size or 0)
+            for count, size, volume_type_id in rows}
+
+
 @require_context
 def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
     return _snapshot_data_get_for_project(context, project_id, volume_type_id)
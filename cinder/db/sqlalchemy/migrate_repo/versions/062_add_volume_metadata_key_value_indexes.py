@@ -0,0 +1,51 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+# Based on the metadata filter of the volume listings
+# from: cinder/db/sqlalchemy/api.py
+INDEXES = (('volume_metadata', 'volume_metadata_key_value_idx'),
+           ('volume_admin_metadata', 'volume_admin_metadata_key_value_idx'))
+COLUMNS = ('key', 'value', 'volume_id')
+
+
+def _get_index(table):
+    for idx in table.indexes:
+        if tuple(idx.columns.keys()) == COLUMNS:
+            return idx
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name, index_name in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        if _get_index(table):
+            continue
+
+        # Keep the index under the 767 bytes InnoDB allows for utf8 keys
+        index = Index(index_name, *[table.c[column] for column in COLUMNS],
+                      mysql_length={'key': 100, 'value': 100})
+        index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name, _index_name in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        index = _get_index(table)
+        if index:
+            index.drop(migrate_engine)
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from eventlet import event
 from pytz import timezone
 import six
 
@@ -27,6 +28,34 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
+class _HostEntries(object):
+    """Image-volume cache entries of a host, least recently used first."""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.size = sum(entry['size'] for entry in self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        self.remove(entry['volume_id'])
+        self.entries.append(entry)
+        self.size += entry['size']
+
+    def remove(self, volume_id):
+        for i, entry in enumerate(self.entries):
+            if entry['volume_id'] == volume_id:
+                del self.entries[i]
+                self.size -= entry['size']
+                return entry
+
+    def pop_lru(self):
+        entry = self.entries.pop(0)
+        self.size -= entry['size']
+        return entry
+
+
 class ImageVolumeCache(object):
     def __init__(self, db, volume_api, max_cache_size_gb=0,
                  max_cache_size_count=0):
@@ -35,6 +64,11 @@ class ImageVolumeCache(object):
         self.max_cache_size_gb = int(max_cache_size_gb)
         self.max_cache_size_count = int(max_cache_size_count)
         self.notifier = rpc.get_notifier('volume', CONF.host)
+        # Entries per host, loaded from the db the first time space has
+        # to be ensured on a host and kept up to date from then on.
+        self._host_entries = {}
+        # Events for the image-volumes being created, by (host, image_id).
+        self._fills = {}
 
     def get_by_image_volume(self, context, volume_id):
         return self.db.image_volume_cache_get_by_volume_id(context, volume_id)
@@ -43,6 +77,7 @@ class ImageVolumeCache(object):
         LOG.debug('Evicting image cache entry: %(entry)s.',
                   {'entry': self._entry_to_str(cache_entry)})
         self.db.image_volume_cache_delete(context, cache_entry['volume_id'])
+        self._forget_entry(cache_entry)
         self._notify_cache_eviction(context, cache_entry['image_id'],
                                     cache_entry['host'])
 
@@ -65,6 +100,7 @@ class ImageVolumeCache(object):
                 cache_entry = None
 
         if cache_entry:
+            self._remember_entry(cache_entry)
             self._notify_cache_hit(context, cache_entry['image_id'],
                                    cache_entry['host'])
         else:
@@ -101,10 +137,37 @@ class ImageVolumeCache(object):
             volume_ref['size']
         )
 
+        self._remember_entry(cache_entry)
         LOG.debug('New image-volume cache entry created: %(entry)s.',
                   {'entry': self._entry_to_str(cache_entry)})
         return cache_entry
 
+    def begin_fill(self, image_id, host):
+        """Claim the creation of the image-volume for an image on a host.
+
+        Returns True if the caller should go on and create the cache entry,
+        in which case it must call end_fill() once done. If the image-volume
+        is already being created by another request, waits for that to
+        finish and returns False; the caller should then look the entry up
+        again instead of downloading the image itself.
+        """
+        fill = self._fills.get((host, image_id))
+        if fill is None:
+            self._fills[(host, image_id)] = event.Event()
+            return True
+
+        LOG.debug('Waiting for image-volume cache entry for image '
+                  '%(image_id)s on host %(host)s to be created.',
+                  {'image_id': image_id, 'host': host})
+        fill.wait()
+        return False
+
+    def end_fill(self, image_id, host):
+        """Wake up the requests waiting on begin_fill()."""
+        fill = self._fills.pop((host, image_id), None)
+        if fill is not None:
+            fill.send()
+
     def ensure_space(self, context, space_required, host):
         """Makes room for a cache entry.
 
@@ -122,18 +185,18 @@ class ImageVolumeCache(object):
                 space_required > self.max_cache_size_gb):
             return False
 
-        # Assume the entries are ordered by most recently used to least used.
-        entries = self.db.image_volume_cache_get_all_for_host(context, host)
-
-        current_count = len(entries)
+        entries = self._get_host_entries(context, host)
+        if not self._is_over_limit(entries.size + space_required,
+                                   len(entries) + 1, entries):
+            return True
 
-        current_size = 0
-        for entry in entries:
-            current_size += entry['size']
+        # Volumes deleted through the API are not seen by this cache, get
+        # an accurate view before evicting anything.
+        entries = self._load_host_entries(context, host)
 
         # Add values for the entry we intend to create.
-        current_size += space_required
-        current_count += 1
+        current_size = entries.size + space_required
+        current_count = len(entries) + 1
 
         LOG.debug('Image-volume cache for host %(host)s current_size (GB) = '
                   '%(size_gb)s (max = %(max_gb)s), current count = %(count)s '
@@ -144,10 +207,8 @@ class ImageVolumeCache(object):
                    'count': current_count,
                    'max_count': self.max_cache_size_count})
 
-        while ((current_size > self.max_cache_size_gb
-               or current_count > self.max_cache_size_count)
-               and len(entries)):
-            entry = entries.pop()
+        while self._is_over_limit(current_size, current_count, entries):
+            entry = entries.pop_lru()
             LOG.debug('Reclaiming image-volume cache space; removing cache '
                       'entry %(entry)s.', {'entry': self._entry_to_str(entry)})
             self._delete_image_volume(context, entry)
@@ -171,6 +232,34 @@ class ImageVolumeCache(object):
 
         return True
 
+    def _is_over_limit(self, size, count, entries):
+        # A limit of 0 means unlimited.
+        return ((size > self.max_cache_size_gb > 0
+                or count > self.max_cache_size_count > 0)
+                and len(entries))
+
+    def _load_host_entries(self, context, host):
+        # The db returns the most recently used entries first.
+        entries = self.db.image_volume_cache_get_all_for_host(context, host)
+        self._host_entries[host] = _HostEntries(reversed(entries))
+        return self._host_entries[host]
+
+    def _get_host_entries(self, context, host):
+        entries = self._host_entries.get(host)
+        if entries is None:
+            entries = self._load_host_entries(context, host)
+        return entries
+
+    def _remember_entry(self, cache_entry):
+        entries = self._host_entries.get(cache_entry['host'])
+        if entries is not None:
+            entries.add(cache_entry)
+
+    def _forget_entry(self, cache_entry):
+        entries = self._host_entries.get(cache_entry['host'])
+        if entries is not None:
+            entries.remove(cache_entry['volume_id'])
+
     def _notify_cache_hit(self, context, image_id, host):
         self._notify_cache_action(context, image_id, host, 'hit')
 
@@ -191,6 +280,7 @@ class ImageVolumeCache(object):
 
     def _delete_image_volume(self, context, cache_entry):
         """Delete a volume and remove cache entry."""
+        self._forget_entry(cache_entry)
         volume_ref = self.db.volume_get(context, cache_entry['volume_id'])
 
         # Delete will evict the cache entry.
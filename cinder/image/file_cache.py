@@ -0,0 +1,305 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of downloaded image files on volume nodes.
+
+Images are stored under their Glance checksum, so an image downloaded once
+is reused by every later copy to a volume on the same node, whatever its id.
+
+The cache directory is shared by the volume services of the node. Each
+process indexes the files it knows about, and file locks keep processes
+from evicting files used by others or removing their partial downloads:
+
+* a file being downloaded is exclusively locked by the downloader;
+* a file being used is locked in shared mode until it is released;
+* files are only evicted when they can be exclusively locked.
+"""
+
+import collections
+import contextlib
+import errno
+import fcntl
+import hashlib
+import os
+
+from eventlet import event
+from eventlet import tpool
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import fileutils
+from oslo_utils import units
+
+from cinder import exception
+from cinder.i18n import _, _LW
+from cinder import rpc
+
+LOG = logging.getLogger(__name__)
+
+image_file_cache_opts = [
+    cfg.IntOpt('image_file_cache_max_size_gb',
+               default=0,
+               help='Maximum size in GB of the cache of downloaded image '
+                    'files kept on volume nodes, so that images copied to '
+                    'several volumes are only downloaded once. Least '
+                    'recently used images are removed first. Set to 0 to '
+                    'disable the cache.'),
+    cfg.StrOpt('image_file_cache_dir',
+               default='$image_conversion_dir/cache',
+               help='Directory where the cached image files are stored. '
+                    'It can be shared by the volume services of a node.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_file_cache_opts)
+
+_PART_SUFFIX = '.part'
+
+
+class _Entry(object):
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        # Shared locked descriptors of the requests using the file, which
+        # must not be evicted while there are any.
+        self.fds = []
+
+
+def _lock_file(path, operation):
+    """Open path and lock it with flock operation.
+
+    Returns the descriptor, or None if the file does not exist or if the
+    lock is not available with LOCK_NB.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    try:
+        fcntl.flock(fd, operation)
+    except IOError as e:
+        os.close(fd)
+        if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+            return None
+        raise
+    if os.fstat(fd).st_nlink == 0:
+        # Deleted between the open and the lock
+        os.close(fd)
+        return None
+    return fd
+
+
+class ImageFileCache(object):
+    """Checksum-keyed cache of image files with LRU eviction by size."""
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.notifier = rpc.get_notifier('volume', CONF.host)
+        # Entries by checksum, least recently used first.
+        self._entries = collections.OrderedDict()
+        # Events for the files being downloaded, by checksum.
+        self._fills = {}
+        fileutils.ensure_tree(cache_dir)
+        self._load_entries()
+
+    def _load_entries(self):
+        """Adopt the files cached by a previous run."""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(_PART_SUFFIX):
+                # Left over by an interrupted download, unless another
+                # process is still writing it.
+                fd = _lock_file(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if fd is not None:
+                    fileutils.delete_if_exists(path)
+                    os.close(fd)
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_atime, name, path, stat.st_size))
+
+        for _atime, name, path, size in sorted(files):
+            self._entries[name] = _Entry(path, size)
+            self.size += size
+
+    @contextlib.contextmanager
+    def get(self, context, checksum, image_id, fetch):
+        """Provide the path of the cached image file with checksum.
+
+        If the file is not cached yet, fetch(path) is called to download it
+        to path. A single download takes place when several requests want
+        the same image at once. The file is not evicted until the context
+        is exited.
+        """
+        path = self._acquire(context, checksum, image_id, fetch)
+        try:
+            yield path
+        finally:
+            self._release(context, checksum)
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / requests if requests else 0.0,
+                'size': self.size,
+                'count': len(self._entries)}
+
+    def _acquire(self, context, checksum, image_id, fetch):
+        while True:
+            entry = self._entries.pop(checksum, None)
+            if entry is not None:
+                fd = _lock_file(entry.path, fcntl.LOCK_SH)
+                if fd is None:
+                    # Evicted by another process
+                    self.size -= entry.size
+                    continue
+                # Most recently used entries go last
+                self._entries[checksum] = entry
+                entry.fds.append(fd)
+                self.hits += 1
+                self._notify_cache_action(context, checksum, image_id, 'hit')
+                return entry.path
+
+            fill = self._fills.get(checksum)
+            if fill is None:
+                break
+            LOG.debug('Waiting for image %(image_id)s to be downloaded to '
+                      'the image file cache.', {'image_id': image_id})
+            fill.wait()
+
+        self._fills[checksum] = event.Event()
+        try:
+            # Other processes download to the same files
+            with lockutils.lock('image-file-cache-%s' % checksum,
+                                lock_file_prefix='cinder-', external=True):
+                path = os.path.join(self.cache_dir, checksum)
+                fd = _lock_file(path, fcntl.LOCK_SH)
+                if fd is not None:
+                    self.hits += 1
+                    action = 'hit'
+                else:
+                    self.misses += 1
+                    action = 'miss'
+                    fd = self._fill(path, checksum, image_id, fetch)
+        finally:
+            self._fills.pop(checksum).send()
+
+        entry = _Entry(path, os.fstat(fd).st_size)
+        entry.fds.append(fd)
+        self._entries[checksum] = entry
+        self.size += entry.size
+        self._notify_cache_action(context, checksum, image_id, action)
+        self._ensure_space(context)
+        return path
+
+    def _fill(self, path, checksum, image_id, fetch):
+        """Download the image to path, return a shared locked descriptor."""
+        part_path = path + _PART_SUFFIX
+        with fileutils.remove_path_on_error(part_path):
+            # Keeps other processes from removing the partial file
+            part_fd = os.open(part_path, os.O_WRONLY | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(part_fd, fcntl.LOCK_EX)
+                fetch(part_path)
+                # Other requests will trust the file to be the image with
+                # that checksum.
+                if tpool.execute(self._get_checksum, part_path) != checksum:
+                    raise exception.ImageUnacceptable(
+                        image_id=image_id,
+                        reason=_("Checksum of the downloaded image does not "
+                                 "match %s.") % checksum)
+                os.rename(part_path, path)
+                # Downgrade to the lock of the files in use
+                fcntl.flock(part_fd, fcntl.LOCK_SH)
+            except Exception:
+                os.close(part_fd)
+                raise
+        return part_fd
+
+    @staticmethod
+    def _get_checksum(path):
+        checksum = hashlib.md5()
+        with open(path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(units.Mi), b''):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+    def _release(self, context, checksum):
+        entry = self._entries.get(checksum)
+        if entry is not None:
+            os.close(entry.fds.pop())
+            self._ensure_space(context)
+
+    def _ensure_space(self, context):
+        """Evict unused files until the cache fits in its maximum size."""
+        if self.size <= self.max_size:
+            return
+
+        for checksum, entry in list(self._entries.items()):
+            if self.size <= self.max_size:
+                break
+            if entry.fds:
+                continue
+            if os.path.exists(entry.path):
+                fd = _lock_file(entry.path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if fd is None:
+                    # Used by another process
+                    continue
+                LOG.debug('Evicting image file cache entry %(path)s of '
+                          '%(size)s bytes.', {'path': entry.path,
+                                              'size': entry.size})
+                fileutils.delete_if_exists(entry.path)
+                os.close(fd)
+                self.evictions += 1
+                self._notify_cache_action(context, checksum, None, 'evict')
+            del self._entries[checksum]
+            self.size -= entry.size
+
+        if self.size > self.max_size:
+            LOG.warning(_LW('Image file cache does not have enough space, '
+                            'files in use take %(size)s bytes.'),
+                        {'size': self.size})
+
+    def _notify_cache_action(self, context, checksum, image_id, action):
+        data = {
+            'image_id': image_id,
+            'checksum': checksum,
+            'host': CONF.host,
+        }
+        data.update(self.stats())
+        LOG.debug('ImageFileCache notification: action=%(action)s'
+                  ' data=%(data)s.', {'action': action, 'data': data})
+        self.notifier.info(context, 'image_file_cache.%s' % action, data)
+
+
+_image_file_cache = None
+
+
+def get_image_file_cache():
+    """Return the image file cache of this node, None if it is disabled."""
+    global _image_file_cache
+    if _image_file_cache is None and CONF.image_file_cache_max_size_gb > 0:
+        _image_file_cache = ImageFileCache(
+            CONF.image_file_cache_dir,
+            CONF.image_file_cache_max_size_gb * units.Gi)
+    return _image_file_cache
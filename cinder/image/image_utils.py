@@ -39,6 +39,7 @@ from oslo_utils import units
 
 from cinder import exception
 from cinder.i18n import _, _LI, _LW
+from cinder.image import file_cache
 from cinder.openstack.common import imageutils
 from cinder import utils
 from cinder.volume import throttling
@@ -49,7 +50,15 @@ LOG = logging.getLogger(__name__)
 image_helper_opts = [cfg.StrOpt('image_conversion_dir',
                                 default='$state_path/conversion',
                                 help='Directory used for temporary storage '
-                                'during image conversion'), ]
+                                'during image conversion'),
+                     cfg.BoolOpt('image_fetch_raw_direct',
+                                 default=False,
+                                 help='If True, raw images are downloaded '
+                                 'straight to raw volumes instead of being '
+                                 'downloaded to a temporary file first and '
+                                 'then converted. The data written is '
+                                 'still checked to be a raw image when '
+                                 'qemu-img is available.'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_helper_opts)
@@ -180,6 +189,32 @@ def fetch(context, image_service, image_id, path, _user_id, _project_id):
     LOG.info(msg, {"sz": fsz_mb, "mbps": mbps})
 
 
+def fetch_direct(context, image_service, image_id, dest, run_as_root=True):
+    """Download an image straight to a volume device or file.
+
+    Unlike fetch(), dest is not removed if the download fails since it is the
+    volume itself.
+    """
+    start_time = timeutils.utcnow()
+    if run_as_root:
+        with utils.temporary_chown(dest):
+            _download_to(context, image_service, image_id, dest)
+    else:
+        _download_to(context, image_service, image_id, dest)
+    duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
+
+    LOG.debug("Image direct fetch details: dest %(dest)s, duration "
+              "%(duration).2f sec", {"dest": dest, "duration": duration})
+
+
+def _download_to(context, image_service, image_id, path):
+    with open(path, "wb") as image_file:
+        image_service.download(context, image_id, image_file)
+        # Make sure that all the data hit the device before it gets unmapped
+        image_file.flush()
+        os.fsync(image_file.fileno())
+
+
 def fetch_verify_image(context, image_service, image_id, dest,
                        user_id=None, project_id=None, size=None,
                        run_as_root=True):
@@ -267,70 +302,123 @@ def fetch_to_volume_format(context, image_service,
 
         tmp_images = TemporaryImages.for_image_service(image_service)
         tmp_image = tmp_images.get(context, image_id)
+        image_cache = file_cache.get_image_file_cache()
         if tmp_image:
             tmp = tmp_image
+        elif (volume_format == 'raw' and CONF.image_fetch_raw_direct and
+              image_meta and image_meta.get('disk_format') == 'raw'):
+            _fetch_raw_direct(context, image_service, image_id, dest,
+                              image_meta, size, qemu_img, run_as_root)
+            return
+        elif (image_cache is not None and image_meta and
+              image_meta.get('checksum') and
+              not is_xenserver_format(image_meta)):
+            def _fetch(path):
+                fetch(context, image_service, image_id, path, user_id,
+                      project_id)
+
+            with image_cache.get(context, image_meta['checksum'], image_id,
+                                 _fetch) as cached:
+                _image_file_to_volume(image_id, cached, dest, volume_format,
+                                      blocksize, image_meta, size, qemu_img,
+                                      run_as_root)
+            return
         else:
             fetch(context, image_service, image_id, tmp, user_id, project_id)
 
         if is_xenserver_image(context, image_service, image_id):
             replace_xenserver_image_with_coalesced_vhd(tmp)
 
-        if not qemu_img:
-            # qemu-img is not installed but we do have a RAW image.  As a
-            # result we only need to copy the image to the destination and then
-            # return.
-            LOG.debug('Copying image from %(tmp)s to volume %(dest)s - '
-                      'size: %(size)s', {'tmp': tmp, 'dest': dest,
-                                         'size': image_meta['size']})
-            image_size_m = math.ceil(image_meta['size'] / units.Mi)
-            volume_utils.copy_volume(tmp, dest, image_size_m, blocksize)
-            return
-
-        data = qemu_img_info(tmp, run_as_root=run_as_root)
-        virt_size = data.virtual_size / units.Gi
-
-        # NOTE(xqueralt): If the image virtual size doesn't fit in the
-        # requested volume there is no point on resizing it because it will
-        # generate an unusable image.
-        if size is not None and virt_size > size:
-            params = {'image_size': virt_size, 'volume_size': size}
-            reason = _("Size is %(image_size)dGB and doesn't fit in a "
-                       "volume of size %(volume_size)dGB.") % params
-            raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
-
-        fmt = data.file_format
-        if fmt is None:
-            raise exception.ImageUnacceptable(
-                reason=_("'qemu-img info' parsing failed."),
-                image_id=image_id)
-
-        backing_file = data.backing_file
-        if backing_file is not None:
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
-                % {'fmt': fmt, 'backing_file': backing_file, })
-
-        # NOTE(jdg): I'm using qemu-img convert to write
-        # to the volume regardless if it *needs* conversion or not
-        # TODO(avishay): We can speed this up by checking if the image is raw
-        # and if so, writing directly to the device. However, we need to keep
-        # check via 'qemu-img info' that what we copied was in fact a raw
-        # image and not a different format with a backing file, which may be
-        # malicious.
-        LOG.debug("%s was %s, converting to %s ", image_id, fmt, volume_format)
-        convert_image(tmp, dest, volume_format,
-                      run_as_root=run_as_root)
+        _image_file_to_volume(image_id, tmp, dest, volume_format, blocksize,
+                              image_meta, size, qemu_img, run_as_root)
+
+
+def _image_file_to_volume(image_id, tmp, dest, volume_format, blocksize,
+                          image_meta, size, qemu_img, run_as_root):
+    """Write the downloaded image file tmp to dest in volume_format."""
+    if not qemu_img:
+        # qemu-img is not installed but we do have a RAW image.  As a
+        # result we only need to copy the image to the destination and then
+        # return.
+        LOG.debug('Copying image from %(tmp)s to volume %(dest)s - '
+                  'size: %(size)s', {'tmp': tmp, 'dest': dest,
+                                     'size': image_meta['size']})
+        image_size_m = math.ceil(image_meta['size'] / units.Mi)
+        volume_utils.copy_volume(tmp, dest, image_size_m, blocksize)
+        return
 
-        data = qemu_img_info(dest, run_as_root=run_as_root)
+    data = qemu_img_info(tmp, run_as_root=run_as_root)
+    virt_size = data.virtual_size / units.Gi
+
+    # NOTE(xqueralt): If the image virtual size doesn't fit in the
+    # requested volume there is no point on resizing it because it will
+    # generate an unusable image.
+    if size is not None and virt_size > size:
+        params = {'image_size': virt_size, 'volume_size': size}
+        reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                   "volume of size %(volume_size)dGB.") % params
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+    fmt = data.file_format
+    if fmt is None:
+        raise exception.ImageUnacceptable(
+            reason=_("'qemu-img info' parsing failed."),
+            image_id=image_id)
+
+    backing_file = data.backing_file
+    if backing_file is not None:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
+            % {'fmt': fmt, 'backing_file': backing_file, })
+
+    # NOTE(jdg): I'm using qemu-img convert to write
+    # to the volume regardless if it *needs* conversion or not
+    # NOTE: raw images are written directly to raw volumes instead when
+    # image_fetch_raw_direct is enabled, see _fetch_raw_direct().
+    LOG.debug("%s was %s, converting to %s ", image_id, fmt, volume_format)
+    convert_image(tmp, dest, volume_format,
+                  run_as_root=run_as_root)
+
+    data = qemu_img_info(dest, run_as_root=run_as_root)
+
+    if not _validate_file_format(data, volume_format):
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("Converted to %(vol_format)s, but format is "
+                     "now %(file_format)s") % {'vol_format': volume_format,
+                                               'file_format': data.
+                                               file_format})
+
+
+def _fetch_raw_direct(context, image_service, image_id, dest, image_meta,
+                      size, qemu_img, run_as_root):
+    # NOTE: the virtual size of a raw image is its size, so it can be checked
+    # before anything is written to the volume.
+    virt_size = image_meta['size'] / units.Gi
+    if size is not None and virt_size > size:
+        params = {'image_size': virt_size, 'volume_size': size}
+        reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                   "volume of size %(volume_size)dGB.") % params
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+    LOG.debug("Fetching raw image %(image_id)s directly to %(dest)s",
+              {'image_id': image_id, 'dest': dest})
+    fetch_direct(context, image_service, image_id, dest,
+                 run_as_root=run_as_root)
+    if not qemu_img:
+        return
 
-        if not _validate_file_format(data, volume_format):
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("Converted to %(vol_format)s, but format is "
-                         "now %(file_format)s") % {'vol_format': volume_format,
-                                                   'file_format': data.
-                                                   file_format})
+    # Glance only has the word of the uploader that the image is raw, make
+    # sure that what was written is not a different format, which may have a
+    # malicious backing file.
+    data = qemu_img_info(dest, run_as_root=run_as_root)
+    if data.file_format != 'raw' or data.backing_file is not None:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("Image with disk format raw is %(fmt)s backed by: "
+                     "%(backing_file)s") %
+            {'fmt': data.file_format, 'backing_file': data.backing_file})
 
 
 def _validate_file_format(image_data, expected_format):
@@ -110,6 +110,16 @@ class Manager(base.Base, PeriodicTasks):
         """
         pass
 
+    def cleanup_host(self):
+        """A hook for service to do jobs when the service stops.
+
+        It is called once the service stopped accepting RPC calls, so that
+        work deferred by the service can be completed before it exits.
+        Child classes should override this method.
+
+        """
+        pass
+
     def service_version(self):
         return version.version_string()
 
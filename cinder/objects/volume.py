@@ -26,6 +26,13 @@ from cinder.objects import base
 CONF = cfg.CONF
 OPTIONAL_FIELDS = ['metadata', 'admin_metadata',
                    'volume_type', 'volume_attachment']
+# DB relationships holding the data of each optional field
+OPTIONAL_FIELDS_COLUMNS = {
+    'metadata': ['volume_metadata'],
+    'admin_metadata': ['volume_admin_metadata'],
+    'volume_type': ['volume_type', 'volume_type.extra_specs'],
+    'volume_attachment': ['volume_attachment'],
+}
 LOG = logging.getLogger(__name__)
 
 
@@ -262,7 +269,10 @@ class Volume(base.CinderPersistentObject, base.CinderObject,
 
 @base.CinderObjectRegistry.register
 class VolumeList(base.ObjectListBase, base.CinderObject):
-    VERSION = '1.1'
+    # Version 1.0: Initial version
+    # Version 1.1: Volume 1.1
+    # Version 1.2: Added expected_attrs to get_all and get_all_by_project
+    VERSION = '1.2'
 
     fields = {
         'objects': fields.ListOfObjectsField('Volume'),
@@ -271,15 +281,25 @@ class VolumeList(base.ObjectListBase, base.CinderObject):
     child_versions = {
         '1.0': '1.0',
         '1.1': '1.1',
+        '1.2': '1.1',
     }
 
+    @staticmethod
+    def _get_columns_to_join(expected_attrs):
+        columns_to_join = []
+        for attr in expected_attrs:
+            columns_to_join.extend(OPTIONAL_FIELDS_COLUMNS[attr])
+        return columns_to_join
+
     @base.remotable_classmethod
     def get_all(cls, context, marker, limit, sort_keys=None, sort_dirs=None,
-                filters=None, offset=None):
-        volumes = db.volume_get_all(context, marker, limit,
-                                    sort_keys=sort_keys, sort_dirs=sort_dirs,
-                                    filters=filters, offset=offset)
-        expected_attrs = ['admin_metadata', 'metadata']
+                filters=None, offset=None, expected_attrs=None):
+        if expected_attrs is None:
+            expected_attrs = ['admin_metadata', 'metadata']
+        volumes = db.volume_get_all(
+            context, marker, limit, sort_keys=sort_keys, sort_dirs=sort_dirs,
+            filters=filters, offset=offset,
+            columns_to_join=cls._get_columns_to_join(expected_attrs))
         return base.obj_make_list(context, cls(context), objects.Volume,
                                   volumes, expected_attrs=expected_attrs)
 
@@ -300,11 +320,12 @@ class VolumeList(base.ObjectListBase, base.CinderObject):
     @base.remotable_classmethod
     def get_all_by_project(cls, context, project_id, marker, limit,
                            sort_keys=None, sort_dirs=None, filters=None,
-                           offset=None):
-        volumes = db.volume_get_all_by_project(context, project_id, marker,
-                                               limit, sort_keys=sort_keys,
-                                               sort_dirs=sort_dirs,
-                                               filters=filters, offset=offset)
-        expected_attrs = ['admin_metadata', 'metadata']
+                           offset=None, expected_attrs=None):
+        if expected_attrs is None:
+            expected_attrs = ['admin_metadata', 'metadata']
+        volumes = db.volume_get_all_by_project(
+            context, project_id, marker, limit, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, filters=filters, offset=offset,
+            columns_to_join=cls._get_columns_to_join(expected_attrs))
         return base.obj_make_list(context, cls(context), objects.Volume,
                                   volumes, expected_attrs=expected_attrs)
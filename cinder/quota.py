@@ -18,6 +18,7 @@
 
 
 import datetime
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -73,7 +74,14 @@ quota_opts = [
                      'with default quota.'),
     cfg.IntOpt('per_volume_size_limit',
                default=-1,
-               help='Max size allowed per volume, in gigabytes'), ]
+               help='Max size allowed per volume, in gigabytes'),
+    cfg.IntOpt('quota_resource_cache_ttl',
+               default=0,
+               help='Number of seconds the quota resources of the volume '
+                    'types are cached for, 0 disables the cache. The cache '
+                    'is also refreshed when volume types are changed '
+                    'through this service, or when an unknown resource '
+                    'is reserved'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(quota_opts)
@@ -910,10 +918,48 @@ class QuotaEngine(object):
 class VolumeTypeQuotaEngine(QuotaEngine):
     """Represent the set of all quotas."""
 
+    def __init__(self, quota_driver_class=None):
+        super(VolumeTypeQuotaEngine, self).__init__(quota_driver_class)
+        self._cached_resources = None
+        self._cached_resources_expiry = 0
+
     @property
     def resources(self):
         """Fetches all possible quota resources."""
 
+        if (self._cached_resources is not None and
+                time.time() < self._cached_resources_expiry):
+            return self._cached_resources
+
+        result = self._get_resources()
+        if CONF.quota_resource_cache_ttl > 0:
+            self._cached_resources = result
+            self._cached_resources_expiry = (time.time() +
+                                             CONF.quota_resource_cache_ttl)
+        return result
+
+    def invalidate_resources(self):
+        """Drops the cached resources, to be called on volume type changes."""
+        self._cached_resources = None
+
+    def _refresh_unknown_resources(self, names):
+        # The volume type may have been created by another service since
+        # the resources were cached.
+        if (self._cached_resources is not None and
+                not set(names).issubset(self._cached_resources)):
+            self.invalidate_resources()
+
+    def limit_check(self, context, project_id=None, **values):
+        self._refresh_unknown_resources(values)
+        return super(VolumeTypeQuotaEngine, self).limit_check(
+            context, project_id=project_id, **values)
+
+    def reserve(self, context, expire=None, project_id=None, **deltas):
+        self._refresh_unknown_resources(deltas)
+        return super(VolumeTypeQuotaEngine, self).reserve(
+            context, expire=expire, project_id=project_id, **deltas)
+
+    def _get_resources(self):
         result = {}
         # Global quotas.
         argses = [('volumes', '_sync_volumes', 'quota_volumes'),
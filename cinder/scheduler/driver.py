@@ -100,6 +100,26 @@ class Scheduler(object):
         """Must override schedule method for scheduler to work."""
         raise NotImplementedError(_("Must implement schedule_create_volume"))
 
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list):
+        """Schedule a batch of volumes.
+
+        Returns a list holding for each request either None, if the volume
+        was scheduled, or the exception that prevented it. Schedulers placing
+        a batch more efficiently than one volume at a time override this.
+        """
+        results = []
+        for request_spec, filter_properties in zip(request_spec_list,
+                                                   filter_properties_list):
+            try:
+                self.schedule_create_volume(context, request_spec,
+                                            filter_properties or {})
+            except Exception as ex:
+                results.append(ex)
+            else:
+                results.append(None)
+        return results
+
     def schedule_create_consistencygroup(self, context, group,
                                          request_spec_list,
                                          filter_properties_list):
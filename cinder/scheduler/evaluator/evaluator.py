@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import operator
 import re
 
@@ -38,30 +39,42 @@ class EvalConstant(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        result = self.value
-        if (isinstance(result, six.string_types) and
-                re.match("^[a-zA-Z_]+\.[a-zA-Z_]+$", result)):
-            (which_dict, entry) = result.split('.')
-            try:
-                result = _vars[which_dict][entry]
-            except KeyError as e:
-                raise exception.EvaluatorParseException(
-                    _("KeyError: %s") % six.text_type(e))
-            except TypeError as e:
-                raise exception.EvaluatorParseException(
-                    _("TypeError: %s") % six.text_type(e))
+    def compile(self):
+        value = self.value
+        if (isinstance(value, six.string_types) and
+                re.match("^[a-zA-Z_]+\.[a-zA-Z_]+$", value)):
+            (which_dict, entry) = value.split('.')
+
+            def _variable(variables):
+                try:
+                    result = variables[which_dict][entry]
+                except KeyError as e:
+                    raise exception.EvaluatorParseException(
+                        _("KeyError: %s") % six.text_type(e))
+                except TypeError as e:
+                    raise exception.EvaluatorParseException(
+                        _("TypeError: %s") % six.text_type(e))
+                return _to_number(result)
+            return _variable
 
         try:
-            result = int(result)
-        except ValueError:
-            try:
-                result = float(result)
-            except ValueError as e:
-                raise exception.EvaluatorParseException(
-                    _("ValueError: %s") % six.text_type(e))
+            result = _to_number(value)
+        except exception.EvaluatorParseException:
+            # Only fail if the constant is actually used, it may be in a
+            # branch which is never taken.
+            return lambda variables: _to_number(value)
+        return lambda variables: result
 
-        return result
+
+def _to_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError as e:
+            raise exception.EvaluatorParseException(
+                _("ValueError: %s") % six.text_type(e))
 
 
 class EvalSignOp(object):
@@ -73,59 +86,80 @@ class EvalSignOp(object):
     def __init__(self, toks):
         self.sign, self.value = toks[0]
 
-    def eval(self):
-        return self.operations[self.sign] * self.value.eval()
+    def compile(self):
+        sign = self.operations[self.sign]
+        value = self.value.compile()
+        return lambda variables: sign * value(variables)
 
 
 class EvalAddOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        sum = self.value[0].eval()
-        for op, val in _operatorOperands(self.value[1:]):
-            if op == '+':
-                sum += val.eval()
-            elif op == '-':
-                sum -= val.eval()
-        return sum
+    def compile(self):
+        first = self.value[0].compile()
+        operations = [(op, val.compile())
+                      for op, val in _operatorOperands(self.value[1:])]
+
+        def _add(variables):
+            sum = first(variables)
+            for op, val in operations:
+                if op == '+':
+                    sum += val(variables)
+                elif op == '-':
+                    sum -= val(variables)
+            return sum
+        return _add
 
 
 class EvalMultOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        prod = self.value[0].eval()
-        for op, val in _operatorOperands(self.value[1:]):
-            try:
-                if op == '*':
-                    prod *= val.eval()
-                elif op == '/':
-                    prod /= float(val.eval())
-            except ZeroDivisionError as e:
-                raise exception.EvaluatorParseException(
-                    _("ZeroDivisionError: %s") % six.text_type(e))
-        return prod
+    def compile(self):
+        first = self.value[0].compile()
+        operations = [(op, val.compile())
+                      for op, val in _operatorOperands(self.value[1:])]
+
+        def _mult(variables):
+            prod = first(variables)
+            for op, val in operations:
+                try:
+                    if op == '*':
+                        prod *= val(variables)
+                    elif op == '/':
+                        prod /= float(val(variables))
+                except ZeroDivisionError as e:
+                    raise exception.EvaluatorParseException(
+                        _("ZeroDivisionError: %s") % six.text_type(e))
+            return prod
+        return _mult
 
 
 class EvalPowerOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        prod = self.value[0].eval()
-        for op, val in _operatorOperands(self.value[1:]):
-            prod = pow(prod, val.eval())
-        return prod
+    def compile(self):
+        first = self.value[0].compile()
+        operands = [val.compile()
+                    for op, val in _operatorOperands(self.value[1:])]
+
+        def _power(variables):
+            prod = first(variables)
+            for val in operands:
+                prod = pow(prod, val(variables))
+            return prod
+        return _power
 
 
 class EvalNegateOp(object):
     def __init__(self, toks):
         self.negation, self.value = toks[0]
 
-    def eval(self):
-        return not self.value.eval()
+    def compile(self):
+        value = self.value.compile()
+        return lambda variables: not value(variables)
 
 
 class EvalComparisonOp(object):
@@ -142,29 +176,39 @@ class EvalComparisonOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        val1 = self.value[0].eval()
-        for op, val in _operatorOperands(self.value[1:]):
-            fn = self.operations[op]
-            val2 = val.eval()
-            if not fn(val1, val2):
-                break
-            val1 = val2
-        else:
-            return True
-        return False
+    def compile(self):
+        first = self.value[0].compile()
+        operations = [(self.operations[op], val.compile())
+                      for op, val in _operatorOperands(self.value[1:])]
+
+        def _compare(variables):
+            val1 = first(variables)
+            for fn, val in operations:
+                val2 = val(variables)
+                if not fn(val1, val2):
+                    break
+                val1 = val2
+            else:
+                return True
+            return False
+        return _compare
 
 
 class EvalTernaryOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        condition = self.value[0].eval()
-        if condition:
-            return self.value[2].eval()
-        else:
-            return self.value[4].eval()
+    def compile(self):
+        condition = self.value[0].compile()
+        if_true = self.value[2].compile()
+        if_false = self.value[4].compile()
+
+        def _ternary(variables):
+            if condition(variables):
+                return if_true(variables)
+            else:
+                return if_false(variables)
+        return _ternary
 
 
 class EvalFunction(object):
@@ -177,52 +221,75 @@ class EvalFunction(object):
     def __init__(self, toks):
         self.func, self.value = toks[0]
 
-    def eval(self):
-        args = self.value.eval()
-        if type(args) is list:
-            return self.functions[self.func](*args)
-        else:
-            return self.functions[self.func](args)
+    def compile(self):
+        func = self.func
+        value = self.value.compile()
+
+        def _function(variables):
+            args = value(variables)
+            if type(args) is list:
+                return self.functions[func](*args)
+            else:
+                return self.functions[func](args)
+        return _function
 
 
 class EvalCommaSeperator(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        val1 = self.value[0].eval()
-        val2 = self.value[2].eval()
-        if type(val2) is list:
-            val_list = []
-            val_list.append(val1)
-            for val in val2:
-                val_list.append(val)
-            return val_list
+    def compile(self):
+        first = self.value[0].compile()
+        second = self.value[2].compile()
+
+        def _comma(variables):
+            val1 = first(variables)
+            val2 = second(variables)
+            if type(val2) is list:
+                val_list = []
+                val_list.append(val1)
+                for val in val2:
+                    val_list.append(val)
+                return val_list
 
-        return [val1, val2]
+            return [val1, val2]
+        return _comma
 
 
 class EvalBoolAndOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        left = self.value[0].eval()
-        right = self.value[2].eval()
-        return left and right
+    def compile(self):
+        left = self.value[0].compile()
+        right = self.value[2].compile()
+
+        def _and(variables):
+            left_value = left(variables)
+            right_value = right(variables)
+            return left_value and right_value
+        return _and
 
 
 class EvalBoolOrOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        left = self.value[0].eval()
-        right = self.value[2].eval()
-        return left or right
+    def compile(self):
+        left = self.value[0].compile()
+        right = self.value[2].compile()
+
+        def _or(variables):
+            left_value = left(variables)
+            right_value = right(variables)
+            return left_value or right_value
+        return _or
 
 _parser = None
-_vars = {}
+
+# Compiled expressions by expression text, least recently used first.
+_compiled = collections.OrderedDict()
+_MAX_COMPILED = 256
 
 
 def _def_parser():
@@ -272,6 +339,33 @@ def _def_parser():
     return expr
 
 
+def _compile(expression):
+    """Returns a function evaluating the expression for given variables.
+
+    Parsing is far more expensive than evaluating, and the same filter and
+    goodness functions are evaluated for every pool on every request, so
+    the compiled expressions are cached.
+    """
+    try:
+        func = _compiled.pop(expression)
+    except KeyError:
+        global _parser
+        if _parser is None:
+            _parser = _def_parser()
+
+        try:
+            result = _parser.parseString(expression, parseAll=True)[0]
+        except pyparsing.ParseException as e:
+            raise exception.EvaluatorParseException(
+                _("ParseException: %s") % six.text_type(e))
+        func = result.compile()
+        if len(_compiled) >= _MAX_COMPILED:
+            _compiled.popitem(last=False)
+
+    _compiled[expression] = func
+    return func
+
+
 def evaluate(expression, **kwargs):
     """Evaluates an expression.
 
@@ -281,17 +375,4 @@ def evaluate(expression, **kwargs):
     Supports both integer and floating point values, and automatic
     promotion where necessary.
     """
-    global _parser
-    if _parser is None:
-        _parser = _def_parser()
-
-    global _vars
-    _vars = kwargs
-
-    try:
-        result = _parser.parseString(expression, parseAll=True)[0]
-    except pyparsing.ParseException as e:
-        raise exception.EvaluatorParseException(
-            _("ParseException: %s") % six.text_type(e))
-
-    return result.eval()
+    return _compile(expression)(kwargs)
@@ -20,8 +20,11 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import collections
+
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 from cinder import exception
 from cinder.i18n import _, _LE, _LW
@@ -87,6 +90,96 @@ class FilterScheduler(driver.Scheduler):
         if not weighed_host:
             raise exception.NoValidHost(reason=_("No weighed hosts available"))
 
+        self._create_volume_on_host(context, request_spec, filter_properties,
+                                    weighed_host)
+
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list):
+        """Schedule a batch of volumes.
+
+        Requests are grouped by the properties other than size that filters
+        look at, and the hosts are filtered once per group using its smallest
+        volume. Each volume is then placed on the best weighed of those hosts
+        that still passes the filters with the capacity consumed by the
+        volumes placed before it.
+        """
+        elevated = context.elevated()
+        results = [None] * len(request_spec_list)
+        groups = collections.OrderedDict()
+        for index, request_spec in enumerate(request_spec_list):
+            filter_properties = filter_properties_list[index]
+            if filter_properties is None:
+                filter_properties = {}
+            try:
+                self._populate_filter_properties(context, request_spec,
+                                                 filter_properties)
+            except exception.NoValidHost as ex:
+                results[index] = ex
+                continue
+            signature = self._get_filter_signature(filter_properties)
+            groups.setdefault(signature, []).append(
+                (index, request_spec, filter_properties))
+
+        all_hosts = self.host_manager.get_all_host_states(elevated)
+        for requests in groups.values():
+            smallest = min(requests, key=lambda request: request[2]['size'])
+            candidates = self.host_manager.get_filtered_hosts(all_hosts,
+                                                              smallest[2])
+            LOG.debug("Filtered %(hosts)s for %(count)d volumes",
+                      {'hosts': candidates, 'count': len(requests)})
+            for index, request_spec, filter_properties in requests:
+                try:
+                    weighed_host = self._choose_batch_host(
+                        candidates, request_spec, filter_properties)
+                    if not weighed_host:
+                        # Filters can look at the size in ways that a group
+                        # filtered with its smallest volume does not cover.
+                        weighed_host = self._choose_batch_host(
+                            all_hosts, request_spec, filter_properties)
+                    if not weighed_host:
+                        LOG.warning(_LW('No weighed hosts found for volume '
+                                        'with properties: %s'),
+                                    request_spec.get('volume_type'))
+                        raise exception.NoValidHost(
+                            reason=_("No weighed hosts available"))
+                    self._create_volume_on_host(context, request_spec,
+                                                filter_properties,
+                                                weighed_host)
+                except Exception as ex:
+                    results[index] = ex
+        return results
+
+    @staticmethod
+    def _get_filter_signature(filter_properties):
+        """Return what filters look at in a request, apart from its size."""
+        return jsonutils.dumps(
+            [filter_properties.get(key) for key in ('resource_type',
+                                                    'availability_zone',
+                                                    'scheduler_hints',
+                                                    'metadata',
+                                                    'qos_specs',
+                                                    'user_id')],
+            sort_keys=True)
+
+    def _choose_batch_host(self, hosts, request_spec, filter_properties):
+        """Choose a host for a request from a batch.
+
+        The hosts have already been filtered for a similar request, so only
+        the best weighed ones are checked against the filters again until
+        one passes.
+        """
+        if not hosts:
+            return None
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                                                            filter_properties)
+        for weighed_host in weighed_hosts:
+            if self.host_manager.get_filtered_hosts([weighed_host.obj],
+                                                    filter_properties):
+                return self._choose_top_host([weighed_host], request_spec)
+        return None
+
+    def _create_volume_on_host(self, context, request_spec,
+                               filter_properties, weighed_host):
         host = weighed_host.obj.host
         volume_id = request_spec['volume_id']
 
@@ -257,6 +350,35 @@ class FilterScheduler(driver.Scheduler):
         """
         elevated = context.elevated()
 
+        if filter_properties is None:
+            filter_properties = {}
+        self._populate_filter_properties(context, request_spec,
+                                         filter_properties)
+
+        # Find our local list of acceptable hosts by filtering and
+        # weighing our options. we virtually consume resources on
+        # it so subsequent selections can adjust accordingly.
+
+        # Note: remember, we are using an iterator here. So only
+        # traverse this list once.
+        hosts = self.host_manager.get_all_host_states(elevated)
+
+        # Filter local hosts based on requirements ...
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                                                     filter_properties)
+        if not hosts:
+            return []
+
+        LOG.debug("Filtered %s", hosts)
+        # weighted_host = WeightedHost() ... the best
+        # host for the job.
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                                                            filter_properties)
+        return weighed_hosts
+
+    def _populate_filter_properties(self, context, request_spec,
+                                    filter_properties):
+        """Fill in the filter properties for a volume request."""
         volume_properties = request_spec['volume_properties']
         # Since Cinder is using mixed filters from Oslo and it's own, which
         # takes 'resource_XX' and 'volume_XX' as input respectively, copying
@@ -268,8 +390,6 @@ class FilterScheduler(driver.Scheduler):
 
         config_options = self._get_configuration_options()
 
-        if filter_properties is None:
-            filter_properties = {}
         self._populate_retry(filter_properties, resource_properties)
 
         filter_properties.update({'context': context,
@@ -293,27 +413,6 @@ class FilterScheduler(driver.Scheduler):
             resource_type['extra_specs'].update(
                 multiattach='<is> True')
 
-        # Find our local list of acceptable hosts by filtering and
-        # weighing our options. we virtually consume resources on
-        # it so subsequent selections can adjust accordingly.
-
-        # Note: remember, we are using an iterator here. So only
-        # traverse this list once.
-        hosts = self.host_manager.get_all_host_states(elevated)
-
-        # Filter local hosts based on requirements ...
-        hosts = self.host_manager.get_filtered_hosts(hosts,
-                                                     filter_properties)
-        if not hosts:
-            return []
-
-        LOG.debug("Filtered %s", hosts)
-        # weighted_host = WeightedHost() ... the best
-        # host for the job.
-        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                                                            filter_properties)
-        return weighed_hosts
-
     def _get_weighted_candidates_group(self, context, request_spec_list,
                                        filter_properties_list=None):
         """Finds hosts that supports the consistencygroup.
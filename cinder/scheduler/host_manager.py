@@ -17,6 +17,7 @@
 Manage hosts in the current zone.
 """
 
+import time
 import UserDict
 
 from oslo_config import cfg
@@ -46,7 +47,14 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_service_cache_ttl',
+               default=0,
+               help='Number of seconds the list of enabled and running '
+                    'volume services is cached by the scheduler. Within '
+                    'this period only backends reporting new capabilities '
+                    'are refreshed when scheduling. 0 looks up the '
+                    'services on every scheduling request.'),
 ]
 
 CONF = cfg.CONF
@@ -358,6 +366,17 @@ class HostManager(object):
         self.weight_classes = self.weight_handler.get_all_classes()
 
         self._no_capabilities_hosts = set()  # Hosts having no capabilities
+        # Capabilities last applied to each host state, so that unchanged
+        # hosts are not updated again. Reports always come as a new dict.
+        self._applied_capabilities = {}
+        # All pools of the hosts in host_state_map, kept up to date as the
+        # hosts are updated: { <host>.<pool_name>: PoolState }
+        self._pool_index = {}
+        self._host_pool_keys = {}
+        # Up volume services as { <host>: <service dict> } and the time
+        # after which they have to be looked up again.
+        self._up_services = {}
+        self._up_services_expiry = 0
         self._update_host_state_map(cinder_context.get_admin_context())
 
     def _choose_host_filters(self, filter_cls_names):
@@ -450,29 +469,70 @@ class HostManager(object):
                    'cap': capabilities})
 
         self._no_capabilities_hosts.discard(host)
+        if host not in self._up_services:
+            # A service we did not know to be up has reported, look the
+            # services up again rather than ignoring it until they expire.
+            self._up_services_expiry = 0
 
     def has_all_capabilities(self):
         return len(self._no_capabilities_hosts) == 0
 
-    def _update_host_state_map(self, context):
+    def _refresh_up_services(self, context):
+        """Look up the running volume services if the cached list expired.
+
+        Returns True if the services were looked up.
+        """
+        now = time.time()
+        if now < self._up_services_expiry:
+            return False
 
         # Get resource usage across the available volume nodes:
         topic = CONF.volume_topic
         volume_services = objects.ServiceList.get_all_by_topic(context,
                                                                topic,
                                                                disabled=False)
-        active_hosts = set()
-        no_capabilities_hosts = set()
+        up_services = {}
         for service in volume_services.objects:
             host = service.host
             if not utils.service_is_up(service):
                 LOG.warning(_LW("volume service is down. (host: %s)"), host)
                 continue
+            up_services[host] = dict(service)
+
+        self._up_services = up_services
+        self._up_services_expiry = now + CONF.scheduler_service_cache_ttl
+        return True
+
+    def _index_host_pools(self, host):
+        for pool_key in self._host_pool_keys.pop(host, []):
+            del self._pool_index[pool_key]
+
+        host_state = self.host_state_map.get(host)
+        if host_state is None:
+            return
+        pool_keys = []
+        for pool in host_state.pools.values():
+            # use host.pool_name to make sure key is unique
+            pool_key = '.'.join([host, pool.pool_name])
+            self._pool_index[pool_key] = pool
+            pool_keys.append(pool_key)
+        self._host_pool_keys[host] = pool_keys
+
+    def _update_host_state_map(self, context):
+        # The service records change on every heartbeat, so all hosts are
+        # updated when they are looked up, otherwise only the hosts which
+        # have reported new capabilities since the last update.
+        refreshed = self._refresh_up_services(context)
+
+        active_hosts = set()
+        no_capabilities_hosts = set()
+        for host, service in self._up_services.items():
             capabilities = self.service_states.get(host, None)
             if capabilities is None:
                 no_capabilities_hosts.add(host)
                 continue
 
+            active_hosts.add(host)
             host_state = self.host_state_map.get(host)
             if not host_state:
                 host_state = self.host_state_cls(host,
@@ -480,11 +540,15 @@ class HostManager(object):
                                                  service=
                                                  dict(service))
                 self.host_state_map[host] = host_state
+            elif (not refreshed and
+                    self._applied_capabilities.get(host) is capabilities):
+                continue
             # update capabilities and attributes in host_state
             host_state.update_from_volume_capability(capabilities,
                                                      service=
                                                      dict(service))
-            active_hosts.add(host)
+            self._applied_capabilities[host] = capabilities
+            self._index_host_pools(host)
 
         self._no_capabilities_hosts = no_capabilities_hosts
 
@@ -494,6 +558,8 @@ class HostManager(object):
             LOG.info(_LI("Removing non-active host: %(host)s from "
                          "scheduler cache."), {'host': host})
             del self.host_state_map[host]
+            self._applied_capabilities.pop(host, None)
+            self._index_host_pools(host)
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager knows about.
@@ -507,16 +573,8 @@ class HostManager(object):
 
         self._update_host_state_map(context)
 
-        # build a pool_state map and return that map instead of host_state_map
-        all_pools = {}
-        for host, state in self.host_state_map.items():
-            for key in state.pools:
-                pool = state.pools[key]
-                # use host.pool_name to make sure key is unique
-                pool_key = '.'.join([host, pool.pool_name])
-                all_pools[pool_key] = pool
-
-        return all_pools.values()
+        # return the pool_state map instead of host_state_map
+        return list(self._pool_index.values())
 
     def get_pools(self, context):
         """Returns a dict of all pools on all hosts HostManager knows about."""
@@ -55,7 +55,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.8'
+    RPC_API_VERSION = '1.9'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -135,6 +135,23 @@ class SchedulerManager(manager.Manager):
         with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
             flow_engine.run()
 
+    def create_volumes(self, context, topic, request_spec_list,
+                       filter_properties_list=None):
+        """Schedule a batch of volumes, placing them all at once."""
+
+        self._wait_for_scheduler()
+        if filter_properties_list is None:
+            filter_properties_list = [{} for _spec in request_spec_list]
+        results = self.driver.schedule_create_volumes(context,
+                                                      request_spec_list,
+                                                      filter_properties_list)
+        for request_spec, ex in zip(request_spec_list, results):
+            if ex is not None:
+                volume_state = {'volume_state': {'status': 'error'}}
+                self._set_volume_state_and_notify('create_volume',
+                                                  volume_state, context, ex,
+                                                  request_spec)
+
     def request_service_capabilities(self, context):
         volume_rpcapi.VolumeAPI().publish_service_capabilities(context)
 
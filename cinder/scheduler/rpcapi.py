@@ -42,6 +42,7 @@ class SchedulerAPI(object):
         1.6 - Add create_consistencygroup method
         1.7 - Add get_active_pools method
         1.8 - Add sending object over RPC in create_consistencygroup method
+        1.9 - Add create_volumes method
     """
 
     RPC_API_VERSION = '1.0'
@@ -51,7 +52,7 @@ class SchedulerAPI(object):
         target = messaging.Target(topic=CONF.scheduler_topic,
                                   version=self.RPC_API_VERSION)
         serializer = objects_base.CinderObjectSerializer()
-        self.client = rpc.get_client(target, version_cap='1.8',
+        self.client = rpc.get_client(target, version_cap='1.9',
                                      serializer=serializer)
 
     def create_consistencygroup(self, ctxt, topic, group,
@@ -84,6 +85,20 @@ class SchedulerAPI(object):
                           request_spec=request_spec_p,
                           filter_properties=filter_properties)
 
+    def create_volumes(self, ctxt, topic, request_spec_list,
+                       filter_properties_list=None):
+
+        cctxt = self.client.prepare(version='1.9')
+        request_spec_p_list = []
+        for request_spec in request_spec_list:
+            request_spec_p = jsonutils.to_primitive(request_spec)
+            request_spec_p_list.append(request_spec_p)
+
+        return cctxt.cast(ctxt, 'create_volumes',
+                          topic=topic,
+                          request_spec_list=request_spec_p_list,
+                          filter_properties_list=filter_properties_list)
+
     def migrate_volume_to_host(self, ctxt, topic, volume_id, host,
                                force_host_copy=False, request_spec=None,
                                filter_properties=None):
@@ -275,6 +275,10 @@ class Service(service.Service):
             except Exception:
                 pass
         self.timers = []
+        try:
+            self.manager.cleanup_host()
+        except Exception:
+            LOG.exception(_LE('Service %s failed to clean up.'), self.binary)
         super(Service, self).stop()
 
     def wait(self):
@@ -17,6 +17,9 @@
 Tests dealing with HTTP rate-limiting.
 """
 
+import os
+import shutil
+import tempfile
 from xml.dom import minidom
 
 from lxml import etree
@@ -564,6 +567,78 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class BucketLimiterTest(LimiterTest):
+
+    """Tests for the `limits.BucketLimiter` class."""
+
+    def setUp(self):
+        super(BucketLimiterTest, self).setUp()
+        userlimits = {'limits.user3': '',
+                      'limits.user0': '(get, *, .*, 4, minute);'
+                                      '(put, *, .*, 2, minute)'}
+        self.limiter = self._create_limiter(**userlimits)
+
+    def _create_limiter(self, **kwargs):
+        return limits.BucketLimiter(TEST_LIMITS, **kwargs)
+
+
+class SharedMemoryLimiterTest(BucketLimiterTest):
+
+    """Tests for the `limits.SharedMemoryLimiter` class."""
+
+    def _create_limiter(self, **kwargs):
+        if not hasattr(self, 'tmpdir'):
+            self.tmpdir = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, self.tmpdir)
+        path = os.path.join(self.tmpdir, 'limits')
+        return limits.SharedMemoryLimiter(TEST_LIMITS, limiter_path=path,
+                                          limiter_slots='64', **kwargs)
+
+    def test_buckets_shared(self):
+        other = self._create_limiter()
+        for _i in range(5):
+            self.assertEqual((None, None),
+                             self.limiter.check_for_delay("PUT", "/anything"))
+            self.assertEqual((None, None),
+                             other.check_for_delay("PUT", "/anything"))
+        self.assertEqual(6.0, other.check_for_delay("PUT", "/anything")[0])
+        self.assertEqual(6.0,
+                         self.limiter.check_for_delay("PUT", "/anything")[0])
+
+    def test_drained_slots_reused(self):
+        self.limiter.table.PROBES = 1
+        self.limiter.table.slots = 1
+        self.assertIsNone(self.limiter.check_for_delay("GET", "/delayed",
+                                                       "user1")[0])
+        # The slot of user1 is used until its bucket is drained
+        self.assertIsNone(self.limiter.check_for_delay("GET", "/delayed",
+                                                       "user2")[0])
+        self.assertEqual(60.0, self.limiter.check_for_delay(
+            "GET", "/delayed", "user1")[0])
+
+        self.time += 60.0
+        self.assertIsNone(self.limiter.check_for_delay("GET", "/delayed",
+                                                       "user2")[0])
+        self.assertEqual(60.0, self.limiter.check_for_delay(
+            "GET", "/delayed", "user2")[0])
+
+
+class FileLimiterTest(SharedMemoryLimiterTest):
+
+    """Tests for the `limits.FileLimiter` class."""
+
+    def _create_limiter(self, **kwargs):
+        if not hasattr(self, 'tmpdir'):
+            self.tmpdir = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, self.tmpdir)
+        path = os.path.join(self.tmpdir, 'limits')
+        return limits.FileLimiter(TEST_LIMITS, limiter_path=path,
+                                  limiter_slots='64', **kwargs)
+
+    def test_path_required(self):
+        self.assertRaises(ValueError, limits.FileLimiter, TEST_LIMITS)
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
 
     """Tests for `limits.WsgiLimiter` class."""
@@ -775,7 +775,8 @@ class VolumeApiTest(test.TestCase):
                                            sort_keys=None, sort_dirs=None,
                                            filters=None,
                                            viewable_admin_meta=False,
-                                           offset=0):
+                                           offset=0,
+                                           columns_to_join=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -872,7 +873,8 @@ class VolumeApiTest(test.TestCase):
                                            sort_keys=None, sort_dirs=None,
                                            filters=None,
                                            viewable_admin_meta=False,
-                                           offset=0):
+                                           offset=0,
+                                           columns_to_join=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -1046,7 +1048,8 @@ class VolumeApiTest(test.TestCase):
                                            sort_keys=None, sort_dirs=None,
                                            filters=None,
                                            viewable_admin_meta=False,
-                                           offset=0):
+                                           offset=0,
+                                           columns_to_join=None):
             self.assertEqual(True, filters['no_migration_targets'])
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol1')]
@@ -1054,7 +1057,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all(context, marker, limit,
                                 sort_keys=None, sort_dirs=None,
                                 filters=None,
-                                viewable_admin_meta=False, offset=0):
+                                viewable_admin_meta=False, offset=0,
+                                columns_to_join=None):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
@@ -1073,14 +1077,16 @@ class VolumeApiTest(test.TestCase):
                                             sort_keys=None, sort_dirs=None,
                                             filters=None,
                                             viewable_admin_meta=False,
-                                            offset=0):
+                                            offset=0,
+                                            columns_to_join=None):
             self.assertFalse('no_migration_targets' in filters)
             return [stubs.stub_volume(1, display_name='vol2')]
 
         def stub_volume_get_all2(context, marker, limit,
                                  sort_keys=None, sort_dirs=None,
                                  filters=None,
-                                 viewable_admin_meta=False, offset=0):
+                                 viewable_admin_meta=False, offset=0,
+                                 columns_to_join=None):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project2)
@@ -1097,13 +1103,15 @@ class VolumeApiTest(test.TestCase):
                                             sort_keys=None, sort_dirs=None,
                                             filters=None,
                                             viewable_admin_meta=False,
-                                            offset=0):
+                                            offset=0,
+                                            columns_to_join=None):
             return []
 
         def stub_volume_get_all3(context, marker, limit,
                                  sort_keys=None, sort_dirs=None,
                                  filters=None,
-                                 viewable_admin_meta=False, offset=0):
+                                 viewable_admin_meta=False, offset=0,
+                                 columns_to_join=None):
             self.assertFalse('no_migration_targets' in filters)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol3')]
@@ -1304,7 +1312,7 @@ class VolumeApiTest(test.TestCase):
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'display_name': 'Volume-573108026'},
-            viewable_admin_meta=True, offset=0)
+            viewable_admin_meta=True, offset=0, columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_list(self, get_all):
@@ -1318,7 +1326,7 @@ class VolumeApiTest(test.TestCase):
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'id': ['1', '2', '3']}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_expression(self, get_all):
@@ -1331,7 +1339,8 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
-            filters={'display_name': 'd-'}, viewable_admin_meta=True, offset=0)
+            filters={'display_name': 'd-'}, viewable_admin_meta=True, offset=0,
+            columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_status(self, get_all):
@@ -1345,7 +1354,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'status': 'available'}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_metadata(self, get_all):
@@ -1359,7 +1368,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'metadata': {'fake_key': 'fake_value'}},
-            viewable_admin_meta=True, offset=0)
+            viewable_admin_meta=True, offset=0, columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_availability_zone(self, get_all):
@@ -1373,7 +1382,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'availability_zone': 'nova'}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_invalid_filter(self, get_all):
@@ -1388,7 +1397,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'availability_zone': 'nova'}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns_to_join=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_sort_by_name(self, get_all):
@@ -1403,7 +1412,21 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             ctxt, None, CONF.osapi_max_limit,
             sort_dirs=['desc'], viewable_admin_meta=True,
-            sort_keys=['display_name'], filters={}, offset=0)
+            sort_keys=['display_name'], filters={}, offset=0,
+            columns_to_join=None)
+
+    @mock.patch('cinder.volume.api.API.get_all')
+    def test_get_volumes_summary_loads_no_relationships(self, get_all):
+        req = mock.MagicMock()
+        ctxt = context.RequestContext('fake', 'fake', auth_token=True)
+        req.environ = {'cinder.context': ctxt}
+        req.params = {}
+        self.controller._view_builder.summary_list = mock.Mock()
+        self.controller._get_volumes(req, False)
+        get_all.assert_called_once_with(
+            ctxt, None, CONF.osapi_max_limit,
+            sort_keys=['created_at'], sort_dirs=['desc'], filters={},
+            viewable_admin_meta=True, offset=0, columns_to_join=[])
 
     def test_get_volume_filter_options_using_config(self):
         self.override_config('query_volume_filters', ['name', 'status',
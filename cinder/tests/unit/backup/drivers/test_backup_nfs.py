@@ -507,6 +507,43 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    def test_restore_prefetch(self):
+        self._create_backup_db_entry()
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_restore_prefetch_depth=4)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            backup = objects.Backup.get_by_id(self.ctxt, 123)
+            service.restore(backup, '1234-5678-1234-8888', restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+    def test_restore_prefetch_object_failure(self):
+        self._create_backup_db_entry()
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_restore_prefetch_depth=4)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        self.mock_object(service, 'get_object_reader',
+                         mock.Mock(side_effect=exception.BackupDriverException(
+                             message=_('fake'))))
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            backup = objects.Backup.get_by_id(self.ctxt, 123)
+            self.assertRaises(exception.BackupDriverException,
+                              service._restore_v1, backup,
+                              '1234-5678-1234-8888',
+                              service._read_metadata(backup), restored_file)
+
     def test_restore_delta(self):
 
         def _fake_generate_object_name_prefix(self, backup):
@@ -552,6 +589,67 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    def test_restore_delta_prefetch(self):
+        self.flags(backup_restore_prefetch_depth=2)
+        self.test_restore_delta()
+
+    def test_backup_pipeline_matches_serial(self):
+        self.flags(backup_file_size=(1024 * 4))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self._create_backup_db_entry(backup_id=123)
+        self._create_backup_db_entry(backup_id=124)
+
+        self.flags(backup_chunk_workers=1)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        self.flags(backup_chunk_workers=4)
+        self.flags(backup_chunk_queue_depth=1)
+        self.flags(backup_chunk_max_inflight_bytes=(1024 * 8))
+        pipelined_service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        pipelined_backup = objects.Backup.get_by_id(self.ctxt, 124)
+        pipelined_service.backup(pipelined_backup, self.volume_file)
+
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        pipelined_backup = objects.Backup.get_by_id(self.ctxt, 124)
+        self.assertEqual(backup.object_count, pipelined_backup.object_count)
+        self.assertEqual(
+            service._read_sha256file(backup)['sha256s'],
+            pipelined_service._read_sha256file(pipelined_backup)['sha256s'])
+        metadata = service._read_metadata(backup)
+        pipelined_metadata = pipelined_service._read_metadata(
+            pipelined_backup)
+        self.assertEqual(
+            [list(obj.values()) for obj in metadata['objects']],
+            [list(obj.values()) for obj in pipelined_metadata['objects']])
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            pipelined_service.restore(pipelined_backup, '1234-5678-1234-8888',
+                                      restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+    def test_backup_pipeline_chunk_failure(self):
+        self.flags(backup_file_size=(1024 * 4))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_chunk_workers=2)
+        self._create_backup_db_entry()
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        self.mock_object(service, 'get_object_writer',
+                         mock.Mock(side_effect=exception.BackupDriverException(
+                             message=_('fake'))))
+        self.mock_object(service, '_finalize_backup')
+
+        self.assertRaises(exception.BackupDriverException,
+                          service.backup,
+                          backup, self.volume_file)
+        self.assertFalse(service._finalize_backup.called)
+
     def test_delete(self):
         self._create_backup_db_entry()
         service = nfs.NFSBackupDriver(self.ctxt)
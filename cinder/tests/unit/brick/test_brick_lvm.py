@@ -371,3 +371,70 @@ class BrickLvmTestCase(test.TestCase):
         self.vg.vg_name = "test-volumes"
         self.vg.extend_volume("test", "2G")
         self.assertFalse(self.vg.deactivate_lv.called)
+
+    def _create_inventory_vg(self):
+        self.lvs_calls = 0
+
+        def counting_execute(*cmd, **kwargs):
+            if 'lvs' in cmd and 'vg_name,name,size' in cmd:
+                self.lvs_calls += 1
+            if cmd[0] in ('lvrename', 'lvremove'):
+                return ('', '')
+            return self.fake_execute(*cmd, **kwargs)
+
+        self.stubs.Set(processutils, 'execute', counting_execute)
+        return brick.LVM(self.configuration.volume_group_name, 'sudo',
+                         False, None, 'default', counting_execute,
+                         inventory_resync_interval=60)
+
+    def test_inventory_lookups(self):
+        vg = self._create_inventory_vg()
+
+        self.assertEqual('fake-1', vg.get_volume('fake-1')['name'])
+        self.assertEqual('fake-2', vg.get_volume('fake-2')['name'])
+        self.assertIsNone(vg.get_volume('fake-unknown'))
+        self.assertEqual(['fake-1', 'fake-2'],
+                         [lv['name'] for lv in vg.get_volumes()])
+        self.assertEqual(1, self.lvs_calls)
+
+    def test_inventory_operations(self):
+        vg = self._create_inventory_vg()
+        vg.get_volumes()
+
+        vg.create_volume('test', '2g')
+        self.assertEqual({'vg': 'fake-vg', 'name': 'test', 'size': '2.00'},
+                         vg.get_volume('test'))
+        vg.create_lv_snapshot('test-snap', 'test')
+        self.assertEqual('2.00', vg.get_volume('test-snap')['size'])
+
+        vg.deactivate_lv = mock.Mock()
+        vg.extend_volume('test', '3g')
+        self.assertEqual('3.00', vg.get_volume('test')['size'])
+
+        vg.rename_volume('test', 'test-renamed')
+        self.assertIsNone(vg.get_volume('test'))
+        self.assertEqual('3.00', vg.get_volume('test-renamed')['size'])
+
+        vg.delete('test-snap')
+        self.assertIsNone(vg.get_volume('test-snap'))
+
+        self.assertEqual(1, self.lvs_calls)
+
+    def test_inventory_resync(self):
+        with mock.patch('time.time', return_value=1000):
+            vg = self._create_inventory_vg()
+            vg.get_volumes()
+            vg.create_volume('test', '512m')
+            self.assertEqual('0.50', vg.get_volume('test')['size'])
+
+        with mock.patch('time.time', return_value=1060):
+            # Reloaded from lvs, which does not know the new LV
+            self.assertIsNone(vg.get_volume('test'))
+        self.assertEqual(2, self.lvs_calls)
+
+    def test_size_str_to_g(self):
+        self.assertEqual(2.0, brick.LVM._size_str_to_g('2g'))
+        self.assertEqual(1.5, brick.LVM._size_str_to_g('1.5G'))
+        self.assertEqual(2048.0, brick.LVM._size_str_to_g('2t'))
+        self.assertEqual(0.5, brick.LVM._size_str_to_g('512'))
+        self.assertIsNone(brick.LVM._size_str_to_g('100%FREE'))
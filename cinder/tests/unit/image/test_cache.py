@@ -13,6 +13,8 @@
 #    under the License.
 
 from datetime import timedelta
+
+import eventlet
 import mock
 
 from oslo_utils import timeutils
@@ -294,3 +296,64 @@ class ImageVolumeCacheTestCase(test.TestCase):
         has_space = cache.ensure_space(self.context, 50, host)
         self.assertFalse(has_space)
         mock_delete.assert_not_called()
+
+    def test_ensure_space_cached_entries(self):
+        cache = self._build_cache(max_gb=30, max_count=3)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        host = 'foo@bar#whatever'
+
+        entry1 = self._build_entry(size=10)
+        entry1['host'] = host
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            entry1]
+
+        self.assertTrue(cache.ensure_space(self.context, 5, host))
+        entry2 = self._build_entry(size=5)
+        entry2.update(host=host, volume_id='fake-volume-2')
+        self.mock_db.image_volume_cache_create.return_value = entry2
+        cache.create_cache_entry(self.context, entry2, entry2['image_id'],
+                                 {'updated_at': entry2['image_updated_at']})
+        self.assertTrue(cache.ensure_space(self.context, 5, host))
+
+        # The entries are only loaded once while there is enough space.
+        (self.mock_db.image_volume_cache_get_all_for_host.
+            assert_called_once_with(self.context, host))
+        self.assertFalse(mock_delete.called)
+
+        # Evicting refreshes the entries from the db first.
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            entry2, entry1]
+        self.assertTrue(cache.ensure_space(self.context, 20, host))
+        self.assertEqual(
+            2, self.mock_db.image_volume_cache_get_all_for_host.call_count)
+        mock_delete.assert_called_once_with(self.context, entry1)
+
+    def test_ensure_space_unlimited_count(self):
+        cache = self._build_cache(max_gb=30, max_count=0)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        host = 'foo@bar#whatever'
+
+        entries = [self._build_entry(size=10), self._build_entry(size=5)]
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = entries
+
+        has_space = cache.ensure_space(self.context, 12, host)
+        self.assertTrue(has_space)
+        self.assertFalse(mock_delete.called)
+
+    def test_begin_fill(self):
+        cache = self._build_cache()
+        image_id = 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2'
+        host = 'foo@bar#whatever'
+
+        self.assertTrue(cache.begin_fill(image_id, host))
+        self.assertTrue(cache.begin_fill(image_id, 'foo@bar#other'))
+
+        waiter = eventlet.spawn(cache.begin_fill, image_id, host)
+        eventlet.sleep(0)
+        self.assertFalse(waiter.dead)
+
+        cache.end_fill(image_id, host)
+        self.assertFalse(waiter.wait())
+
+        # Once done, the next request fills the cache again.
+        self.assertTrue(cache.begin_fill(image_id, host))
@@ -0,0 +1,229 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+import eventlet
+from eventlet import event
+
+from cinder import context as ctxt
+from cinder import exception
+from cinder.image import file_cache
+from cinder import test
+
+
+class ImageFileCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageFileCacheTestCase, self).setUp()
+        self.context = ctxt.get_admin_context()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.fetches = []
+
+    def _build_cache(self, max_size=100):
+        cache = file_cache.ImageFileCache(self.cache_dir, max_size)
+        cache.notifier = self.notifier
+        return cache
+
+    def _fetch(self, data):
+        def _fetch(path):
+            self.fetches.append(path)
+            with open(path, 'wb') as image_file:
+                image_file.write(data)
+        return _fetch
+
+    @staticmethod
+    def _checksum(data):
+        return hashlib.md5(data).hexdigest()
+
+    def test_get_miss_then_hit(self):
+        cache = self._build_cache()
+        data = b'a' * 10
+        checksum = self._checksum(data)
+
+        with cache.get(self.context, checksum, 'image1',
+                       self._fetch(data)) as path:
+            with open(path, 'rb') as image_file:
+                self.assertEqual(data, image_file.read())
+        with cache.get(self.context, checksum, 'image2',
+                       self._fetch(data)) as path2:
+            self.assertEqual(path, path2)
+
+        self.assertEqual(1, len(self.fetches))
+        self.assertEqual(['image_file_cache.miss', 'image_file_cache.hit'],
+                         [msg['event_type']
+                          for msg in self.notifier.notifications])
+        payload = self.notifier.notifications[1]['payload']
+        self.assertEqual('image2', payload['image_id'])
+        self.assertEqual(checksum, payload['checksum'])
+        self.assertEqual(1, payload['hits'])
+        self.assertEqual(1, payload['misses'])
+        self.assertEqual(0.5, payload['hit_rate'])
+
+    def test_get_checksum_mismatch(self):
+        cache = self._build_cache()
+
+        def _get():
+            with cache.get(self.context, self._checksum(b'a'), 'image1',
+                           self._fetch(b'b')):
+                pass
+
+        self.assertRaises(exception.ImageUnacceptable, _get)
+        self.assertEqual([], os.listdir(self.cache_dir))
+        self.assertEqual(0, cache.size)
+
+    def test_lru_eviction(self):
+        cache = self._build_cache(max_size=25)
+        images = [b'a' * 10, b'b' * 10, b'c' * 10]
+        checksums = [self._checksum(data) for data in images]
+
+        for data, checksum in zip(images[:2], checksums[:2]):
+            with cache.get(self.context, checksum, 'image', self._fetch(data)):
+                pass
+        # Use the first image again, the second one is now the LRU one
+        with cache.get(self.context, checksums[0], 'image', None):
+            pass
+        with cache.get(self.context, checksums[2], 'image',
+                       self._fetch(images[2])):
+            pass
+
+        self.assertEqual(sorted([checksums[0], checksums[2]]),
+                         sorted(os.listdir(self.cache_dir)))
+        self.assertEqual(20, cache.size)
+        self.assertEqual(1, cache.stats()['evictions'])
+        self.assertEqual('image_file_cache.evict',
+                         self.notifier.notifications[-1]['event_type'])
+
+    def test_files_in_use_not_evicted(self):
+        cache = self._build_cache(max_size=15)
+        data1 = b'a' * 10
+        data2 = b'b' * 10
+
+        with cache.get(self.context, self._checksum(data1), 'image1',
+                       self._fetch(data1)) as path1:
+            with cache.get(self.context, self._checksum(data2), 'image2',
+                           self._fetch(data2)) as path2:
+                self.assertTrue(os.path.exists(path1))
+                self.assertTrue(os.path.exists(path2))
+            # Both images do not fit in the cache and the first one is still
+            # in use, so the second one goes once released.
+            self.assertTrue(os.path.exists(path1))
+            self.assertFalse(os.path.exists(path2))
+        self.assertTrue(os.path.exists(path1))
+        self.assertEqual(10, cache.size)
+
+    def test_single_flight(self):
+        cache = self._build_cache()
+        data = b'a' * 10
+        checksum = self._checksum(data)
+        fetching = event.Event()
+        release = event.Event()
+
+        def _slow_fetch(path):
+            fetching.send()
+            release.wait()
+            self._fetch(data)(path)
+
+        def _get(fetch):
+            with cache.get(self.context, checksum, 'image1', fetch) as path:
+                return path
+
+        filler = eventlet.spawn(_get, _slow_fetch)
+        fetching.wait()
+        waiter = eventlet.spawn(_get, self._fetch(data))
+        eventlet.sleep(0)
+        self.assertFalse(waiter.dead)
+
+        release.send()
+        self.assertEqual(filler.wait(), waiter.wait())
+        self.assertEqual(1, len(self.fetches))
+        self.assertEqual(1, cache.stats()['hits'])
+
+    def test_load_entries(self):
+        data = b'a' * 10
+        checksum = self._checksum(data)
+        with open(os.path.join(self.cache_dir, checksum), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(self.cache_dir, 'other.part'), 'wb') as f:
+            f.write(data)
+
+        cache = self._build_cache()
+
+        self.assertEqual(10, cache.size)
+        self.assertEqual([checksum], os.listdir(self.cache_dir))
+        with cache.get(self.context, checksum, 'image1', None) as path:
+            self.assertEqual(os.path.join(self.cache_dir, checksum), path)
+
+    def test_load_entries_part_in_use(self):
+        part_path = os.path.join(self.cache_dir, 'other.part')
+        with open(part_path, 'wb') as f:
+            f.write(b'a')
+        # Another process is still downloading to it
+        fd = os.open(part_path, os.O_RDONLY)
+        self.addCleanup(os.close, fd)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+        self._build_cache()
+
+        self.assertEqual(['other.part'], os.listdir(self.cache_dir))
+
+    def test_files_used_by_other_process_not_evicted(self):
+        data = b'a' * 10
+        checksum = self._checksum(data)
+        path = os.path.join(self.cache_dir, checksum)
+        with open(path, 'wb') as f:
+            f.write(data)
+        cache = self._build_cache(max_size=5)
+        # Another process uses the file
+        fd = os.open(path, os.O_RDONLY)
+        self.addCleanup(os.close, fd)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+
+        with cache.get(self.context, checksum, 'image1', None):
+            pass
+
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(0, cache.stats()['evictions'])
+
+    def test_get_filled_by_other_process(self):
+        cache = self._build_cache()
+        data = b'a' * 10
+        checksum = self._checksum(data)
+        with open(os.path.join(self.cache_dir, checksum), 'wb') as f:
+            f.write(data)
+
+        with cache.get(self.context, checksum, 'image1', None) as path:
+            self.assertEqual(os.path.join(self.cache_dir, checksum), path)
+
+        self.assertEqual(1, cache.stats()['hits'])
+        self.assertEqual(10, cache.size)
+
+    def test_get_evicted_by_other_process(self):
+        cache = self._build_cache()
+        data = b'a' * 10
+        checksum = self._checksum(data)
+        with cache.get(self.context, checksum, 'image1',
+                       self._fetch(data)) as path:
+            pass
+        os.unlink(path)
+
+        with cache.get(self.context, checksum, 'image1',
+                       self._fetch(data)) as path:
+            self.assertTrue(os.path.exists(path))
+
+        self.assertEqual(2, len(self.fetches))
+        self.assertEqual(10, cache.size)
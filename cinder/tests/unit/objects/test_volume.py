@@ -149,6 +149,23 @@ class TestVolumeList(test_objects.BaseObjectsTestCase):
                                              mock.sentinel.sort_dir)
         self.assertEqual(1, len(volumes))
         TestVolume._compare(self, db_volume, volumes[0])
+        volume_get_all.assert_called_once_with(
+            self.context, mock.sentinel.marker, mock.sentinel.limit,
+            sort_keys=mock.sentinel.sort_key, sort_dirs=mock.sentinel.sort_dir,
+            filters=None, offset=None,
+            columns_to_join=['volume_admin_metadata', 'volume_metadata'])
+
+    @mock.patch('cinder.db.volume_get_all')
+    def test_get_all_expected_attrs(self, volume_get_all):
+        db_volume = fake_volume.fake_db_volume()
+        volume_get_all.return_value = [db_volume]
+
+        volumes = objects.VolumeList.get_all(self.context, None, None,
+                                             expected_attrs=[])
+        self.assertEqual(1, len(volumes))
+        self.assertFalse(volumes[0].obj_attr_is_set('metadata'))
+        self.assertEqual(
+            [], volume_get_all.call_args[1]['columns_to_join'])
 
     @mock.patch('cinder.db.volume_get_all_by_host')
     def test_get_by_host(self, get_all_by_host):
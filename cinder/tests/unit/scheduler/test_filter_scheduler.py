@@ -177,6 +177,49 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertIsNotNone(weighed_host.obj)
         self.assertTrue(_mock_service_get_all_by_topic.called)
 
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes(self, _mock_service_get_all_by_topic,
+                                     _mock_volume_update_db):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        sched.volume_rpcapi = mock.Mock()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+        _mock_volume_update_db.side_effect = (
+            lambda context, volume_id, host: {'id': volume_id, 'host': host})
+
+        request_spec_list = [
+            {'volume_id': 'fake-%d' % index,
+             'volume_type': {'name': 'LVM_iSCSI'},
+             'volume_properties': {'project_id': 1, 'size': size,
+                                   'availability_zone': 'zone1'}}
+            for index, size in enumerate([800, 800, 1, 100000])]
+
+        with mock.patch.object(sched.host_manager, 'get_filtered_hosts',
+                               wraps=sched.host_manager.get_filtered_hosts
+                               ) as mock_filter:
+            results = sched.schedule_create_volumes(
+                fake_context, request_spec_list,
+                [{} for _spec in request_spec_list])
+
+        # The second volume no longer fits once the first one has consumed
+        # the capacity of the only host large enough for both.
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], exception.NoValidHost)
+        self.assertIsNone(results[2])
+        self.assertIsInstance(results[3], exception.NoValidHost)
+        # All the hosts are filtered only once for the batch, the chosen
+        # hosts are checked one at a time.
+        all_hosts_calls = [call for call in mock_filter.call_args_list
+                           if len(call[0][0]) > 1]
+        self.assertEqual(1, len(all_hosts_calls))
+        hosts = [call[0][2]
+                 for call in sched.volume_rpcapi.create_volume.call_args_list]
+        self.assertEqual(2, len(hosts))
+        self.assertEqual('host1', utils.extract_host(hosts[0]))
+
     def test_max_attempts(self):
         self.flags(scheduler_max_attempts=4)
 
@@ -392,6 +392,91 @@ class HostManagerTestCase(test.TestCase):
             self.assertEqual(len(expected), len(res))
             self.assertEqual(sorted(expected), sorted(res))
 
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_cached(self, _mock_service_is_up,
+                                        _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=60)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        self.host_manager.service_states = {
+            'host1': dict(volume_backend_name='AAA',
+                          total_capacity_gb=512, free_capacity_gb=200,
+                          timestamp=None, reserved_percentage=0),
+            'host2': dict(volume_backend_name='BBB',
+                          total_capacity_gb=256, free_capacity_gb=100,
+                          timestamp=None, reserved_percentage=0),
+        }
+
+        res = self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, len(res))
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # Consumed capacity is kept until the host reports again, and the
+        # services are not looked up again within the TTL.
+        pool1 = self.host_manager.host_state_map['host1'].pools['AAA']
+        pool1.consume_from_volume({'size': 10})
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_volume_capability') as mock_update:
+            res = self.host_manager.get_all_host_states(context)
+            self.assertFalse(mock_update.called)
+        self.assertEqual(2, len(res))
+        self.assertEqual(190, pool1.free_capacity_gb)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # Only the host with new capabilities is updated.
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1',
+            dict(volume_backend_name='AAA', total_capacity_gb=512,
+                 free_capacity_gb=150, reserved_percentage=0))
+        with mock.patch.object(
+                host_manager.HostState, 'update_from_volume_capability',
+                autospec=True,
+                side_effect=host_manager.HostState.
+                update_from_volume_capability) as mock_update:
+            res = self.host_manager.get_all_host_states(context)
+            self.assertEqual(1, mock_update.call_count)
+        self.assertEqual(2, len(res))
+        self.assertEqual(150, pool1.free_capacity_gb)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_new_service(self, _mock_service_is_up,
+                                             _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=60)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        capabilities = dict(volume_backend_name='AAA', total_capacity_gb=512,
+                            free_capacity_gb=200, reserved_percentage=0)
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      capabilities)
+        self.assertEqual(1, len(
+            self.host_manager.get_all_host_states(context)))
+
+        # A service reporting for the first time is picked up before the
+        # cached services expire.
+        services.append(
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()))
+        self.host_manager.update_service_capabilities('volume', 'host2',
+                                                      capabilities)
+        self.assertEqual(2, len(
+            self.host_manager.get_all_host_states(context)))
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
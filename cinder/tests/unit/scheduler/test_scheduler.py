@@ -113,6 +113,28 @@ class SchedulerManagerTestCase(test.TestCase):
         _mock_sched_create.assert_called_once_with(self.context, request_spec,
                                                    {})
 
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes_exception_puts_volume_in_error_state(
+            self, _mock_volume_update, _mock_sched_create):
+        # Only the volumes which could not be scheduled are put in 'error'
+        # state, and the exceptions are eaten.
+        _mock_sched_create.side_effect = [None,
+                                          exception.NoValidHost(reason=""),
+                                          self.AnException()]
+        request_spec_list = [{'volume_id': 1}, {'volume_id': 2},
+                             {'volume_id': 3}]
+
+        self.manager.create_volumes(self.context, 'fake_topic',
+                                    request_spec_list)
+        self.assertEqual([mock.call(self.context, 2, {'status': 'error'}),
+                          mock.call(self.context, 3, {'status': 'error'})],
+                         _mock_volume_update.call_args_list)
+        self.assertEqual(
+            [mock.call(self.context, request_spec, {})
+             for request_spec in request_spec_list],
+            _mock_sched_create.call_args_list)
+
     @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
     @mock.patch('eventlet.sleep')
     def test_create_volume_no_delay(self, _mock_sleep, _mock_sched_create):
@@ -12,6 +12,7 @@
 
 import mock
 from oslo_concurrency import processutils as putils
+from oslo_serialization import jsonutils
 
 from cinder import context
 from cinder import exception
@@ -29,6 +30,43 @@ class TestLioAdmDriver(tf.TargetDriverFixture):
             self.target = lio.LioAdm(root_helper=utils.get_root_helper(),
                                      configuration=self.configuration)
 
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_persist_configuration(self, mock_execute):
+        self.target._persist_configuration(self.fake_volume_id)
+
+        mock_execute.assert_called_once_with('cinder-rtstool', 'save',
+                                             run_as_root=True)
+
+    @mock.patch.object(lio.eventlet, 'spawn_after')
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_persist_configuration_coalesced(self, mock_execute,
+                                             mock_spawn_after):
+        self.configuration.safe_get.side_effect = lambda key: (
+            5 if key == 'lio_persist_delay' else self.fake_safe_get(key))
+        with mock.patch.object(lio.LioAdm, '_verify_rtstool'):
+            target = lio.LioAdm(root_helper=utils.get_root_helper(),
+                                configuration=self.configuration)
+
+        target._persist_configuration('fake-id-1')
+        target._persist_configuration('fake-id-2')
+        target._persist_configuration('fake-id-1')
+
+        mock_spawn_after.assert_called_once_with(5, target._saver.flush)
+        self.assertFalse(mock_execute.called)
+
+        # Saved once for all the changes, on shutdown at the latest
+        mock_execute.side_effect = putils.ProcessExecutionError
+        with mock.patch.object(lio.LOG, 'warning') as mock_warning:
+            target.teardown()
+        mock_spawn_after.return_value.cancel.assert_called_once_with()
+        mock_execute.assert_called_once_with('cinder-rtstool', 'save',
+                                             run_as_root=True)
+        self.assertEqual({'vol_id': 'fake-id-1, fake-id-2'},
+                         mock_warning.call_args[0][1])
+
+        target.teardown()
+        self.assertEqual(1, mock_execute.call_count)
+
     @mock.patch.object(lio.LioAdm, '_execute', side_effect=lio.LioAdm._execute)
     @mock.patch.object(lio.LioAdm, '_persist_configuration')
     @mock.patch('cinder.utils.execute')
@@ -219,6 +257,84 @@ class TestLioAdmDriver(tf.TargetDriverFixture):
             portals_ips=[self.configuration.iscsi_ip_address],
             portals_port=self.configuration.iscsi_port)
 
+    @mock.patch.object(lio.LioAdm, 'ensure_export')
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_ensure_exports_restore(self, mock_execute, mock_ensure):
+        ctxt = context.get_admin_context()
+        volume1 = dict(self.testvol, id='fake-id-1', name='volume-1')
+        volume2 = dict(self.testvol, id='fake-id-2', name='volume-2')
+        mock_execute.side_effect = [
+            ('', ''),
+            ('', ''),
+            (self.iscsi_target_prefix + 'volume-1\n', '')]
+        mock_ensure.side_effect = exception.ISCSITargetCreateFailed(
+            volume_id=volume2['id'])
+
+        failures = self.target.ensure_exports(ctxt, [(volume1, 'path1'),
+                                                     (volume2, 'path2')])
+
+        mock_execute.assert_has_calls([
+            mock.call('cinder-rtstool', 'get-targets', run_as_root=True),
+            mock.call('cinder-rtstool', 'restore', run_as_root=True),
+            mock.call('cinder-rtstool', 'get-targets', run_as_root=True)])
+        # Only the volume missing after the restore is exported on its own
+        mock_ensure.assert_called_once_with(ctxt, volume2, 'path2')
+        self.assertEqual([volume2['id']], list(failures))
+
+    @mock.patch.object(lio.LioAdm, '_get_target_chap_auth',
+                       return_value=('foo', 'bar'))
+    @mock.patch.object(lio.LioAdm, 'ensure_export')
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_ensure_exports_batch(self, mock_execute, mock_ensure,
+                                  mock_get_chap):
+        ctxt = context.get_admin_context()
+        volumes = [dict(self.testvol, id='fake-id-%d' % i,
+                        name='volume-%d' % i) for i in range(3)]
+        prefix = self.iscsi_target_prefix
+        mock_execute.side_effect = [
+            (prefix + 'volume-0\n', ''),
+            ('', ''),
+            (prefix + 'volume-0\n' + prefix + 'volume-1\n', ''),
+            ('', '')]
+
+        failures = self.target.ensure_exports(
+            ctxt, [(volume, 'path%d' % i)
+                   for i, volume in enumerate(volumes)])
+
+        self.assertFalse(mock_ensure.called)
+        commands = [
+            ['create', 'path%d' % i, prefix + 'volume-%d' % i, 'foo',
+             'bar', 'False', '-p%d' % self.configuration.iscsi_port,
+             '-a' + self.configuration.iscsi_ip_address]
+            for i in (1, 2)]
+        mock_execute.assert_has_calls([
+            mock.call('cinder-rtstool', 'get-targets', run_as_root=True),
+            mock.call('cinder-rtstool', 'batch',
+                      process_input='\n'.join(jsonutils.dumps(command)
+                                              for command in commands),
+                      run_as_root=True),
+            mock.call('cinder-rtstool', 'get-targets', run_as_root=True),
+            mock.call('cinder-rtstool', 'save', run_as_root=True)])
+        self.assertEqual(['fake-id-2'], list(failures))
+
+    @mock.patch.object(lio.LioAdm, 'ensure_export')
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_ensure_exports_existing_targets(self, mock_execute, mock_ensure):
+        ctxt = context.get_admin_context()
+        volume1 = dict(self.testvol, id='fake-id-1', name='volume-1')
+        volume2 = dict(self.testvol, id='fake-id-2', name='volume-2')
+        mock_execute.return_value = (
+            '%(prefix)svolume-1\n%(prefix)svolume-2\n' %
+            {'prefix': self.iscsi_target_prefix}, '')
+
+        failures = self.target.ensure_exports(ctxt, [(volume1, 'path1'),
+                                                     (volume2, 'path2')])
+
+        mock_execute.assert_called_once_with('cinder-rtstool', 'get-targets',
+                                             run_as_root=True)
+        self.assertFalse(mock_ensure.called)
+        self.assertEqual({}, failures)
+
     @mock.patch.object(lio.LioAdm, '_execute', side_effect=lio.LioAdm._execute)
     @mock.patch.object(lio.LioAdm, '_persist_configuration')
     @mock.patch('cinder.utils.execute')
@@ -399,3 +399,26 @@ class TestTgtAdmDriver(tf.TargetDriverFixture):
             old_name=None,
             portals_ips=[self.configuration.iscsi_ip_address],
             portals_port=self.configuration.iscsi_port)
+
+    def test_ensure_exports(self):
+        ctxt = context.get_admin_context()
+        volume1 = dict(self.testvol, name=self.VOLUME_NAME)
+        volume2 = dict(self.testvol, id='fake-id-2', name='volume-fake-id-2')
+        exports = [(volume1, self.testvol_path),
+                   (volume2, '/dev/stack-volumes-lvmdriver-1/volume2')]
+
+        with mock.patch('cinder.utils.execute',
+                        return_value=(self.fake_iscsi_scan, None)) as execute,\
+                mock.patch.object(self.target, 'ensure_export') as ensure:
+            failures = self.target.ensure_exports(ctxt, exports)
+
+        self.assertEqual({}, failures)
+        execute.assert_has_calls([
+            mock.call('tgt-admin', '--update', 'ALL', run_as_root=True),
+            mock.call('tgt-admin', '--show', run_as_root=True)])
+        self.assertEqual(2, execute.call_count)
+        for volume in (volume1, volume2):
+            self.assertTrue(os.path.exists(
+                os.path.join(self.fake_volumes_dir, volume['name'])))
+        # Only the volume whose target wasn't created is exported on its own
+        ensure.assert_called_once_with(ctxt, volume2, exports[1][1])
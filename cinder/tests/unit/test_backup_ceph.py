@@ -358,6 +358,79 @@ class BackupCephTestCase(test.TestCase):
             # Ensure the files are equal
             self.assertEqual(checksum.digest(), self.checksum.digest())
 
+    @common_mocks
+    def test_transfer_data_sparse_from_file_to_file(self):
+        self.flags(backup_ceph_sparse_transfer=True)
+        self.service.chunk_size = self.chunk_size
+        data = os.urandom(self.chunk_size)
+        with tempfile.TemporaryFile() as src_file, \
+                tempfile.TemporaryFile() as test_file:
+            # A hole, a chunk of data and a chunk of zeroes
+            src_file.truncate(self.data_length)
+            src_file.seek(self.chunk_size * 4)
+            src_file.write(data + b'\0' * self.chunk_size)
+            test_file.write(b'x' * self.data_length)
+
+            self.service._transfer_data(src_file, 'src_foo', test_file,
+                                        'dest_foo', self.data_length)
+
+            src_file.seek(0)
+            test_file.seek(0)
+            self.assertEqual(src_file.read(), test_file.read())
+
+    @common_mocks
+    def test_transfer_data_sparse_from_rbd_to_rbd(self):
+        self.flags(backup_ceph_sparse_transfer=True)
+        self.service.chunk_size = self.chunk_size
+        data = os.urandom(self.chunk_size)
+
+        def fake_diff_iterate(offset, length, from_snapshot, iterate_cb):
+            iterate_cb(0, self.chunk_size, True)
+            iterate_cb(self.chunk_size * 3, self.chunk_size, True)
+            iterate_cb(self.chunk_size * 4, self.chunk_size, True)
+
+        def fake_read(offset, length):
+            if offset < self.chunk_size:
+                return data
+            return b'\0' * length
+
+        rbd1 = mock.Mock()
+        rbd1.size.return_value = self.data_length
+        rbd1.diff_iterate.side_effect = fake_diff_iterate
+        rbd1.read.side_effect = fake_read
+        rbd2 = mock.Mock()
+
+        src_rbd_io = self._get_wrapped_rbd_io(rbd1)
+        dest_rbd_io = self._get_wrapped_rbd_io(rbd2)
+        self.service._transfer_data(src_rbd_io, 'src_foo', dest_rbd_io,
+                                    'dest_foo', self.data_length)
+
+        # Only the extents holding data are read
+        self.assertEqual([mock.call(0, self.chunk_size),
+                          mock.call(self.chunk_size * 3, self.chunk_size),
+                          mock.call(self.chunk_size * 4, self.chunk_size)],
+                         rbd1.read.call_args_list)
+        rbd2.write.assert_called_once_with(data, 0)
+        rbd2.discard.assert_called_once_with(
+            self.chunk_size, self.data_length - self.chunk_size)
+        self.assertEqual(1, rbd2.flush.call_count)
+
+    @common_mocks
+    def test_transfer_data_sparse_to_zeroed_rbd(self):
+        self.flags(backup_ceph_sparse_transfer=True)
+        self.service.chunk_size = self.chunk_size
+        with tempfile.TemporaryFile() as src_file:
+            src_file.truncate(self.data_length)
+            rbd = mock.Mock()
+            rbd_io = self._get_wrapped_rbd_io(rbd)
+
+            self.service._transfer_data(src_file, 'src_foo', rbd_io,
+                                        'dest_foo', self.data_length,
+                                        dest_is_zeroed=True)
+
+        self.assertFalse(rbd.write.called)
+        self.assertFalse(rbd.discard.called)
+
     @common_mocks
     def test_backup_volume_from_file(self):
         checksum = hashlib.sha256()
@@ -392,6 +465,30 @@ class BackupCephTestCase(test.TestCase):
         self.assertEqual("volume-%s.backup.%s" % (self.volume_id, '1234'),
                          name)
 
+    @common_mocks
+    @mock.patch.object(ceph, '_rados_pool', None)
+    def test_connection_pool_shared_by_drivers(self):
+        self.flags(backup_ceph_connection_pool_size=1)
+        self.mock_rados.Rados.return_value.state = 'connected'
+        ioctx = self.mock_rados.Rados.return_value.open_ioctx.return_value
+        ioctx.state = 'open'
+
+        with rbddriver.RADOSClient(self.service) as client:
+            self.assertEqual(ioctx, client.ioctx)
+
+        # The backup manager uses a new driver for every request
+        service = ceph.CephBackupDriver(self.ctxt)
+        with rbddriver.RADOSClient(service) as client:
+            self.assertEqual(ioctx, client.ioctx)
+
+        self.assertEqual(1, self.mock_rados.Rados.call_count)
+        self.mock_rados.Rados.return_value.open_ioctx.assert_called_once_with(
+            'backups')
+        self.assertFalse(self.mock_rados.Rados.return_value.shutdown.called)
+
+        ceph._rados_pool.close()
+        self.assertTrue(self.mock_rados.Rados.return_value.shutdown.called)
+
     @common_mocks
     @mock.patch('fcntl.fcntl', spec=True)
     @mock.patch('subprocess.Popen', spec=True)
@@ -22,11 +22,13 @@ import filecmp
 import hashlib
 import os
 import shutil
+import socket
 import tempfile
 import zlib
 
 import mock
 from oslo_config import cfg
+import six
 from swiftclient import client as swift
 
 from cinder.backup.drivers import swift as swift_dr
@@ -466,6 +468,93 @@ class BackupSwiftTestCase(test.TestCase):
             backup = objects.Backup.get_by_id(self.ctxt, 123)
             service.restore(backup, '1234-5678-1234-8888', volume_file)
 
+    def test_backup_restore_concurrency(self):
+        self._create_backup_db_entry()
+        self.flags(backup_swift_concurrency=4,
+                   backup_swift_object_size=8 * 1024,
+                   backup_swift_block_size=1024)
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+        self.assertIsInstance(service.conn, swift_dr._SwiftConnectionPool)
+        self.assertEqual(4, service.chunk_workers)
+        self.assertEqual(4, service.restore_prefetch_depth)
+
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        with tempfile.NamedTemporaryFile() as volume_file:
+            service.restore(backup, '1234-5678-1234-8888', volume_file)
+        self.assertLessEqual(service.conn.current_size, 4)
+
+    @mock.patch('eventlet.sleep')
+    def test_connection_pool_retries(self, mock_sleep):
+        conns = [mock.Mock(), mock.Mock()]
+        conns[0].put_object.side_effect = swift.ClientException(
+            'error', http_status=503)
+        conns[1].put_object.return_value = 'etag'
+        pool = swift_dr._SwiftConnectionPool(mock.Mock(side_effect=conns),
+                                             2, 3, 2)
+        contents = six.BytesIO(b'data')
+
+        self.assertEqual('etag', pool.put_object('container', 'obj',
+                                                 contents,
+                                                 content_length=4))
+
+        mock_sleep.assert_called_once_with(2)
+        for conn in conns:
+            conn.put_object.assert_called_once_with(
+                'container', 'obj', contents, content_length=4)
+        # The failed connection is not returned to the pool
+        self.assertIs(conns[1], pool.get())
+
+    @mock.patch('eventlet.sleep')
+    def test_connection_pool_retries_exhausted(self, mock_sleep):
+        conn = mock.Mock()
+        conn.get_object.side_effect = socket.error('error')
+        pool = swift_dr._SwiftConnectionPool(lambda: conn, 2, 2, 1)
+
+        self.assertRaises(socket.error, pool.get_object, 'container', 'obj')
+        self.assertEqual(3, conn.get_object.call_count)
+        self.assertEqual([mock.call(1), mock.call(2)],
+                         mock_sleep.call_args_list)
+
+    @mock.patch('eventlet.sleep')
+    def test_connection_pool_client_error_not_retried(self, mock_sleep):
+        conn = mock.Mock()
+        conn.get_object.side_effect = swift.ClientException(
+            'not found', http_status=404)
+        pool = swift_dr._SwiftConnectionPool(lambda: conn, 2, 3, 1)
+
+        self.assertRaises(swift.ClientException, pool.get_object,
+                          'container', 'obj')
+        conn.get_object.assert_called_once_with('container', 'obj')
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch('eventlet.sleep')
+    def test_connection_pool_reauthenticates(self, mock_sleep):
+        conns = [mock.Mock(), mock.Mock()]
+        conns[0].get_object.side_effect = swift.ClientException(
+            'unauthorized', http_status=401)
+        conns[1].get_object.return_value = 'object'
+        pool = swift_dr._SwiftConnectionPool(mock.Mock(side_effect=conns),
+                                             2, 0, 1)
+
+        # A new connection gets a new token, even without retries
+        self.assertEqual('object', pool.get_object('container', 'obj'))
+        self.assertFalse(mock_sleep.called)
+        self.assertIs(conns[1], pool.get())
+
+    @mock.patch('eventlet.sleep')
+    def test_connection_pool_reauthenticates_once(self, mock_sleep):
+        conn = mock.Mock()
+        conn.get_object.side_effect = swift.ClientException(
+            'unauthorized', http_status=401)
+        pool = swift_dr._SwiftConnectionPool(lambda: conn, 2, 3, 1)
+
+        self.assertRaises(swift.ClientException, pool.get_object,
+                          'container', 'obj')
+        self.assertEqual(2, conn.get_object.call_count)
+        self.assertFalse(mock_sleep.called)
+
     def test_restore_delta(self):
 
         def _fake_generate_object_name_prefix(self, backup):
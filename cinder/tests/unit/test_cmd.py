@@ -1073,6 +1073,26 @@ class TestCinderRtstoolCmd(test.TestCase):
         mock_os.path.exists.assert_called_once_with(mock.sentinel.dirname)
         mock_os.makedirs.assert_called_once_with(mock.sentinel.dirname, 0o755)
 
+    @mock.patch.object(cinder_rtstool, 'rtslib_fb',
+                       **{'root.default_save_file': mock.sentinel.filename})
+    def test_restore(self, mock_rtslib):
+        rtsroot = mock_rtslib.root.RTSRoot
+        rtsroot.return_value.restore_from_file.return_value = []
+        cinder_rtstool.restore_from_file(None)
+        rtsroot.assert_called_once_with()
+        rtsroot.return_value.restore_from_file.assert_called_once_with(
+            mock.sentinel.filename)
+
+    @mock.patch.object(cinder_rtstool, 'rtslib_fb')
+    def test_restore_errors(self, mock_rtslib):
+        rtsroot = mock_rtslib.root.RTSRoot
+        rtsroot.return_value.restore_from_file.return_value = ['error']
+        self.assertRaises(cinder_rtstool.RtstoolError,
+                          cinder_rtstool.restore_from_file,
+                          mock.sentinel.filename)
+        rtsroot.return_value.restore_from_file.assert_called_once_with(
+            mock.sentinel.filename)
+
     def test_usage(self):
         with mock.patch('sys.stdout', new=six.StringIO()):
             exit = self.assertRaises(SystemExit, cinder_rtstool.usage)
@@ -1136,6 +1156,14 @@ class TestCinderRtstoolCmd(test.TestCase):
         mock_save.assert_called_once_with(mock.sentinel.filename)
         self.assertEqual(0, rc)
 
+    @mock.patch('cinder.cmd.rtstool.restore_from_file')
+    def test_main_restore(self, mock_restore):
+        sys.argv = ['cinder-rtstool',
+                    'restore']
+        rc = cinder_rtstool.main()
+        mock_restore.assert_called_once_with(None)
+        self.assertEqual(0, rc)
+
     def test_main_create(self):
         with mock.patch('cinder.cmd.rtstool.create') as create:
             sys.argv = ['cinder-rtstool',
@@ -1218,6 +1246,31 @@ class TestCinderRtstoolCmd(test.TestCase):
             delete.assert_called_once_with(mock.sentinel.iqn)
             self.assertEqual(0, rc)
 
+    @mock.patch.object(cinder_rtstool, 'delete')
+    @mock.patch.object(cinder_rtstool, 'create')
+    def test_main_batch(self, mock_create, mock_delete):
+        sys.argv = ['cinder-rtstool', 'batch']
+        mock_create.side_effect = cinder_rtstool.RtstoolError()
+        commands = six.StringIO(
+            '["create", "dev", "name", "user", "secret", "False", "-p3261"]\n'
+            '["delete", "iqn"]\n'
+            '["save"]\n'
+            '["delete"]\n')
+
+        with mock.patch('sys.stdin', new=commands), \
+                mock.patch('sys.stdout', new=six.StringIO()) as stdout:
+            rc = cinder_rtstool.main()
+
+        # The failures do not stop the other commands
+        mock_create.assert_called_once_with('dev', 'name', 'user', 'secret',
+                                            'False', portals_port=3261)
+        mock_delete.assert_called_once_with('iqn')
+        self.assertEqual(1, rc)
+        # The CHAP credentials are not printed
+        output = stdout.getvalue()
+        self.assertIn('create name failed', output)
+        self.assertNotIn('secret', output)
+
     @mock.patch.object(cinder_rtstool, 'verify_rtslib')
     def test_main_verify(self, mock_verify_rtslib):
         sys.argv = ['cinder-rtstool', 'verify']
@@ -17,6 +17,7 @@
 import datetime
 
 import enum
+import mock
 from oslo_config import cfg
 from oslo_utils import uuidutils
 import six
@@ -360,6 +361,19 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes, db.volume_get_all(
                                         self.ctxt, None, None, ['host'], None))
 
+    def test_volume_get_all_columns_to_join(self):
+        volume = db.volume_create(self.ctxt, {'metadata': {'m1': 'v1'}})
+
+        summary = db.volume_get_all(self.ctxt, None, None,
+                                    columns_to_join=[])
+        detail = db.volume_get_all(self.ctxt, None, None)
+
+        self.assertEqual([volume['id']], [v['id'] for v in summary])
+        self.assertNotIn('volume_metadata', summary[0].__dict__)
+        self.assertEqual([('m1', 'v1')],
+                         [(m['key'], m['value'])
+                          for m in detail[0]['volume_metadata']])
+
     def test_volume_get_all_marker_passed(self):
         volumes = [
             db.volume_create(self.ctxt, {'id': 1}),
@@ -371,6 +385,33 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
                                         self.ctxt, 2, 2, ['id'], ['asc']))
 
+    def test_volume_get_all_marker_only_reads_sort_keys(self):
+        volumes = [db.volume_create(self.ctxt, {'id': i})
+                   for i in range(1, 5)]
+        volume_helpers = sqlalchemy_api.PAGINATION_HELPERS[
+            sqlalchemy_api.models.Volume]
+        get = mock.Mock()
+
+        with mock.patch.dict(sqlalchemy_api.PAGINATION_HELPERS,
+                             {sqlalchemy_api.models.Volume:
+                              volume_helpers[:2] + (get,)}):
+            result = db.volume_get_all(self.ctxt, 2, 2, ['id'], ['asc'])
+
+        self._assertEqualListsOfObjects(volumes[2:], result)
+        self.assertFalse(get.called)
+
+    def test_volume_get_all_marker_not_found(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        self.assertRaises(exception.VolumeNotFound, db.volume_get_all,
+                          self.ctxt, 'missing', 2, ['id'], ['asc'])
+
+    def test_volume_get_all_marker_deleted(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        db.volume_create(self.ctxt, {'id': 2})
+        db.volume_destroy(self.ctxt, 1)
+        self.assertRaises(exception.VolumeNotFound, db.volume_get_all,
+                          self.ctxt, 1, 2, ['id'], ['asc'])
+
     def test_volume_get_all_by_host(self):
         volumes = []
         for i in range(3):
@@ -711,6 +752,23 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualsVolumeOrderResult([vol5], limit=1,
                                             filters=filters)
 
+    def test_volume_get_all_filters_user_and_admin_metadata(self):
+        vol1 = db.volume_create(self.ctxt, {'metadata': {'key1': 'val1'}})
+        db.volume_admin_metadata_update(self.ctxt, vol1.id,
+                                        {'key2': 'val2'}, False)
+        vol2 = db.volume_create(self.ctxt, {'metadata': {'key1': 'val1'}})
+        db.volume_admin_metadata_update(self.ctxt, vol2.id,
+                                        {'key1': 'val1'}, False)
+        vol3 = db.volume_create(self.ctxt, {'metadata': {'key1': 'val1',
+                                                         'key2': 'val2'}})
+        db.volume_metadata_delete(self.ctxt, vol3.id, 'key2')
+
+        filters = {'metadata': {'key1': 'val1', 'key2': 'val2'}}
+        self._assertEqualsVolumeOrderResult([vol1], filters=filters)
+        filters = {'metadata': {'key1': 'val1'}}
+        self._assertEqualsVolumeOrderResult([vol3, vol2, vol1],
+                                            filters=filters)
+
     def test_volume_get_no_migration_targets(self):
         """Verifies the unique 'no_migration_targets'=True filter.
 
@@ -900,6 +958,22 @@ class DBAPIVolumeTestCase(BaseTest):
         self.assertRaises(exception.VolumeNotFound, db.volume_update,
                           self.ctxt, 42, {})
 
+    def test_volumes_update(self):
+        volume1 = db.volume_create(self.ctxt, {'host': 'h1'})
+        volume2 = db.volume_create(self.ctxt, {'host': 'h1'})
+        db.volumes_update(self.ctxt, [{'id': volume1['id'], 'host': 'h2'},
+                                      {'id': volume2['id'], 'host': 'h3'}])
+        self.assertEqual('h2', db.volume_get(self.ctxt, volume1['id'])['host'])
+        self.assertEqual('h3', db.volume_get(self.ctxt, volume2['id'])['host'])
+
+    def test_volumes_update_nonexistent(self):
+        volume = db.volume_create(self.ctxt, {'host': 'h1'})
+        self.assertRaises(exception.VolumeNotFound, db.volumes_update,
+                          self.ctxt, [{'id': volume['id'], 'host': 'h2'},
+                                      {'id': 42, 'host': 'h2'}])
+        # Nothing is updated if one of the volumes does not exist.
+        self.assertEqual('h1', db.volume_get(self.ctxt, volume['id'])['host'])
+
     def test_volume_metadata_get(self):
         metadata = {'a': 'b', 'c': 'd'}
         db.volume_create(self.ctxt, {'id': 1, 'metadata': metadata})
@@ -1048,6 +1122,19 @@ class DBAPISnapshotTestCase(BaseTest):
         actual = db.snapshot_data_get_for_project(self.ctxt, 'project1')
         self.assertEqual((1, 42), actual)
 
+    def test_snapshot_get_all_marker(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        snapshots = [db.snapshot_create(self.ctxt, {'id': i, 'volume_id': 1})
+                     for i in range(1, 5)]
+
+        result = db.snapshot_get_all(self.ctxt, marker=2, limit=2,
+                                     sort_keys=['id'], sort_dirs=['asc'])
+
+        self._assertEqualListsOfObjects(snapshots[2:], result,
+                                        ignored_keys=['metadata', 'volume'])
+        self.assertRaises(exception.SnapshotNotFound, db.snapshot_get_all,
+                          self.ctxt, marker='missing')
+
     def test_snapshot_get_all_by_filter(self):
         db.volume_create(self.ctxt, {'id': 1})
         db.volume_create(self.ctxt, {'id': 2})
@@ -1703,6 +1790,82 @@ class DBAPIQuotaTestCase(BaseTest):
                           'volumes': {'reserved': 1, 'in_use': 0}},
                          quota_usage)
 
+    def _reserve_volume_type_usages(self):
+        vtype = {'id': 'type1', 'name': 'type1'}
+        db.volume_create(self.ctxt, {'id': 'vol1', 'project_id': 'project1',
+                                     'size': 2, 'volume_type_id': 'type1'})
+        db.volume_create(self.ctxt, {'id': 'vol2', 'project_id': 'project1',
+                                     'size': 3})
+        db.volume_create(self.ctxt, {'id': 'vol3', 'project_id': 'project2',
+                                     'size': 5, 'volume_type_id': 'type1'})
+        db.snapshot_create(self.ctxt, {'id': 'snap1', 'volume_id': 'vol1',
+                                       'project_id': 'project1',
+                                       'volume_size': 2})
+        resources = {
+            'volumes': quota.ReservableResource('volumes', '_sync_volumes'),
+            'gigabytes': quota.ReservableResource('gigabytes',
+                                                  '_sync_gigabytes'),
+            'snapshots': quota.ReservableResource('snapshots',
+                                                  '_sync_snapshots'),
+            'volumes_type1': quota.VolumeTypeResource('volumes', vtype),
+            'gigabytes_type1': quota.VolumeTypeResource('gigabytes', vtype),
+        }
+        quotas = {name: -1 for name in resources}
+        deltas = {name: 1 for name in resources}
+        return db.quota_reserve(self.ctxt, resources, quotas, deltas,
+                                datetime.datetime.utcnow(), 0, 0, 'project1')
+
+    def _test_quota_reserve_volume_types(self, batched):
+        self.flags(quota_reserve_batched=batched)
+        reservations = self._reserve_volume_type_usages()
+
+        self.assertEqual(5, len(reservations))
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 1, 'in_use': 2},
+                          'gigabytes': {'reserved': 1, 'in_use': 7},
+                          'snapshots': {'reserved': 1, 'in_use': 1},
+                          'volumes_type1': {'reserved': 1, 'in_use': 1},
+                          'gigabytes_type1': {'reserved': 1, 'in_use': 4}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+        db.reservation_commit(self.ctxt, reservations, 'project1')
+        usages = db.quota_usage_get_all_by_project(self.ctxt, 'project1')
+        self.assertEqual({'reserved': 0, 'in_use': 5},
+                         usages['gigabytes_type1'])
+
+    def test_quota_reserve_volume_types(self):
+        self._test_quota_reserve_volume_types(False)
+
+    def test_quota_reserve_volume_types_batched(self):
+        self._test_quota_reserve_volume_types(True)
+
+    def test_quota_reserve_batched_locks_only_deltas(self):
+        self.flags(quota_reserve_batched=True)
+        resources = {
+            'volumes': quota.ReservableResource('volumes', '_sync_volumes'),
+            'gigabytes': quota.ReservableResource('gigabytes',
+                                                  '_sync_gigabytes'),
+        }
+        expire = datetime.datetime.utcnow()
+        db.quota_reserve(self.ctxt, resources, {'volumes': -1,
+                                                'gigabytes': -1},
+                         {'volumes': 1, 'gigabytes': 1}, expire, 0, 0,
+                         'project1')
+
+        with mock.patch.object(sqlalchemy_api, '_get_quota_usages',
+                               wraps=sqlalchemy_api._get_quota_usages) as get:
+            db.quota_reserve(self.ctxt, resources, {'volumes': -1},
+                             {'volumes': 1}, expire, 0, 0, 'project1')
+
+        get.assert_called_once_with(mock.ANY, mock.ANY, 'project1',
+                                    resources=['volumes'])
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 2, 'in_use': 0},
+                          'gigabytes': {'reserved': 1, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
     def test_quota_destroy(self):
         db.quota_create(self.ctxt, 'project1', 'resource1', 41)
         self.assertIsNone(db.quota_destroy(self.ctxt, 'project1',
@@ -13,6 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import os
+import time
+
+import mock
+import testtools
+from testtools import content
+
 from cinder import exception
 from cinder.scheduler.evaluator import evaluator
 from cinder import test
@@ -137,3 +145,85 @@ class EvaluatorTestCase(test.TestCase):
         self.assertRaises(exception.EvaluatorParseException,
                           evaluator.evaluate,
                           "7 / 0")
+
+    def test_compiled_expression_cached(self):
+        self.mock_object(evaluator, '_compiled', collections.OrderedDict())
+        evaluator.evaluate("1+1")
+        parser = mock.Mock(wraps=evaluator._parser)
+        self.mock_object(evaluator, '_parser', parser)
+
+        self.assertEqual(5, evaluator.evaluate("stats.a + 1",
+                                               stats={'a': 4}))
+        self.assertEqual(8, evaluator.evaluate("stats.a + 1",
+                                               stats={'a': 7}))
+        self.assertRaises(exception.EvaluatorParseException,
+                          evaluator.evaluate,
+                          "stats.a + 1",
+                          stats={})
+        self.assertEqual(1, parser.parseString.call_count)
+
+    def test_compiled_expression_cache_evicts_lru(self):
+        self.mock_object(evaluator, '_compiled', collections.OrderedDict())
+        self.mock_object(evaluator, '_MAX_COMPILED', 2)
+        evaluator.evaluate("1+1")
+        evaluator.evaluate("1+2")
+        evaluator.evaluate("1+1")
+        evaluator.evaluate("1+3")
+        self.assertEqual(['1+1', '1+3'], list(evaluator._compiled))
+
+    def test_bad_constant_in_untaken_branch(self):
+        stats = {'a': 'foo'}
+        self.assertEqual(1, evaluator.evaluate("(1 < 2) ? 1 : stats.a",
+                                               stats=stats))
+        self.assertRaises(exception.EvaluatorParseException,
+                          evaluator.evaluate,
+                          "(1 > 2) ? 1 : stats.a",
+                          stats=stats)
+
+
+@testtools.skipUnless(os.environ.get('CINDER_BENCHMARKS'),
+                      'Set CINDER_BENCHMARKS to run the benchmarks')
+class EvaluatorBenchmarkTestCase(test.TestCase):
+    """Cost of evaluating a filter and goodness function for many pools.
+
+    Each expression is evaluated once per pool and scheduling request, as
+    the driver filter and goodness weigher do, e.g.:
+
+        CINDER_BENCHMARKS=1 python -m testtools.run \\
+            cinder.tests.unit.test_evaluator.EvaluatorBenchmarkTestCase
+    """
+
+    pools = 50
+    requests = 2
+    expressions = ('stats.total_capacity_gb < 500 and '
+                   'volume.size < stats.free_capacity_gb',
+                   'capabilities.capacity_utilization < 0.6 ? '
+                   '100 - capabilities.capacity_utilization * 100 : 25')
+
+    def _evaluate_all(self, cached):
+        variables = [{'stats': {'total_capacity_gb': 100 + pool,
+                                'free_capacity_gb': 50 + pool % 50},
+                      'capabilities': {
+                          'capacity_utilization': (pool % 10) / 10.0},
+                      'volume': {'size': 10}}
+                     for pool in range(self.pools)]
+        self.mock_object(evaluator, '_compiled', collections.OrderedDict())
+
+        start = time.time()
+        for _i in range(self.requests):
+            for pool_variables in variables:
+                for expression in self.expressions:
+                    if not cached:
+                        evaluator._compiled.clear()
+                    evaluator.evaluate(expression, **pool_variables)
+        count = self.requests * self.pools * len(self.expressions)
+        return (time.time() - start) / count
+
+    def test_evaluation_cost(self):
+        uncached = self._evaluate_all(False)
+        cached = self._evaluate_all(True)
+
+        self.addDetail('evaluation cost', content.text_content(
+            'uncached: %.1f us, cached: %.1f us per evaluation' %
+            (uncached * 1e6, cached * 1e6)))
+        self.assertLess(cached, uncached)
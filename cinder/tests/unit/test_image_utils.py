@@ -214,6 +214,49 @@ class TestFetch(test.TestCase):
             .assert_called_once_with(None, None, None))
 
 
+class TestFetchDirect(test.TestCase):
+    @mock.patch('os.fsync')
+    @mock.patch('cinder.utils.temporary_chown')
+    def test_defaults(self, mock_chown, mock_fsync):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock()
+        image_id = mock.sentinel.image_id
+        dest = 'test_dest'
+        mock_open = mock.mock_open()
+
+        with mock.patch('cinder.image.image_utils.open',
+                        new=mock_open, create=True):
+            output = image_utils.fetch_direct(ctxt, image_service, image_id,
+                                              dest)
+
+        self.assertIsNone(output)
+        mock_chown.assert_called_once_with(dest)
+        mock_open.assert_called_once_with(dest, 'wb')
+        image_file = mock_open.return_value
+        image_service.download.assert_called_once_with(ctxt, image_id,
+                                                       image_file)
+        image_file.flush.assert_called_once_with()
+        mock_fsync.assert_called_once_with(image_file.fileno.return_value)
+
+    @mock.patch('os.fsync')
+    @mock.patch('cinder.utils.temporary_chown')
+    def test_not_root(self, mock_chown, mock_fsync):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock()
+        image_id = mock.sentinel.image_id
+        dest = 'test_dest'
+        mock_open = mock.mock_open()
+
+        with mock.patch('cinder.image.image_utils.open',
+                        new=mock_open, create=True):
+            image_utils.fetch_direct(ctxt, image_service, image_id, dest,
+                                     run_as_root=False)
+
+        self.assertFalse(mock_chown.called)
+        image_service.download.assert_called_once_with(ctxt, image_id,
+                                                       mock_open.return_value)
+
+
 class TestVerifyImage(test.TestCase):
     @mock.patch('cinder.image.image_utils.qemu_img_info')
     @mock.patch('cinder.image.image_utils.fileutils')
@@ -1041,6 +1084,126 @@ class TestFetchToVolumeFormat(test.TestCase):
         mock_convert.assert_called_once_with(tmp, dest, volume_format,
                                              run_as_root=run_as_root)
 
+    @mock.patch('cinder.image.image_utils.convert_image')
+    @mock.patch('cinder.image.image_utils.fetch_direct')
+    @mock.patch('cinder.image.image_utils.fetch')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.temporary_file')
+    @mock.patch('cinder.image.image_utils.CONF')
+    def _test_raw_direct(self, mock_conf, mock_temp, mock_info, mock_fetch,
+                         mock_fetch_direct, mock_convert, file_format='raw',
+                         backing_file=None):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock(temp_images=None)
+        image_service.show.return_value = {'disk_format': 'raw',
+                                           'size': units.Gi}
+        image_id = mock.sentinel.image_id
+        dest = mock.sentinel.dest
+        blocksize = mock.sentinel.blocksize
+        run_as_root = mock.sentinel.run_as_root
+        mock_conf.image_fetch_raw_direct = True
+
+        data = mock_info.return_value
+        data.file_format = file_format
+        data.backing_file = backing_file
+        tmp = mock_temp.return_value.__enter__.return_value
+
+        if file_format == 'raw' and backing_file is None:
+            output = image_utils.fetch_to_volume_format(
+                ctxt, image_service, image_id, dest, 'raw', blocksize,
+                size=1, run_as_root=run_as_root)
+            self.assertIsNone(output)
+        else:
+            self.assertRaises(
+                exception.ImageUnacceptable,
+                image_utils.fetch_to_volume_format,
+                ctxt, image_service, image_id, dest, 'raw', blocksize,
+                size=1, run_as_root=run_as_root)
+
+        mock_info.assert_has_calls([
+            mock.call(tmp, run_as_root=run_as_root),
+            mock.call(dest, run_as_root=run_as_root)])
+        mock_fetch_direct.assert_called_once_with(ctxt, image_service,
+                                                  image_id, dest,
+                                                  run_as_root=run_as_root)
+        self.assertFalse(mock_fetch.called)
+        self.assertFalse(mock_convert.called)
+
+    def test_raw_direct(self):
+        self._test_raw_direct()
+
+    def test_raw_direct_format_mismatch(self):
+        self._test_raw_direct(file_format='qcow2')
+
+    def test_raw_direct_backing_file(self):
+        self._test_raw_direct(backing_file='/etc/passwd')
+
+    @mock.patch('cinder.image.image_utils.convert_image')
+    @mock.patch('cinder.image.image_utils.file_cache.get_image_file_cache')
+    @mock.patch('cinder.image.image_utils.fetch')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.temporary_file')
+    @mock.patch('cinder.image.image_utils.CONF')
+    def test_file_cache(self, mock_conf, mock_temp, mock_info, mock_fetch,
+                        mock_get_cache, mock_convert):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock(temp_images=None)
+        image_service.show.return_value = {'disk_format': 'qcow2',
+                                           'container_format': 'bare',
+                                           'checksum': 'abc123',
+                                           'size': units.Gi}
+        image_id = mock.sentinel.image_id
+        dest = mock.sentinel.dest
+        volume_format = mock.sentinel.volume_format
+        run_as_root = mock.sentinel.run_as_root
+        mock_cache = mock_get_cache.return_value
+        cached = mock_cache.get.return_value.__enter__.return_value
+
+        data = mock_info.return_value
+        data.file_format = volume_format
+        data.backing_file = None
+        data.virtual_size = 1234
+        tmp = mock_temp.return_value.__enter__.return_value
+
+        output = image_utils.fetch_to_volume_format(
+            ctxt, image_service, image_id, dest, volume_format,
+            mock.sentinel.blocksize, run_as_root=run_as_root)
+
+        self.assertIsNone(output)
+        mock_cache.get.assert_called_once_with(ctxt, 'abc123', image_id,
+                                               mock.ANY)
+        self.assertFalse(mock_fetch.called)
+        # The cache downloads the image through the given function.
+        fetch = mock_cache.get.call_args[0][3]
+        fetch(mock.sentinel.path)
+        mock_fetch.assert_called_once_with(ctxt, image_service, image_id,
+                                           mock.sentinel.path, None, None)
+        mock_info.assert_has_calls([
+            mock.call(tmp, run_as_root=run_as_root),
+            mock.call(cached, run_as_root=run_as_root),
+            mock.call(dest, run_as_root=run_as_root)])
+        mock_convert.assert_called_once_with(cached, dest, volume_format,
+                                             run_as_root=run_as_root)
+
+    @mock.patch('cinder.image.image_utils.fetch_direct')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.temporary_file')
+    @mock.patch('cinder.image.image_utils.CONF')
+    def test_raw_direct_size_error(self, mock_conf, mock_temp, mock_info,
+                                   mock_fetch_direct):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock(temp_images=None)
+        image_service.show.return_value = {'disk_format': 'raw',
+                                           'size': 2 * units.Gi}
+        mock_conf.image_fetch_raw_direct = True
+
+        self.assertRaises(
+            exception.ImageUnacceptable,
+            image_utils.fetch_to_volume_format,
+            ctxt, image_service, mock.sentinel.image_id, mock.sentinel.dest,
+            'raw', mock.sentinel.blocksize, size=1)
+        self.assertFalse(mock_fetch_direct.called)
+
     def test_format_mismatch(self):
         self._test_format_name_mismatch()
 
@@ -924,6 +924,46 @@ class MigrationsMixin(test_migrations.WalkVersionsMixin):
                                              "image_volume_cache_entries")
         self.assertFalse(has_table)
 
+    def _check_061(self, engine, data):
+        """Test adding the pagination indexes."""
+        for table_name in ('volumes', 'snapshots', 'backups'):
+            table = db_utils.get_table(engine, table_name)
+            index_name = '%s_deleted_created_at_id_idx' % table_name
+            index_columns = []
+            for idx in table.indexes:
+                if idx.name == index_name:
+                    index_columns = idx.columns.keys()
+                    break
+
+            self.assertEqual(['deleted', 'created_at', 'id'],
+                             list(index_columns))
+
+    def _post_downgrade_061(self, engine):
+        for table_name in ('volumes', 'snapshots', 'backups'):
+            table = db_utils.get_table(engine, table_name)
+            index_names = [idx.name for idx in table.indexes]
+            self.assertNotIn('%s_deleted_created_at_id_idx' % table_name,
+                             index_names)
+
+    def _check_062(self, engine, data):
+        """Test adding the metadata key/value indexes."""
+        for table_name in ('volume_metadata', 'volume_admin_metadata'):
+            table = db_utils.get_table(engine, table_name)
+            index_columns = []
+            for idx in table.indexes:
+                if idx.name == '%s_key_value_idx' % table_name:
+                    index_columns = idx.columns.keys()
+                    break
+
+            self.assertEqual(['key', 'value', 'volume_id'],
+                             list(index_columns))
+
+    def _post_downgrade_062(self, engine):
+        for table_name in ('volume_metadata', 'volume_admin_metadata'):
+            table = db_utils.get_table(engine, table_name)
+            index_names = [idx.name for idx in table.indexes]
+            self.assertNotIn('%s_key_value_idx' % table_name, index_names)
+
     def test_walk_versions(self):
         self.walk_versions(True, False)
 
@@ -879,6 +879,61 @@ class VolumeTypeQuotaEngineTestCase(test.TestCase):
         db.volume_type_destroy(ctx, vtype['id'])
         db.volume_type_destroy(ctx, vtype2['id'])
 
+    def _stub_volume_types(self, volume_types):
+        calls = []
+
+        def fake_vtga(context, inactive=False, filters=None):
+            calls.append(1)
+            return volume_types
+        self.stubs.Set(db, 'volume_type_get_all', fake_vtga)
+        return calls
+
+    def test_resources_not_cached_by_default(self):
+        calls = self._stub_volume_types({})
+        engine = quota.VolumeTypeQuotaEngine()
+        engine.resources
+        engine.resources
+        self.assertEqual(2, len(calls))
+
+    def test_resources_cached(self):
+        self.flags(quota_resource_cache_ttl=60)
+        calls = self._stub_volume_types({})
+        engine = quota.VolumeTypeQuotaEngine()
+        self.assertIs(engine.resources, engine.resources)
+        self.assertEqual(1, len(calls))
+
+        engine.invalidate_resources()
+        engine.resources
+        self.assertEqual(2, len(calls))
+
+    @mock.patch('time.time')
+    def test_resources_cache_expires(self, mock_time):
+        self.flags(quota_resource_cache_ttl=60)
+        calls = self._stub_volume_types({})
+        engine = quota.VolumeTypeQuotaEngine()
+        mock_time.return_value = 1000
+        engine.resources
+        mock_time.return_value = 1059
+        engine.resources
+        self.assertEqual(1, len(calls))
+        mock_time.return_value = 1060
+        engine.resources
+        self.assertEqual(2, len(calls))
+
+    def test_reserve_unknown_resource_refreshes_cache(self):
+        self.flags(quota_resource_cache_ttl=60)
+        volume_types = {}
+        self._stub_volume_types(volume_types)
+        driver = mock.Mock()
+        engine = quota.VolumeTypeQuotaEngine(quota_driver_class=driver)
+        self.assertNotIn('volumes_type1', engine.resources)
+
+        volume_types['type1'] = {'id': 'fake-type-id', 'name': 'type1'}
+        engine.reserve(mock.sentinel.context, volumes_type1=1)
+
+        resources = driver.reserve.call_args[0][1]
+        self.assertIn('volumes_type1', resources)
+
 
 class DbQuotaDriverTestCase(test.TestCase):
     def setUp(self):
@@ -138,6 +138,8 @@ class RBDTestCase(test.TestCase):
         self.cfg.rbd_user = None
         self.cfg.volume_dd_blocksize = '1M'
         self.cfg.rbd_store_chunk_size = 4
+        self.cfg.rados_connection_pool_size = 0
+        self.cfg.rados_connection_pool_idle_timeout = 300
 
         mock_exec = mock.Mock()
         mock_exec.return_value = ('', '')
@@ -953,6 +955,156 @@ class RBDTestCase(test.TestCase):
             3, self.mock_rados.Rados.return_value.shutdown.call_count)
 
 
+class FakeRadosError(Exception):
+    pass
+
+
+class FakeIoctx(object):
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.state = 'open'
+
+    def close(self):
+        self.state = 'closed'
+
+
+class FakeRados(object):
+    """Stands in for rados.Rados, recording every client it creates."""
+
+    Error = FakeRadosError
+    clients = []
+
+    def __init__(self, rados_id=None, clustername=None, conffile=None):
+        self.state = 'configuring'
+        self.ioctxs = []
+        FakeRados.clients.append(self)
+
+    def connect(self, timeout=None):
+        self.state = 'connected'
+
+    def open_ioctx(self, pool):
+        ioctx = FakeIoctx(pool)
+        self.ioctxs.append(ioctx)
+        return ioctx
+
+    def shutdown(self):
+        self.state = 'shutdown'
+
+
+class FakeRadosModule(object):
+    Rados = FakeRados
+    Error = FakeRadosError
+
+
+class RADOSConnectionPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RADOSConnectionPoolTestCase, self).setUp()
+        FakeRados.clients = []
+        self.cfg = mock.Mock(spec=conf.Configuration)
+        self.cfg.rbd_cluster_name = 'ceph'
+        self.cfg.rbd_pool = 'rbd'
+        self.cfg.rbd_ceph_conf = ''
+        self.cfg.rbd_user = None
+        self.cfg.rados_connect_timeout = -1
+        self.cfg.rados_connection_pool_size = 2
+        self.cfg.rados_connection_pool_idle_timeout = 60
+        self.driver = driver.RBDDriver(configuration=self.cfg,
+                                       rados=FakeRadosModule)
+
+    def test_pool_disabled(self):
+        self.cfg.rados_connection_pool_size = 0
+        self.driver = driver.RBDDriver(configuration=self.cfg,
+                                       rados=FakeRadosModule)
+        with driver.RADOSClient(self.driver):
+            pass
+        with driver.RADOSClient(self.driver):
+            pass
+
+        self.assertEqual(2, len(FakeRados.clients))
+        for client in FakeRados.clients:
+            self.assertEqual('shutdown', client.state)
+
+    def test_connection_reused(self):
+        with driver.RADOSClient(self.driver) as client:
+            first = client.cluster
+        with driver.RADOSClient(self.driver) as client:
+            self.assertIs(first, client.cluster)
+
+        self.assertEqual(1, len(FakeRados.clients))
+        self.assertEqual('connected', first.state)
+        self.assertEqual(['rbd'], [ioctx.pool for ioctx in first.ioctxs])
+
+    def test_connections_per_pool(self):
+        with driver.RADOSClient(self.driver) as client:
+            default = client.cluster
+        with driver.RADOSClient(self.driver, 'alt_pool') as client:
+            self.assertIsNot(default, client.cluster)
+            self.assertEqual('alt_pool', client.ioctx.pool)
+        with driver.RADOSClient(self.driver, 'rbd') as client:
+            self.assertIs(default, client.cluster)
+
+        self.assertEqual(2, len(FakeRados.clients))
+
+    def test_max_size(self):
+        clients = [driver.RADOSClient(self.driver) for _i in range(3)]
+        for client in clients:
+            client.__exit__(None, None, None)
+
+        # The connection given back last does not fit in the pool anymore,
+        # the first one is shut down to make room for it.
+        self.assertEqual(['shutdown', 'connected', 'connected'],
+                         [client.cluster.state for client in clients])
+        with driver.RADOSClient(self.driver) as client:
+            self.assertIs(clients[2].cluster, client.cluster)
+
+    @mock.patch('time.time')
+    def test_idle_timeout(self, mock_time):
+        mock_time.return_value = 1000
+        with driver.RADOSClient(self.driver) as client:
+            first = client.cluster
+
+        mock_time.return_value = 1061
+        with driver.RADOSClient(self.driver) as client:
+            self.assertIsNot(first, client.cluster)
+
+        self.assertEqual('shutdown', first.state)
+        self.assertEqual(2, len(FakeRados.clients))
+
+    def test_unhealthy_connection_not_reused(self):
+        with driver.RADOSClient(self.driver) as client:
+            first = client.cluster
+        first.state = 'configuring'
+
+        with driver.RADOSClient(self.driver) as client:
+            self.assertIsNot(first, client.cluster)
+
+        self.assertEqual('shutdown', first.state)
+        self.assertEqual('closed', first.ioctxs[0].state)
+
+    def test_connection_discarded_on_error(self):
+        def _fail():
+            with driver.RADOSClient(self.driver):
+                raise FakeRadosError()
+
+        self.assertRaises(FakeRadosError, _fail)
+        self.assertEqual('shutdown', FakeRados.clients[0].state)
+
+        with driver.RADOSClient(self.driver):
+            pass
+        self.assertEqual(2, len(FakeRados.clients))
+
+    def test_close(self):
+        with driver.RADOSClient(self.driver) as client:
+            first = client.cluster
+        self.driver._rados_pool.close()
+
+        self.assertEqual('shutdown', first.state)
+        with driver.RADOSClient(self.driver) as client:
+            self.assertIsNot(first, client.cluster)
+
+
 class RBDImageIOWrapperTestCase(test.TestCase):
     def setUp(self):
         super(RBDImageIOWrapperTestCase, self).setUp()
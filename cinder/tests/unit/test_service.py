@@ -246,6 +246,20 @@ class ServiceTestCase(test.TestCase):
         serv.rpcserver.stop.assert_called_once_with()
         serv.rpcserver.wait.assert_called_once_with()
 
+    @mock.patch.object(rpc, 'get_server')
+    @mock.patch('cinder.db')
+    def test_service_stop_cleans_up_host(self, mock_db, mock_rpc):
+        serv = service.Service(
+            self.host,
+            self.binary,
+            self.topic,
+            'cinder.tests.unit.test_service.FakeManager'
+        )
+        serv.start()
+        with mock.patch.object(serv.manager, 'cleanup_host') as mock_cleanup:
+            serv.stop()
+        mock_cleanup.assert_called_once_with()
+
 
 class TestWSGIService(test.TestCase):
 
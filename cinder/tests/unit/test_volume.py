@@ -329,6 +329,108 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.volume.delete_volume(self.context, vol3['id'])
         self.volume.delete_volume(self.context, vol4['id'])
 
+    def test_init_host_export_workers(self):
+        self.flags(volume_service_inithost_export_workers=4)
+        volumes = [tests_utils.create_volume(self.context, status='in-use',
+                                             host=CONF.host)
+                   for i in range(3)]
+
+        def ensure_export(ctxt, volume, volume_path):
+            if volume['id'] == volumes[1]['id']:
+                raise exception.CinderException()
+        target_driver = self.volume.driver.target_driver
+        self.mock_object(target_driver, 'ensure_export',
+                         mock.Mock(side_effect=ensure_export))
+
+        self.volume.init_host()
+
+        self.assertEqual(3, target_driver.ensure_export.call_count)
+        self.assertEqual(
+            ['in-use', 'error', 'in-use'],
+            [db.volume_get(self.context, volume['id'])['status']
+             for volume in volumes])
+
+    def test_init_host_export_workers_single_batch(self):
+        self.flags(volume_service_inithost_export_workers=4)
+        volumes = [tests_utils.create_volume(self.context, status='in-use',
+                                             host=CONF.host)
+                   for i in range(3)]
+        self.mock_object(self.volume.driver, 'ensure_exports',
+                         mock.Mock(return_value={}))
+
+        self.volume.init_host()
+
+        # The exports are restored in bulk once, the workers are only used
+        # for the volumes exported one by one.
+        self.volume.driver.ensure_exports.assert_called_once_with(
+            mock.ANY, mock.ANY, workers=4)
+        exported = self.volume.driver.ensure_exports.call_args[0][1]
+        self.assertEqual(sorted(volume['id'] for volume in volumes),
+                         sorted(volume['id'] for volume in exported))
+
+    def test_init_host_ensure_exports_batch(self):
+        volumes = [tests_utils.create_volume(self.context, status=status,
+                                             host=CONF.host)
+                   for status in ('in-use', 'available', 'in-use')]
+        self.mock_object(self.volume.driver, 'ensure_exports',
+                         mock.Mock(return_value={
+                             volumes[2]['id']: exception.CinderException()}))
+
+        self.volume.init_host()
+
+        self.volume.driver.ensure_exports.assert_called_once_with(
+            mock.ANY, mock.ANY, workers=1)
+        exported = self.volume.driver.ensure_exports.call_args[0][1]
+        self.assertEqual(sorted([volumes[0]['id'], volumes[2]['id']]),
+                         sorted(volume['id'] for volume in exported))
+        self.assertEqual(
+            ['in-use', 'available', 'error'],
+            [db.volume_get(self.context, volume['id'])['status']
+             for volume in volumes])
+
+    @mock.patch.object(vol_manager.VolumeManager, '_add_to_threadpool')
+    @mock.patch.object(vol_manager.VolumeManager,
+                       'publish_service_capabilities')
+    def test_init_host_export_offload(self, mock_publish, mock_add_to_tp):
+        self.flags(volume_service_inithost_export_offload=True)
+        volume = tests_utils.create_volume(self.context, status='in-use',
+                                           host=CONF.host)
+        self.mock_object(self.volume.driver, 'ensure_exports')
+
+        self.volume.init_host()
+
+        mock_add_to_tp.assert_called_once_with(
+            self.volume._restore_exports_in_background, mock.ANY, mock.ANY)
+        exports = mock_add_to_tp.call_args[0][2]
+        self.assertEqual([volume['id']], [vol['id'] for vol in exports])
+        self.assertFalse(self.volume.driver.ensure_exports.called)
+        self.assertTrue(mock_publish.called)
+
+    def test_restore_exports_in_background(self):
+        volumes = [tests_utils.create_volume(self.context, status='in-use',
+                                             host=CONF.host)
+                   for i in range(4)]
+        # Detached, migrated and deleted once the service started
+        db.volume_update(self.context, volumes[0]['id'],
+                         {'status': 'detaching'})
+        db.volume_update(self.context, volumes[1]['id'],
+                         {'migration_status': 'migrating'})
+        db.volume_destroy(self.context, volumes[2]['id'])
+        self.mock_object(self.volume.driver, 'ensure_export',
+                         mock.Mock(side_effect=exception.CinderException()))
+
+        self.volume._restore_exports_in_background(self.context, volumes)
+
+        self.volume.driver.ensure_export.assert_called_once_with(
+            self.context, mock.ANY)
+        self.assertEqual(
+            volumes[3]['id'],
+            self.volume.driver.ensure_export.call_args[0][1]['id'])
+        self.assertEqual(
+            ['detaching', 'in-use', 'error'],
+            [db.volume_get(self.context, volumes[i]['id'])['status']
+             for i in (0, 1, 3)])
+
     @mock.patch.object(vol_manager.VolumeManager, 'add_periodic_task')
     def test_init_host_repl_enabled_periodic_task(self, mock_add_p_task):
         manager = vol_manager.VolumeManager()
@@ -6890,6 +6992,356 @@ class LVMVolumeDriverTestCase(DriverTestCase):
 
         lvm_driver._delete_volume(fake_snapshot, is_snapshot=True)
 
+    def _create_clear_queue(self, entries=None, lvs=None):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'queue.json')
+        if entries is not None:
+            with open(path, 'w') as queue_file:
+                jsonutils.dump(entries, queue_file)
+
+        self.configuration.volume_clear = 'zero'
+        self.configuration.lvm_deferred_clear = True
+        self.configuration.lvm_deferred_clear_queue_file = path
+        vg = mock.MagicMock(vg_name='cinder-volumes')
+        vg.get_volumes.return_value = lvs or []
+        lvm_driver = lvm.LVMVolumeDriver(configuration=self.configuration,
+                                         vg_obj=vg, db=db)
+        lvm_driver._clear_volume = mock.Mock()
+        lvm_driver._start_clear_queue()
+        self.addCleanup(lvm_driver._clear_queue._worker.kill)
+        return lvm_driver, path
+
+    @staticmethod
+    def _read_clear_queue(path):
+        with open(path) as queue_file:
+            return jsonutils.load(queue_file)
+
+    def test_delete_volume_deferred_clear(self):
+        lvm_driver, path = self._create_clear_queue()
+        volume = dict(self.FAKE_VOLUME, size=2)
+
+        lvm_driver._delete_volume(volume)
+
+        lvm_driver.vg.rename_volume.assert_called_once_with('test1',
+                                                            'clear-test1')
+        self.assertFalse(lvm_driver.vg.delete.called)
+        self.assertEqual([{'name': 'clear-test1', 'id': 'test1', 'size': 2}],
+                         self._read_clear_queue(path))
+        lvm_driver._update_volume_stats()
+        pool = lvm_driver._stats['pools'][0]
+        self.assertEqual(1, pool['pending_clear_volumes'])
+        self.assertEqual(2, pool['pending_clear_capacity_gb'])
+
+        # Let the worker clear it
+        eventlet.sleep(0)
+
+        lvm_driver._clear_volume.assert_called_once_with(
+            {'name': 'clear-test1', 'id': 'test1', 'size': 2},
+            throttle=None)
+        lvm_driver.vg.delete.assert_called_once_with('clear-test1')
+        self.assertEqual([], self._read_clear_queue(path))
+        self.assertEqual(0, lvm_driver._clear_queue.backlog_gb)
+
+    def test_delete_snapshot_deferred_clear(self):
+        lvm_driver, _path = self._create_clear_queue()
+        snapshot = dict(self.FAKE_VOLUME, size=2)
+
+        lvm_driver._delete_volume(snapshot, is_snapshot=True)
+
+        lvm_driver._clear_volume.assert_called_once_with(snapshot, True)
+        self.assertFalse(lvm_driver.vg.rename_volume.called)
+        lvm_driver.vg.delete.assert_called_once_with('test1')
+
+    def test_deferred_clear_resumed(self):
+        entries = [{'name': 'clear-volume-1', 'id': '1', 'size': 1},
+                   {'name': 'clear-volume-2', 'id': '2', 'size': 2}]
+        lvs = [{'vg': 'cinder-volumes', 'name': 'clear-volume-1',
+                'size': '1.00'},
+               {'vg': 'cinder-volumes', 'name': 'clear-volume-3',
+                'size': '3.00'},
+               {'vg': 'cinder-volumes', 'name': 'volume-4', 'size': '4.00'}]
+        lvm_driver, path = self._create_clear_queue(entries, lvs)
+
+        # volume-2 is gone, volume-3 was renamed but not recorded
+        self.assertEqual([entries[0],
+                          {'name': 'clear-volume-3', 'id': 'volume-3',
+                           'size': 3}],
+                         self._read_clear_queue(path))
+
+        eventlet.sleep(0)
+
+        self.assertEqual([mock.call('clear-volume-1'),
+                          mock.call('clear-volume-3')],
+                         lvm_driver.vg.delete.call_args_list)
+        self.assertEqual([], self._read_clear_queue(path))
+
+    def test_deferred_clear_failure_kept(self):
+        lvs = [{'vg': 'cinder-volumes', 'name': 'clear-volume-1',
+                'size': '1.00'}]
+        lvm_driver, path = self._create_clear_queue([], lvs)
+        lvm_driver._clear_volume.side_effect = (
+            processutils.ProcessExecutionError)
+
+        eventlet.sleep(0)
+
+        self.assertTrue(lvm_driver._clear_volume.called)
+        self.assertFalse(lvm_driver.vg.delete.called)
+        self.assertEqual(['clear-volume-1'],
+                         [entry['name']
+                          for entry in self._read_clear_queue(path)])
+
+    def _fake_dmsetup(self, *cmd, **kwargs):
+        if cmd[0] == 'dd':
+            self.assertIn('of=/dev/mapper/cinder--volumes-clone--meta--2',
+                          cmd)
+            return '', ''
+        self.assertEqual('dmsetup', cmd[0])
+        action, name = cmd[1], cmd[2]
+        if action == 'info' and name not in self.dm_tables:
+            raise processutils.ProcessExecutionError()
+        elif action == 'table':
+            return self.dm_tables[name] + '\n', ''
+        elif action in ('create', 'load'):
+            self.dm_tables[name] = cmd[4]
+        elif action == 'remove':
+            del self.dm_tables[name]
+        elif action == 'status':
+            return ('0 2097152 clone 8 30/1024 128 %s 0 2 '
+                    'hydration_threshold 1 hydration_batch_size 64 rw\n' %
+                    self.hydration), ''
+        elif action == 'message':
+            self.dm_messages.append(cmd[4])
+        return '', ''
+
+    def _create_lazy_clones(self, entries=None, bps_limit=0):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'clones.json')
+        if entries is not None:
+            with open(path, 'w') as clones_file:
+                jsonutils.dump(entries, clones_file)
+
+        self.configuration.lvm_lazy_clone = True
+        self.configuration.lvm_lazy_clone_file = path
+        self.configuration.lvm_lazy_clone_bps_limit = bps_limit
+        self.configuration.lvm_mirrors = 0
+        self.dm_tables = {'cinder--volumes-volume--2': '0 2097152 linear '
+                                                       '8:16 2048'}
+        self.dm_messages = []
+        self.hydration = '0/16384'
+        vg = mock.MagicMock()
+        vg.get_volume.side_effect = lambda name: (
+            {'name': name} if name in ('volume-1', 'volume-2') else None)
+        lvm_driver = lvm.LVMVolumeDriver(configuration=self.configuration,
+                                         vg_obj=vg, db=mock.Mock())
+        lvm_driver._execute = mock.Mock(side_effect=self._fake_dmsetup)
+        lvm_driver.delete_snapshot = mock.Mock()
+        lvm_driver._start_lazy_clones()
+        self.addCleanup(lvm_driver._lazy_clones._worker.kill)
+        return lvm_driver, path
+
+    @mock.patch.object(volutils, 'copy_volume')
+    def _create_lazy_clone(self, lvm_driver, mock_copy):
+        src_vref = {'name': 'volume-1', 'id': '1', 'size': 1}
+        volume = {'name': 'volume-2', 'id': '2', 'size': 1}
+        lvm_driver.create_cloned_volume(volume, src_vref)
+        self.assertFalse(mock_copy.called)
+        return volume
+
+    def test_create_cloned_volume_lazy(self):
+        lvm_driver, path = self._create_lazy_clones()
+
+        self._create_lazy_clone(lvm_driver)
+
+        self.assertEqual('0 2097152 clone '
+                         '/dev/mapper/cinder--volumes-clone--meta--2 '
+                         '/dev/mapper/cinder-clone-2 '
+                         '/dev/mapper/cinder--volumes-clone--snap--2 128 '
+                         '0 2 hydration_batch_size 64',
+                         self.dm_tables['cinder--volumes-volume--2'])
+        self.assertEqual('0 2097152 linear 8:16 2048',
+                         self.dm_tables['cinder-clone-2'])
+        self.assertFalse(lvm_driver.delete_snapshot.called)
+        with open(path) as clones_file:
+            self.assertEqual(['volume-2'],
+                             [entry['name']
+                              for entry in jsonutils.load(clones_file)])
+        lvm_driver.db.volume_admin_metadata_update.assert_called_once_with(
+            mock.ANY, '2', {'hydration_progress': '0%'}, False)
+        lvm_driver._update_volume_stats()
+        self.assertEqual(1,
+                         lvm_driver._stats['pools'][0]['hydrating_volumes'])
+
+        clones = lvm_driver._lazy_clones
+        entry = clones._entries['volume-2']
+        self.hydration = '8192/16384'
+        clones._check(entry)
+        lvm_driver.db.volume_admin_metadata_update.assert_called_with(
+            mock.ANY, '2', {'hydration_progress': '50%'}, False)
+
+        self.hydration = '16384/16384'
+        clones._check(entry)
+        self.assertEqual({'cinder--volumes-volume--2': '0 2097152 linear '
+                                                       '8:16 2048'},
+                         self.dm_tables)
+        lvm_driver.vg.delete.assert_called_once_with('clone-meta-2')
+        self.assertEqual('clone-snap-2',
+                         lvm_driver.delete_snapshot.call_args[0][0]['name'])
+        lvm_driver.db.volume_admin_metadata_delete.assert_called_once_with(
+            mock.ANY, '2', 'hydration_progress')
+        self.assertEqual(0, len(clones))
+        with open(path) as clones_file:
+            self.assertEqual([], jsonutils.load(clones_file))
+
+    @mock.patch.object(volutils, 'copy_volume')
+    def test_create_cloned_volume_lazy_larger(self, mock_copy):
+        lvm_driver, _path = self._create_lazy_clones()
+        src_vref = {'name': 'volume-1', 'id': '1', 'size': 1}
+        volume = {'name': 'volume-2', 'id': '2', 'size': 2}
+
+        lvm_driver.create_cloned_volume(volume, src_vref)
+
+        self.assertTrue(mock_copy.called)
+        self.assertTrue(lvm_driver.delete_snapshot.called)
+        self.assertEqual(0, len(lvm_driver._lazy_clones))
+
+    @mock.patch.object(volutils, 'copy_volume')
+    def test_create_cloned_volume_lazy_mirrored(self, mock_copy):
+        lvm_driver, _path = self._create_lazy_clones()
+        self.configuration.lvm_mirrors = 1
+        src_vref = {'name': 'volume-1', 'id': '1', 'size': 1}
+        volume = {'name': 'volume-2', 'id': '2', 'size': 1}
+
+        lvm_driver.create_cloned_volume(volume, src_vref)
+
+        self.assertTrue(mock_copy.called)
+        self.assertTrue(lvm_driver.delete_snapshot.called)
+        self.assertNotIn('cinder-clone-2', self.dm_tables)
+        self.assertEqual(0, len(lvm_driver._lazy_clones))
+
+    def test_lazy_clone_mapped_before_checked(self):
+        lvm_driver, _path = self._create_lazy_clones()
+        clones = lvm_driver._lazy_clones
+        real_map = clones._map
+
+        def _map(entry):
+            # Neither the poller nor waiters may see a half added clone
+            self.assertTrue(clones._lock.locked())
+            self.assertIn(entry['name'], clones._done)
+            real_map(entry)
+
+        with mock.patch.object(clones, '_map', side_effect=_map):
+            self._create_lazy_clone(lvm_driver)
+        self.assertEqual(1, len(clones))
+
+    def test_lazy_clone_map_failure(self):
+        lvm_driver, path = self._create_lazy_clones()
+        clones = lvm_driver._lazy_clones
+        src_vref = {'name': 'volume-1', 'id': '1', 'size': 1}
+        volume = {'name': 'volume-2', 'id': '2', 'size': 1}
+
+        with mock.patch.object(clones, '_map',
+                               side_effect=processutils.ProcessExecutionError):
+            self.assertRaises(processutils.ProcessExecutionError,
+                              lvm_driver.create_cloned_volume,
+                              volume, src_vref)
+        self.assertEqual(0, len(clones))
+        self.assertEqual({}, clones._done)
+        lvm_driver.vg.delete.assert_any_call('clone-meta-2')
+        with open(path) as clones_file:
+            self.assertEqual([], jsonutils.load(clones_file))
+
+    @mock.patch.object(lvm, 'time')
+    def test_lazy_clone_throttled(self, mock_time):
+        lvm_driver, _path = self._create_lazy_clones(bps_limit=units.Mi)
+        self._create_lazy_clone(lvm_driver)
+        lvm_driver.vg.create_lv_snapshot.reset_mock()
+        clones = lvm_driver._lazy_clones
+        entry = clones._entries['volume-2']
+
+        mock_time.time.return_value = 100
+        clones._check(entry)
+        # 8 MiB copied in 1s
+        mock_time.time.return_value = 101
+        self.hydration = '128/16384'
+        clones._check(entry)
+        self.assertEqual(['disable_hydration'], self.dm_messages)
+        mock_time.time.return_value = 108
+        clones._check(entry)
+        self.assertEqual(['disable_hydration', 'enable_hydration'],
+                         self.dm_messages)
+
+        # Hydrated at full speed once waited for
+        mock_time.time.return_value = 109
+        self.hydration = '256/16384'
+        clones._check(entry)
+        waiter = eventlet.spawn(lvm_driver.create_snapshot,
+                                {'name': 'snapshot-1',
+                                 'volume_name': 'volume-2'})
+        eventlet.sleep(0)
+        self.assertFalse(waiter.dead)
+        self.assertEqual(['disable_hydration', 'enable_hydration',
+                          'disable_hydration', 'enable_hydration'],
+                         self.dm_messages)
+        self.assertFalse(lvm_driver.vg.create_lv_snapshot.called)
+
+        self.hydration = '16384/16384'
+        clones._check(entry)
+        waiter.wait()
+        lvm_driver.vg.create_lv_snapshot.assert_called_once_with(
+            '_snapshot-1', 'volume-2', 'default')
+
+    def test_lazy_clone_deleted(self):
+        lvm_driver, _path = self._create_lazy_clones()
+        volume = self._create_lazy_clone(lvm_driver)
+        lvm_driver.vg.lv_has_snapshot.return_value = False
+        lvm_driver._delete_volume = mock.Mock()
+
+        lvm_driver.delete_volume(volume)
+
+        self.assertNotIn('cinder-clone-2', self.dm_tables)
+        lvm_driver.vg.delete.assert_called_once_with('clone-meta-2')
+        self.assertTrue(lvm_driver.delete_snapshot.called)
+        lvm_driver._delete_volume.assert_called_once_with(volume)
+        self.assertEqual(0, len(lvm_driver._lazy_clones))
+
+    def test_lazy_clone_source_deleted(self):
+        lvm_driver, _path = self._create_lazy_clones()
+        self._create_lazy_clone(lvm_driver)
+        lvm_driver.vg.lv_has_snapshot.return_value = False
+        lvm_driver._delete_volume = mock.Mock()
+        clones = lvm_driver._lazy_clones
+        entry = clones._entries['volume-2']
+        source = {'name': 'volume-1', 'id': '1', 'size': 1}
+
+        # The snapshot read by the clone must outlive the hydration
+        waiter = eventlet.spawn(lvm_driver.delete_volume, source)
+        eventlet.sleep(0)
+        self.assertFalse(waiter.dead)
+        self.assertFalse(lvm_driver._delete_volume.called)
+
+        self.hydration = '16384/16384'
+        clones._check(entry)
+        waiter.wait()
+        self.assertTrue(lvm_driver.delete_snapshot.called)
+        lvm_driver._delete_volume.assert_called_once_with(source)
+
+    def test_lazy_clone_mapped_on_start(self):
+        entries = [{'name': 'volume-2', 'id': '2', 'size': 1,
+                    'snapshot': 'clone-snap-2', 'metadata': 'clone-meta-2'},
+                   {'name': 'volume-3', 'id': '3', 'size': 1,
+                    'snapshot': 'clone-snap-3', 'metadata': 'clone-meta-3'}]
+
+        # The mapping of volume-2 was lost on reboot, volume-3 is gone
+        lvm_driver, path = self._create_lazy_clones(entries)
+
+        self.assertIn(' clone ', self.dm_tables['cinder--volumes-volume--2'])
+        self.assertEqual('0 2097152 linear 8:16 2048',
+                         self.dm_tables['cinder-clone-2'])
+        with open(path) as clones_file:
+            self.assertEqual(entries[:1], jsonutils.load(clones_file))
+
     def test_check_for_setup_error(self):
 
         def get_all_volume_groups(vg):
@@ -17,6 +17,7 @@
 import datetime
 import time
 
+import mock
 from oslo_config import cfg
 
 from cinder import context
@@ -24,6 +25,7 @@ from cinder import db
 from cinder.db.sqlalchemy import api as db_api
 from cinder.db.sqlalchemy import models
 from cinder import exception
+from cinder import quota
 from cinder import test
 from cinder.tests.unit import conf_fixture
 from cinder.volume import qos_specs
@@ -84,6 +86,14 @@ class VolumeTypeTestCase(test.TestCase):
                          new_all_vtypes,
                          'drive type was not deleted')
 
+    @mock.patch.object(quota.QUOTAS, 'invalidate_resources')
+    def test_volume_type_changes_invalidate_quota_resources(self,
+                                                            mock_invalidate):
+        type_ref = volume_types.create(self.ctxt, self.vol_type1_name)
+        volume_types.update(self.ctxt, type_ref['id'], None, 'desc')
+        volume_types.destroy(self.ctxt, type_ref['id'])
+        self.assertEqual(3, mock_invalidate.call_count)
+
     def test_create_volume_type_with_invalid_params(self):
         """Ensure exception will be returned."""
         vol_type_invalid_specs = "invalid_extra_specs"
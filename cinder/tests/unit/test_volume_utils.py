@@ -19,7 +19,9 @@
 import datetime
 import io
 import mock
+import os
 import six
+import tempfile
 
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -648,7 +650,8 @@ class CopyVolumeTestCase(test.TestCase):
         handle2 = io.RawIOBase()
         output = volume_utils.copy_volume(handle1, handle2, 1024, 1)
         self.assertIsNone(output)
-        mock_copy.assert_called_once_with(handle1, handle2, 1024)
+        mock_copy.assert_called_once_with(handle1, handle2, 1024,
+                                          sparse=False)
 
     @mock.patch('cinder.volume.utils._transfer_data')
     @mock.patch('cinder.volume.utils._open_volume_with_path')
@@ -657,7 +660,101 @@ class CopyVolumeTestCase(test.TestCase):
         output = volume_utils.copy_volume('/foo/bar', handle, 1024, 1)
         self.assertIsNone(output)
         mock_transfer.assert_called_once_with(mock.ANY, mock.ANY,
-                                              1073741824, mock.ANY)
+                                              1073741824, mock.ANY,
+                                              sparse=False)
+
+
+class TransferDataTestCase(test.TestCase):
+
+    class ReadOnlyHandle(io.RawIOBase):
+        """Handle implementing read() only, like connector volume handles."""
+
+        def __init__(self, data):
+            super(TransferDataTestCase.ReadOnlyHandle, self).__init__()
+            self._data = io.BytesIO(data)
+
+        def read(self, length=-1):
+            return self._data.read(length)
+
+    def test_transfer_data_handles(self):
+        data = os.urandom(10 * 1024 + 7)
+        src = self.ReadOnlyHandle(data)
+        dest = io.BytesIO()
+
+        volume_utils._transfer_data(src, dest, len(data), 1024)
+
+        self.assertEqual(data, dest.getvalue())
+
+    def test_transfer_data_stops_at_length(self):
+        data = os.urandom(4 * 1024)
+        dest = io.BytesIO()
+
+        volume_utils._transfer_data(io.BytesIO(data), dest, 3 * 1024 + 1,
+                                    1024)
+
+        self.assertEqual(data[:3 * 1024 + 1], dest.getvalue())
+
+    def test_transfer_data_sparse(self):
+        data = (os.urandom(1024) + b'\0' * 2048 + os.urandom(1024) +
+                b'\0' * 1024)
+        dest = io.BytesIO()
+
+        with mock.patch.object(dest, 'write', wraps=dest.write) as mock_write:
+            volume_utils._transfer_data(io.BytesIO(data), dest, len(data),
+                                        1024, sparse=True)
+
+        self.assertEqual(data, dest.getvalue())
+        # The two zeroed chunks in the middle are skipped, the trailing one
+        # is written to set the length.
+        self.assertEqual(3, mock_write.call_count)
+
+    def test_transfer_data_write_error(self):
+        reads = [mock.Mock(**{'wait.return_value': 1024}) for i in range(2)]
+        dest = mock.Mock(**{'write.side_effect': IOError()})
+
+        with mock.patch.object(volume_utils.eventlet, 'spawn',
+                               side_effect=reads):
+            self.assertRaises(IOError, volume_utils._transfer_data,
+                              io.BytesIO(b'\1' * 4096), dest, 4096, 1024)
+
+        # The read of the next chunk is not left running
+        reads[1].wait.assert_called_once_with()
+
+    def test_transfer_data_files(self):
+        data = os.urandom(10 * 1024)
+        with tempfile.TemporaryFile() as src:
+            src.write(data)
+            src.seek(0)
+            with tempfile.TemporaryFile() as dest:
+                volume_utils._transfer_data(src, dest, len(data), 4096)
+                self.assertEqual(len(data), src.tell())
+                self.assertEqual(len(data), dest.tell())
+                dest.seek(0)
+                self.assertEqual(data, dest.read())
+
+
+class EnsureExportsConcurrentlyTestCase(test.TestCase):
+
+    def _test_ensure_exports(self, workers):
+        volumes = [{'id': 'vol%d' % i} for i in range(3)]
+        ensure_export = mock.Mock(
+            side_effect=[None, exception.CinderException(), None])
+
+        failures = volume_utils.ensure_exports_concurrently(
+            ensure_export, mock.sentinel.context,
+            [(volume, 'path%d' % i) for i, volume in enumerate(volumes)],
+            workers)
+
+        self.assertEqual(['vol1'], list(failures))
+        ensure_export.assert_has_calls(
+            [mock.call(mock.sentinel.context, volume, 'path%d' % i)
+             for i, volume in enumerate(volumes)])
+
+    def test_ensure_exports(self):
+        self._test_ensure_exports(1)
+
+    def test_ensure_exports_workers(self):
+        self._test_ensure_exports(2)
 
 
 class VolumeUtilsTestCase(test.TestCase):
@@ -617,6 +617,49 @@ class CreateVolumeFlowManagerImageCacheTestCase(test.TestCase):
             image_meta=image_meta
         )
 
+    def test_create_from_image_cache_filled_concurrently(
+            self, mock_get_internal_context, mock_create_from_img_dl,
+            mock_create_from_src, mock_handle_bootable, mock_fetch_img):
+        self.mock_driver.clone_image.return_value = (None, False)
+        image_volume_id = '70a599e0-31e7-49b7-b260-868f441e862b'
+        # Another request is creating the cache entry on the first lookup.
+        self.mock_cache.get_entry.side_effect = [
+            None, {'volume_id': image_volume_id}]
+        self.mock_cache.begin_fill.return_value = False
+
+        volume = fake_volume.fake_volume_obj(self.ctxt, host='foo@bar#pool')
+
+        image_location = 'someImageLocationStr'
+        image_id = 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2'
+        image_meta = mock.Mock()
+
+        manager = create_volume_manager.CreateVolumeFromSpecTask(
+            self.mock_volume_manager,
+            self.mock_db,
+            self.mock_driver,
+            image_volume_cache=self.mock_cache
+        )
+
+        manager._create_from_image(self.ctxt,
+                                   volume,
+                                   image_location,
+                                   image_id,
+                                   image_meta,
+                                   self.mock_image_service)
+
+        self.mock_cache.begin_fill.assert_called_once_with(image_id,
+                                                           'foo@bar#pool')
+        self.assertEqual(2, self.mock_cache.get_entry.call_count)
+
+        # It should clone the image-volume created by the other request
+        mock_create_from_src.assert_called_once_with(self.ctxt,
+                                                     volume,
+                                                     image_volume_id)
+        self.assertFalse(mock_create_from_img_dl.called)
+        self.assertFalse(
+            self.mock_volume_manager._create_image_cache_volume_entry.called)
+        self.assertFalse(self.mock_cache.end_fill.called)
+
     @mock.patch('cinder.image.image_utils.qemu_img_info')
     def test_create_from_image_cache_miss(
             self, mock_qemu_info, mock_get_internal_context,
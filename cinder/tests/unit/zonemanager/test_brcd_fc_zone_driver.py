@@ -28,6 +28,7 @@ from cinder import exception
 from cinder import test
 from cinder.volume import configuration as conf
 from cinder.zonemanager.drivers.brocade import brcd_fc_zone_driver as driver
+from cinder.zonemanager import fc_zone_manager
 
 _active_cfg_before_add = {}
 _active_cfg_before_delete = {
@@ -149,6 +150,45 @@ class TestBrcdFcZoneDriver(BrcdFcZoneDriverBaseTest, test.TestCase):
             'BRCD_FAB_1', _initiator_target_map)
         self.assertFalse(_zone_name in GlobalVars._zone_state)
 
+    def test_add_connection_multiple_initiators(self):
+        GlobalVars._is_normal_test = True
+        GlobalVars._active_cfg = _active_cfg_before_add
+        i_t_map = {'10008c7cff523b01': ['20240002ac000a50'],
+                   '10008c7cff523b02': ['20240002ac000a50']}
+        with mock.patch.object(FakeBrcdFCZoneClientCLI, 'add_zones',
+                               autospec=True) as add_zones_mock:
+            self.driver.add_connection('BRCD_FAB_1', i_t_map)
+        # Zones of all initiators are created with a single activation
+        self.assertEqual(1, add_zones_mock.call_count)
+        self.assertEqual(2, len(add_zones_mock.call_args[0][1]))
+
+    def test_zone_set_cache(self):
+        GlobalVars._is_normal_test = True
+        GlobalVars._active_cfg = _active_cfg_before_delete
+        zone_set_cache = fc_zone_manager.ZoneSetCache(60)
+        self.driver = importutils.import_object(
+            'cinder.zonemanager.drivers.brocade.brcd_fc_zone_driver'
+            '.BrcdFCZoneDriver', configuration=self.setup_config(True, 1),
+            zone_set_cache=zone_set_cache)
+        with mock.patch.object(FakeBrcdFCZoneClientCLI, 'get_active_zone_set',
+                               return_value=_active_cfg_before_delete) as (
+                get_active_zs_mock):
+            # The zone set is read from the fabric on every change, another
+            # process may have changed it.
+            self.driver.add_connection('BRCD_FAB_1', _initiator_target_map)
+            self.driver.add_connection('BRCD_FAB_1', _initiator_target_map)
+            self.assertEqual(2, get_active_zs_mock.call_count)
+            fetch = mock.Mock()
+            self.assertEqual(_active_cfg_before_delete,
+                             zone_set_cache.get('BRCD_FAB_1', fetch))
+            self.assertFalse(fetch.called)
+
+            # Changing the zones invalidates the cached zone set
+            self.driver.delete_connection('BRCD_FAB_1', _initiator_target_map)
+            self.assertEqual(3, get_active_zs_mock.call_count)
+            zone_set_cache.get('BRCD_FAB_1', fetch)
+            self.assertTrue(fetch.called)
+
     def test_add_connection_for_invalid_fabric(self):
         """Test abnormal flows."""
         GlobalVars._is_normal_test = True
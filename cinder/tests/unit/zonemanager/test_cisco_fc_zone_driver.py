@@ -17,6 +17,7 @@
 
 """Unit tests for Cisco FC zone driver."""
 
+import mock
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_utils import importutils
@@ -24,6 +25,8 @@ from oslo_utils import importutils
 from cinder import exception
 from cinder import test
 from cinder.volume import configuration as conf
+from cinder.zonemanager.drivers.cisco import cisco_fc_zone_driver as driver
+from cinder.zonemanager import fc_zone_manager
 
 _active_cfg_before_add = {}
 _active_cfg_before_delete = {
@@ -127,6 +130,35 @@ class TestCiscoFcZoneDriver(CiscoFcZoneDriverBaseTest, test.TestCase):
             'CISCO_FAB_1', _initiator_target_map)
         self.assertFalse(_zone_name in GlobalVars._zone_state)
 
+    @mock.patch.object(driver.CiscoFCZoneDriver, 'get_zoning_status',
+                       return_value={'mode': 'basic', 'session': 'none'})
+    @mock.patch.object(driver.CiscoFCZoneDriver, 'get_active_zone_set',
+                       return_value=_active_cfg_before_delete)
+    def test_zone_set_cache(self, get_active_zs_mock, get_status_mock):
+        GlobalVars._is_normal_test = True
+        zone_set_cache = fc_zone_manager.ZoneSetCache(60)
+        self.driver = importutils.import_object(
+            'cinder.zonemanager.drivers.cisco.cisco_fc_zone_driver'
+            '.CiscoFCZoneDriver', configuration=self.setup_config(True, 1),
+            zone_set_cache=zone_set_cache)
+        other_target_map = {'10008c7cff523b02': ['20240002ac000a50']}
+
+        # The zone set is read from the fabric on every change, another
+        # process may have changed it.
+        self.driver.delete_connection('CISCO_FAB_1', other_target_map)
+        self.driver.delete_connection('CISCO_FAB_1', other_target_map)
+        self.assertEqual(2, get_active_zs_mock.call_count)
+        fetch = mock.Mock()
+        self.assertEqual(_active_cfg_before_delete,
+                         zone_set_cache.get('CISCO_FAB_1', fetch))
+        self.assertFalse(fetch.called)
+
+        # Deleting the zone invalidates the cached zone set
+        self.driver.delete_connection('CISCO_FAB_1', _initiator_target_map)
+        self.assertEqual(3, get_active_zs_mock.call_count)
+        zone_set_cache.get('CISCO_FAB_1', fetch)
+        self.assertTrue(fetch.called)
+
     def test_add_connection_for_invalid_fabric(self):
         """Test abnormal flows."""
         GlobalVars._is_normal_test = True
@@ -157,10 +189,12 @@ class FakeCiscoFCZoneClientCLI(object):
     def get_active_zone_set(self):
         return GlobalVars._active_cfg
 
-    def add_zones(self, zones, isActivate):
+    def add_zones(self, zones, isActivate, fabric_vsan, active_zone_set,
+                  zone_status):
         GlobalVars._zone_state.extend(zones.keys())
 
-    def delete_zones(self, zone_names, isActivate):
+    def delete_zones(self, zone_names, isActivate, fabric_vsan,
+                     active_zone_set, zone_status):
         zone_list = zone_names.split(';')
         GlobalVars._zone_state = [
             x for x in GlobalVars._zone_state if x not in zone_list]
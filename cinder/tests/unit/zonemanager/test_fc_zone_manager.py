@@ -19,6 +19,7 @@
 
 """Unit tests for FC Zone Manager."""
 
+import eventlet
 import mock
 
 from cinder import exception
@@ -90,3 +91,78 @@ class TestFCZoneManager(test.TestCase):
             del_connection_mock.side_effect = exception.FCZoneDriverException
             self.assertRaises(exception.ZoneManagerException,
                               self.zm.delete_connection, init_target_map)
+
+    def test_add_connection_batched(self):
+        self.override_config('zoning_batch_window', 0.01, 'fc-zone-manager')
+        other_target_map = {'10008c7cff523b02': ['20240002ac000a50']}
+        self.zm.driver.get_san_context.return_value = fabric_map
+
+        threads = [eventlet.spawn(self.zm.add_connection, i_t_map)
+                   for i_t_map in (dict(init_target_map), other_target_map)]
+        for thread in threads:
+            thread.wait()
+
+        merged_map = dict(init_target_map)
+        merged_map.update(other_target_map)
+        self.zm.driver.add_connection.assert_called_once_with(fabric_name,
+                                                              merged_map)
+
+    def test_batched_requests_retried_on_error(self):
+        self.override_config('zoning_batch_window', 0.01, 'fc-zone-manager')
+        bad_target_map = {'10008c7cff523b02': ['20240002ac000a50']}
+        self.zm.driver.get_san_context.return_value = fabric_map
+
+        def fake_add_connection(fabric, i_t_map):
+            if '10008c7cff523b02' in i_t_map:
+                raise exception.FCZoneDriverException()
+
+        self.zm.driver.add_connection.side_effect = fake_add_connection
+        good = eventlet.spawn(self.zm.add_connection, dict(init_target_map))
+        bad = eventlet.spawn(self.zm.add_connection, bad_target_map)
+
+        good.wait()
+        self.assertRaises(exception.ZoneManagerException, bad.wait)
+        self.assertEqual(3, self.zm.driver.add_connection.call_count)
+        self.zm.driver.add_connection.assert_any_call(fabric_name,
+                                                      init_target_map)
+
+
+class TestZoneSetCache(test.TestCase):
+
+    def test_get(self):
+        cache = fc_zone_manager.ZoneSetCache(60)
+        fetch = mock.Mock(return_value={'zones': {}})
+
+        self.assertEqual({'zones': {}}, cache.get(fabric_name, fetch))
+        self.assertEqual({'zones': {}}, cache.get(fabric_name, fetch))
+        self.assertEqual(1, fetch.call_count)
+
+        cache.invalidate(fabric_name)
+        cache.get(fabric_name, fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_refresh(self):
+        cache = fc_zone_manager.ZoneSetCache(60)
+        cache.get(fabric_name, mock.Mock(return_value={'zones': {}}))
+        fetch = mock.Mock(return_value={'zones': {'zone1': []}})
+
+        self.assertEqual({'zones': {'zone1': []}},
+                         cache.refresh(fabric_name, fetch))
+        self.assertEqual({'zones': {'zone1': []}},
+                         cache.get(fabric_name, fetch))
+        self.assertEqual(1, fetch.call_count)
+
+    def test_get_expired(self):
+        cache = fc_zone_manager.ZoneSetCache(0)
+        fetch = mock.Mock(return_value={'zones': {}})
+
+        cache.get(fabric_name, fetch)
+        cache.get(fabric_name, fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_get_returns_copy(self):
+        cache = fc_zone_manager.ZoneSetCache(60)
+        fetch = mock.Mock(return_value={'zones': {}})
+
+        cache.get(fabric_name, fetch)['zones']['zone1'] = []
+        self.assertEqual({'zones': {}}, cache.get(fabric_name, fetch))
@@ -455,7 +455,7 @@ class API(base.Base):
 
     def get_all(self, context, marker=None, limit=None, sort_keys=None,
                 sort_dirs=None, filters=None, viewable_admin_meta=False,
-                offset=None):
+                offset=None, columns_to_join=None):
         check_policy(context, 'get_all')
 
         if filters is None:
@@ -490,7 +490,8 @@ class API(base.Base):
                                              sort_keys=sort_keys,
                                              sort_dirs=sort_dirs,
                                              filters=filters,
-                                             offset=offset)
+                                             offset=offset,
+                                             columns_to_join=columns_to_join)
         else:
             if viewable_admin_meta:
                 context = context.elevated()
@@ -500,7 +501,9 @@ class API(base.Base):
                                                         sort_keys=sort_keys,
                                                         sort_dirs=sort_dirs,
                                                         filters=filters,
-                                                        offset=offset)
+                                                        offset=offset,
+                                                        columns_to_join=(
+                                                            columns_to_join))
 
         LOG.info(_LI("Get all volumes completed successfully."))
         return volumes
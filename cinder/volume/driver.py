@@ -171,6 +171,13 @@ volume_opts = [
                       'provisioned capacity cannot exceed the total physical '
                       'capacity. A ratio lower than 1.0 will be ignored and '
                       'the default value will be used instead.'),
+    cfg.IntOpt('lio_persist_delay',
+               default=0,
+               help='Seconds during which the changes made to the LIO '
+                    'targets are saved together, as each save writes the '
+                    'whole LIO configuration. Pending changes are saved '
+                    'when the service stops. 0 saves the configuration '
+                    'after each change. Only used with lioadm.'),
     cfg.StrOpt('scst_target_iqn_name',
                default=None,
                help='Certain ISCSI targets have predefined target names, '
@@ -1269,6 +1276,10 @@ class BaseVD(object):
         """Any initialization the volume driver does while starting."""
         pass
 
+    def do_teardown(self):
+        """Any work the volume driver completes while stopping."""
+        pass
+
     def validate_connector(self, connector):
         """Fail if connector doesn't contain all the data needed by driver."""
         pass
@@ -1305,6 +1316,21 @@ class BaseVD(object):
         """Synchronously recreates an export for a volume."""
         return
 
+    def ensure_exports(self, context, volumes, workers=1):
+        """Synchronously recreates the exports of several volumes.
+
+        Drivers able to restore many exports at once should override this,
+        by default ensure_export() is called for each volume.
+
+        :param workers: number of volumes which can be exported one by one
+                        at the same time
+        :returns: dict of the exceptions raised by the volumes which could
+                  not be exported, by volume id
+        """
+        return volume_utils.ensure_exports_concurrently(
+            self.ensure_export, context, [(volume,) for volume in volumes],
+            workers)
+
     @abc.abstractmethod
     def create_export(self, context, volume, connector):
         """Exports the volume.
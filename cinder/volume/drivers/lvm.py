@@ -15,24 +15,33 @@ Driver for Linux servers running LVM.
 
 """
 
+import collections
 import math
 import os
 import socket
+import time
 
+import eventlet
+from eventlet import event
+from eventlet import queue
+from eventlet import semaphore
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from oslo_utils import excutils
 from oslo_utils import importutils
 from oslo_utils import units
 import six
 
 from cinder.brick.local_dev import lvm as lvm
+from cinder import context as cinder_context
 from cinder import exception
 from cinder.i18n import _, _LE, _LI, _LW
 from cinder.image import image_utils
 from cinder import utils
 from cinder.volume import driver
+from cinder.volume import throttling
 from cinder.volume import utils as volutils
 
 LOG = logging.getLogger(__name__)
@@ -59,12 +68,437 @@ volume_opts = [
                help='LVM conf file to use for the LVM driver in Cinder; '
                     'this setting is ignored if the specified file does '
                     'not exist (You can also specify \'None\' to not use '
-                    'a conf file even if one exists).')
+                    'a conf file even if one exists).'),
+    cfg.BoolOpt('lvm_deferred_clear',
+                default=False,
+                help='Clear deleted thick volumes in the background instead '
+                     'of during the delete. Deleted LVs are renamed and '
+                     'queued, their space is only freed once they are '
+                     'cleared. Only applies when volume_clear is not '
+                     '\'none\'.'),
+    cfg.StrOpt('lvm_deferred_clear_queue_file',
+               default=None,
+               help='File recording the LVs waiting to be cleared, so that '
+                    'they are cleared after a restart. Defaults to '
+                    'lvm-clear-<volume_group>.json in state_path.'),
+    cfg.IntOpt('lvm_deferred_clear_bps_limit',
+               default=0,
+               help='Bandwidth limit in bytes per second for clearing the '
+                    'deleted LVs in the background. 0 uses the volume copy '
+                    'throttling, see volume_copy_bps_limit.'),
+    cfg.IntOpt('lvm_inventory_resync_interval',
+               default=0,
+               help='If > 0, keep the list of LVs of the volume group in '
+                    'memory, updated by the operations of the driver, and '
+                    'reload it with lvs at most every that many seconds. '
+                    'This avoids listing all LVs on each lookup and stats '
+                    'update. 0 lists them every time.'),
+    cfg.BoolOpt('lvm_lazy_clone',
+                default=False,
+                help='Make clones of thick volumes usable at once, with a '
+                     'dm-clone mapping reading the data not copied yet '
+                     'from a snapshot of the source, and copy the data in '
+                     'the background. The hydration_progress admin '
+                     'metadata of the clone shows the progress of the '
+                     'copy. Requires the dm-clone kernel module. Clones '
+                     'larger than their source and mirrored clones are '
+                     'copied at once. Deleting the source of a clone waits '
+                     'until the clone is hydrated.'),
+    cfg.StrOpt('lvm_lazy_clone_file',
+               default=None,
+               help='File recording the clones being hydrated, so that '
+                    'they are mapped again after a restart. Defaults to '
+                    'lvm-clones-<volume_group>.json in state_path.'),
+    cfg.IntOpt('lvm_lazy_clone_bps_limit',
+               default=0,
+               help='Bandwidth limit in bytes per second for hydrating each '
+                    'lazy clone. Volumes are hydrated at full speed when an '
+                    'operation waits for them. 0 means no limit.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(volume_opts)
 
+# Prefix of the deleted LVs waiting to be cleared
+CLEAR_PREFIX = 'clear-'
+
+
+def _save_json_atomic(path, data):
+    """Write data to a JSON file, replacing it only once fully written."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as json_file:
+        jsonutils.dump(data, json_file)
+        json_file.flush()
+        os.fsync(json_file.fileno())
+    os.rename(tmp_path, path)
+
+
+class _DeferredClearQueue(object):
+    """Persistent queue of deleted LVs cleared by a background worker.
+
+    Deleted volumes are renamed with CLEAR_PREFIX and recorded in a JSON
+    file. A greenthread clears them one at a time, then removes the LVs.
+    LVs with the prefix found at start up are queued again, including ones
+    renamed just before a restart but not recorded yet.
+    """
+
+    def __init__(self, driver, path, throttle=None):
+        self.driver = driver
+        self.path = path
+        self.throttle = throttle
+        # Entries by LV name, in the order they were queued
+        self._entries = collections.OrderedDict()
+        self._pending = queue.LightQueue()
+        self._worker = None
+
+    def start(self):
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path) as queue_file:
+                entries = jsonutils.load(queue_file)
+
+        lvs = {lv['name']: lv for lv in self.driver.vg.get_volumes()
+               if lv['name'].startswith(CLEAR_PREFIX)}
+        for entry in entries:
+            if entry['name'] in lvs:
+                self._entries[entry['name']] = entry
+        for name in sorted(lvs):
+            if name not in self._entries:
+                self._entries[name] = {
+                    'name': name,
+                    'id': name[len(CLEAR_PREFIX):],
+                    'size': int(math.ceil(float(lvs[name]['size'])))}
+        self._save()
+
+        for name in self._entries:
+            self._pending.put(name)
+        self._worker = eventlet.spawn(self._run)
+        LOG.info(_LI('%(count)d deleted volumes of %(size)sG are waiting '
+                     'to be cleared.'),
+                 {'count': len(self._entries), 'size': self.backlog_gb})
+
+    def _save(self):
+        _save_json_atomic(self.path, list(self._entries.values()))
+
+    def add(self, volume):
+        """Rename a deleted volume out of the way and queue it."""
+        name = CLEAR_PREFIX + volume['name']
+        self.driver.vg.rename_volume(volume['name'], name)
+        self._entries[name] = {
+            'name': name,
+            'id': volume['id'],
+            'size': volume.get('volume_size') or volume.get('size')}
+        self._save()
+        self._pending.put(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def backlog_gb(self):
+        return sum(entry['size'] for entry in self._entries.values())
+
+    def _run(self):
+        while True:
+            name = self._pending.get()
+            entry = self._entries.get(name)
+            if entry is None:
+                continue
+            try:
+                self._clear(entry)
+            except Exception:
+                # Left in the queue so that it is retried on restart
+                LOG.exception(_LE('Failed to clear deleted volume %s.'),
+                              entry['id'])
+                continue
+            del self._entries[name]
+            self._save()
+
+    def _clear(self, entry):
+        LOG.debug('Clearing deleted volume %(id)s in %(name)s.', entry)
+        volume = {'name': entry['name'], 'id': entry['id'],
+                  'size': entry['size']}
+        self.driver._clear_volume(volume, throttle=self.throttle)
+        self.driver.vg.delete(entry['name'])
+        LOG.info(_LI('Cleared deleted volume %s.'), entry['id'])
+
+
+# dm-clone region size, in 512 bytes sectors, and number of regions copied
+# at once by the hydration.
+CLONE_REGION_SECTORS = 128
+CLONE_BATCH_REGIONS = 64
+HYDRATION_PROGRESS_KEY = 'hydration_progress'
+
+
+class _LazyClones(object):
+    """Clones of thick volumes hydrated by the kernel in the background.
+
+    The table of the LV of a clone is moved to a separate device and the
+    LV is remapped with a dm-clone target, which reads the regions not
+    copied yet from the temporary snapshot of the source volume. Once all
+    the regions are copied, the LV gets its table back and the snapshot and
+    the dm-clone metadata LV are removed. The clones are recorded in a JSON
+    file and mapped again at start up, as the mappings are lost on reboot.
+    """
+
+    poll_interval = 5
+
+    def __init__(self, driver, path, bps_limit=0):
+        self.driver = driver
+        self.path = path
+        self.bps_limit = bps_limit
+        # Entries by LV name
+        self._entries = collections.OrderedDict()
+        self._done = {}
+        # Hydration rate of the throttled clones, by LV name
+        self._rates = {}
+        self._urgent = set()
+        self._lock = semaphore.Semaphore()
+        self._worker = None
+
+    def start(self):
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path) as clones_file:
+                entries = jsonutils.load(clones_file)
+
+        for entry in entries:
+            if self.driver.vg.get_volume(entry['name']) is None:
+                LOG.warning(_LW('Volume %s being hydrated is gone.'),
+                            entry['id'])
+                continue
+            # A clone which cannot be mapped does not have all of its data,
+            # it must not be used.
+            self._map(entry)
+            self._entries[entry['name']] = entry
+            self._done[entry['name']] = event.Event()
+        self._save()
+
+        self._worker = eventlet.spawn(self._run)
+        LOG.info(_LI('%d cloned volumes are being hydrated.'),
+                 len(self._entries))
+
+    def _save(self):
+        _save_json_atomic(self.path, list(self._entries.values()))
+
+    def add(self, volume, snapshot):
+        """Map a new clone to the snapshot of its source and hydrate it."""
+        entry = {'name': volume['name'],
+                 'id': volume['id'],
+                 'size': volume['size'],
+                 'snapshot': snapshot['name'],
+                 'source': snapshot['volume_name'],
+                 'metadata': 'clone-meta-%s' % volume['id']}
+        # The bitmap of the regions takes 2 KiB per GiB, leave room for
+        # the rest of the metadata.
+        self.driver._create_volume(
+            entry['metadata'],
+            '%dm' % (4 + int(math.ceil(entry['size'] / 64.0))),
+            'default', 0)
+        # Waiters may find the entry as soon as it is published
+        done = self._done[entry['name']] = event.Event()
+        try:
+            # dm-clone formats metadata devices starting with zeroes
+            self._execute('dd', 'if=/dev/zero',
+                          'of=%s' % self._path(entry['metadata']),
+                          'bs=4096', 'count=1', 'oflag=direct')
+            # The hydration is not checked before the clone is mapped
+            with self._lock:
+                self._entries[entry['name']] = entry
+                self._save()
+                self._map(entry)
+                self._set_progress(entry, 0)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._entries.pop(entry['name'], None)
+                self._save()
+                self._unmap(entry)
+                self.driver.vg.delete(entry['metadata'])
+                self._done.pop(entry['name'], None)
+                done.send()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def wait(self, name):
+        """Wait until a clone is hydrated, without throttling."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return
+        # The clone may be hydrated while the hydration is resumed
+        done = self._done[name]
+        LOG.info(_LI('Waiting for volume %s to be hydrated.'), entry['id'])
+        self._urgent.add(name)
+        rate = self._rates.get(name)
+        if rate and rate['paused']:
+            rate['paused'] = False
+            self._dmsetup('message', self._dm_name(name), '0',
+                          'enable_hydration')
+        done.wait()
+
+    def wait_for_source(self, name):
+        """Wait until the clones of a volume are hydrated."""
+        for entry in list(self._entries.values()):
+            if entry.get('source') == name:
+                self.wait(entry['name'])
+
+    def cancel(self, name):
+        """Stop hydrating a clone being deleted."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._remove(entry)
+
+    def _execute(self, *cmd):
+        return self.driver._execute(*cmd, run_as_root=True)
+
+    def _dmsetup(self, *args):
+        return self._execute('dmsetup', *args)[0]
+
+    def _path(self, name):
+        return self.driver.local_path({'name': name})
+
+    def _dm_name(self, name):
+        return os.path.basename(self._path(name))
+
+    @staticmethod
+    def _dest_name(entry):
+        return 'cinder-clone-%s' % entry['id']
+
+    def _dm_exists(self, dm_name):
+        try:
+            self._dmsetup('info', dm_name)
+        except processutils.ProcessExecutionError:
+            return False
+        return True
+
+    def _swap_table(self, dm_name, table):
+        self._dmsetup('suspend', dm_name)
+        try:
+            self._dmsetup('load', dm_name, '--table', table)
+        finally:
+            # Back to the previous table if the load failed
+            self._dmsetup('resume', dm_name)
+
+    def _map(self, entry):
+        dm_name = self._dm_name(entry['name'])
+        dest = self._dest_name(entry)
+        table = self._dmsetup('table', dm_name).strip()
+        if ' clone ' in table:
+            return
+
+        self.driver.vg.activate_lv(entry['snapshot'], is_snapshot=True)
+        if not self._dm_exists(dest):
+            self._dmsetup('create', dest, '--table', table)
+        sectors = sum(int(line.split()[1]) for line in table.splitlines())
+        clone_table = ('0 %(sectors)d clone %(metadata)s /dev/mapper/%(dest)s '
+                       '%(source)s %(region)d 0 2 hydration_batch_size '
+                       '%(batch)d' %
+                       {'sectors': sectors,
+                        'metadata': self._path(entry['metadata']),
+                        'dest': dest,
+                        'source': self._path(entry['snapshot']),
+                        'region': CLONE_REGION_SECTORS,
+                        'batch': CLONE_BATCH_REGIONS})
+        self._swap_table(dm_name, clone_table)
+        LOG.debug('Mapped volume %(id)s to its source snapshot '
+                  '%(snapshot)s for hydration.', entry)
+
+    def _unmap(self, entry):
+        """Give the LV of a clone its own table back."""
+        dm_name = self._dm_name(entry['name'])
+        dest = self._dest_name(entry)
+        if not self._dm_exists(dest):
+            return
+        if ' clone ' in self._dmsetup('table', dm_name):
+            self._swap_table(dm_name, self._dmsetup('table', dest).strip())
+        self._dmsetup('remove', dest)
+
+    def _remove(self, entry):
+        self._unmap(entry)
+        self.driver.vg.delete(entry['metadata'])
+        self.driver.delete_snapshot({'name': entry['snapshot'],
+                                     'id': 'tmp-snap-%s' % entry['id'],
+                                     'size': entry['size'],
+                                     'volume_size': entry['size']})
+        del self._entries[entry['name']]
+        self._save()
+        self._rates.pop(entry['name'], None)
+        self._urgent.discard(entry['name'])
+        self._done.pop(entry['name']).send()
+
+    def _get_hydration(self, entry):
+        # <start> <length> clone <metadata block size>
+        # <#used metadata blocks>/<#total metadata blocks> <region size>
+        # <#hydrated regions>/<#total regions> ...
+        status = self._dmsetup('status', self._dm_name(entry['name']))
+        hydrated, total = status.split()[6].split('/')
+        return int(hydrated), int(total)
+
+    def _set_progress(self, entry, progress):
+        ctxt = cinder_context.get_admin_context()
+        try:
+            if progress is None:
+                self.driver.db.volume_admin_metadata_delete(
+                    ctxt, entry['id'], HYDRATION_PROGRESS_KEY)
+            else:
+                self.driver.db.volume_admin_metadata_update(
+                    ctxt, entry['id'],
+                    {HYDRATION_PROGRESS_KEY: '%d%%' % progress}, False)
+        except Exception:
+            LOG.warning(_LW('Failed to update the hydration progress of '
+                            'volume %s.'), entry['id'])
+        entry['progress'] = progress
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.poll_interval)
+            for name in list(self._entries):
+                with self._lock:
+                    entry = self._entries.get(name)
+                    if entry is None:
+                        continue
+                    try:
+                        self._check(entry)
+                    except Exception:
+                        LOG.exception(_LE('Failed to check the hydration of '
+                                          'volume %s.'), entry['id'])
+
+    def _check(self, entry):
+        hydrated, total = self._get_hydration(entry)
+        if hydrated >= total:
+            self._remove(entry)
+            self._set_progress(entry, None)
+            LOG.info(_LI('Hydrated cloned volume %s.'), entry['id'])
+            return
+
+        progress = 100 * hydrated // total
+        if progress != entry.get('progress'):
+            self._set_progress(entry, progress)
+        if self.bps_limit and entry['name'] not in self._urgent:
+            self._throttle(entry, hydrated)
+
+    def _throttle(self, entry, hydrated):
+        """Pause the hydration while it is ahead of the bandwidth limit."""
+        now = time.time()
+        rate = self._rates.setdefault(
+            entry['name'], {'hydrated': hydrated, 'time': now,
+                            'paused': False})
+        copied = (hydrated - rate['hydrated']) * CLONE_REGION_SECTORS * 512
+        due = rate['time'] + float(copied) / self.bps_limit
+        if now < due:
+            if not rate['paused']:
+                self._dmsetup('message', self._dm_name(entry['name']), '0',
+                              'disable_hydration')
+                rate['paused'] = True
+            return
+
+        if rate['paused']:
+            self._dmsetup('message', self._dm_name(entry['name']), '0',
+                          'enable_hydration')
+            rate['paused'] = False
+        rate.update(hydrated=hydrated, time=now)
+
 
 class LVMVolumeDriver(driver.VolumeDriver):
     """Executes commands relating to Volumes."""
@@ -99,6 +533,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
             executor=self._execute)
         self.protocol = self.target_driver.protocol
         self._sparse_copy_volume = False
+        self._clear_queue = None
+        self._lazy_clones = None
 
     def _sizestr(self, size_in_g):
         return '%sg' % size_in_g
@@ -110,6 +546,16 @@ class LVMVolumeDriver(driver.VolumeDriver):
         """Deletes a logical volume."""
         if self.configuration.volume_clear != 'none' and \
                 self.configuration.lvm_type != 'thin':
+            # Snapshots are cleared at once, as their origin cannot be
+            # deleted while they exist.
+            if self._clear_queue is not None and not is_snapshot:
+                if not (volume.get('volume_size') or volume.get('size')):
+                    msg = (_("Size for volume: %s not found, cannot secure "
+                             "delete.") % volume['id'])
+                    LOG.error(msg)
+                    raise exception.InvalidParameterValue(msg)
+                self._clear_queue.add(volume)
+                return
             self._clear_volume(volume, is_snapshot)
 
         name = volume['name']
@@ -117,9 +563,10 @@ class LVMVolumeDriver(driver.VolumeDriver):
             name = self._escape_snapshot(volume['name'])
         self.vg.delete(name)
 
-    def _clear_volume(self, volume, is_snapshot=False):
+    def _clear_volume(self, volume, is_snapshot=False, throttle=None):
         # zero out old volumes to prevent data leaking between users
-        # TODO(ja): reclaiming space should be done lazy and low priority
+        # NOTE: with lvm_deferred_clear, volumes are cleared in the
+        # background by _DeferredClearQueue.
         if is_snapshot:
             # if the volume to be cleared is a snapshot of another volume
             # we need to clear out the volume using the -cow instead of the
@@ -153,7 +600,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
         volutils.clear_volume(
             vol_sz_in_meg, dev_path,
             volume_clear=self.configuration.volume_clear,
-            volume_clear_size=self.configuration.volume_clear_size)
+            volume_clear_size=self.configuration.volume_clear_size,
+            throttle=throttle)
 
     def _escape_snapshot(self, snapshot_name):
         # Linux LVM reserves name that starts with snapshot, so that
@@ -224,6 +672,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
         # Calculate the total volumes used by the VG group.
         # This includes volumes and snapshots.
         total_volumes = len(self.vg.get_volumes())
+        if self._clear_queue is not None:
+            total_volumes -= len(self._clear_queue)
 
         # Skip enabled_pools setting, treat the whole backend as one pool
         # XXX FIXME if multipool support is added to LVM driver.
@@ -247,6 +697,14 @@ class LVMVolumeDriver(driver.VolumeDriver):
         ))
         data["pools"].append(single_pool)
 
+        if self._clear_queue is not None:
+            # The space of these volumes is only free once cleared
+            single_pool.update(
+                pending_clear_volumes=len(self._clear_queue),
+                pending_clear_capacity_gb=self._clear_queue.backlog_gb)
+        if self._lazy_clones is not None:
+            single_pool.update(hydrating_volumes=len(self._lazy_clones))
+
         # Check availability of sparse volume copy.
         data['sparse_copy_volume'] = self._sparse_copy_volume
 
@@ -262,11 +720,14 @@ class LVMVolumeDriver(driver.VolumeDriver):
                 lvm_conf_file = None
 
             try:
-                self.vg = lvm.LVM(self.configuration.volume_group,
-                                  root_helper,
-                                  lvm_type=self.configuration.lvm_type,
-                                  executor=self._execute,
-                                  lvm_conf=lvm_conf_file)
+                self.vg = lvm.LVM(
+                    self.configuration.volume_group,
+                    root_helper,
+                    lvm_type=self.configuration.lvm_type,
+                    executor=self._execute,
+                    lvm_conf=lvm_conf_file,
+                    inventory_resync_interval=(
+                        self.configuration.lvm_inventory_resync_interval))
 
             except exception.VolumeGroupNotFound:
                 message = (_("Volume Group %s does not exist") %
@@ -322,6 +783,47 @@ class LVMVolumeDriver(driver.VolumeDriver):
             # Enable sparse copy since lvm_type is 'thin'
             self._sparse_copy_volume = True
 
+        if (self.configuration.lvm_deferred_clear and
+                self.configuration.volume_clear != 'none' and
+                self.configuration.lvm_type != 'thin' and
+                self._clear_queue is None):
+            self._start_clear_queue()
+
+        if (self.configuration.lvm_lazy_clone and
+                self.configuration.lvm_type != 'thin' and
+                self._lazy_clones is None):
+            self._start_lazy_clones()
+
+    def _start_lazy_clones(self):
+        path = (self.configuration.lvm_lazy_clone_file or
+                os.path.join(CONF.state_path, 'lvm-clones-%s.json' %
+                             self.configuration.volume_group))
+        self._lazy_clones = _LazyClones(
+            self, path, self.configuration.lvm_lazy_clone_bps_limit)
+        self._lazy_clones.start()
+
+    def _wait_for_hydration(self, volume_name):
+        # LVM reloads the table of the LVs it changes, which would drop the
+        # mapping of a clone still being hydrated.
+        if self._lazy_clones is not None:
+            self._lazy_clones.wait(volume_name)
+
+    def _start_clear_queue(self):
+        path = (self.configuration.lvm_deferred_clear_queue_file or
+                os.path.join(CONF.state_path, 'lvm-clear-%s.json' %
+                             self.configuration.volume_group))
+        throttle = None
+        bps_limit = self.configuration.lvm_deferred_clear_bps_limit
+        if bps_limit:
+            try:
+                throttle = throttling.BlkioCgroup(
+                    bps_limit, 'cinder-clear-%s' % self.vg.vg_name)
+            except processutils.ProcessExecutionError as err:
+                LOG.warning(_LW('Failed to activate deferred clear '
+                                'throttling: %(err)s'), {'err': err})
+        self._clear_queue = _DeferredClearQueue(self, path, throttle)
+        self._clear_queue.start()
+
     def create_volume(self, volume):
         """Creates a logical volume."""
         mirror_count = 0
@@ -399,17 +901,24 @@ class LVMVolumeDriver(driver.VolumeDriver):
             # If the volume isn't present, then don't attempt to delete
             return True
 
+        if self._lazy_clones is not None:
+            # The clones being hydrated read from a snapshot of the volume
+            self._lazy_clones.wait_for_source(volume['name'])
+
         if self.vg.lv_has_snapshot(volume['name']):
             LOG.error(_LE('Unable to delete due to existing snapshot '
                           'for volume: %s'), volume['name'])
             raise exception.VolumeIsBusy(volume_name=volume['name'])
 
+        if self._lazy_clones is not None:
+            self._lazy_clones.cancel(volume['name'])
         self._delete_volume(volume)
         LOG.info(_LI('Successfully deleted volume: %s'), volume['id'])
 
     def create_snapshot(self, snapshot):
         """Creates a snapshot."""
 
+        self._wait_for_hydration(snapshot['volume_name'])
         self.vg.create_lv_snapshot(self._escape_snapshot(snapshot['name']),
                                    snapshot['volume_name'],
                                    self.configuration.lvm_type)
@@ -480,6 +989,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
 
         # copy_volume expects sizes in MiB, we store integer GiB
         # be sure to convert before passing in
+        hydrating = False
         try:
             self._create_volume(volume['name'],
                                 self._sizestr(volume['size']),
@@ -487,15 +997,24 @@ class LVMVolumeDriver(driver.VolumeDriver):
                                 mirror_count)
 
             self.vg.activate_lv(temp_snapshot['name'], is_snapshot=True)
-            volutils.copy_volume(
-                self.local_path(temp_snapshot),
-                self.local_path(volume),
-                src_vref['size'] * units.Ki,
-                self.configuration.volume_dd_blocksize,
-                execute=self._execute,
-                sparse=self._sparse_copy_volume)
+            # The table of a mirrored LV cannot be moved to another device,
+            # its mirror would be driven by both.
+            if (self._lazy_clones is not None and mirror_count == 0 and
+                    volume['size'] == src_vref['size']):
+                # The snapshot is deleted once the clone is hydrated
+                self._lazy_clones.add(volume, temp_snapshot)
+                hydrating = True
+            else:
+                volutils.copy_volume(
+                    self.local_path(temp_snapshot),
+                    self.local_path(volume),
+                    src_vref['size'] * units.Ki,
+                    self.configuration.volume_dd_blocksize,
+                    execute=self._execute,
+                    sparse=self._sparse_copy_volume)
         finally:
-            self.delete_snapshot(temp_snapshot)
+            if not hydrating:
+                self.delete_snapshot(temp_snapshot)
 
     def clone_image(self, context, volume,
                     image_location, image_meta,
@@ -545,6 +1064,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
 
     def extend_volume(self, volume, new_size):
         """Extend an existing volume's size."""
+        self._wait_for_hydration(volume['name'])
         self.vg.extend_volume(volume['name'],
                               self._sizestr(new_size))
 
@@ -713,6 +1233,15 @@ class LVMVolumeDriver(driver.VolumeDriver):
             self.target_driver.ensure_export(context, volume, volume_path)
         return model_update
 
+    def ensure_exports(self, context, volumes, workers=1):
+        exports = [(volume, "/dev/%s/%s" % (self.configuration.volume_group,
+                                            volume['name']))
+                   for volume in volumes]
+        return self.target_driver.ensure_exports(context, exports, workers)
+
+    def do_teardown(self):
+        self.target_driver.teardown()
+
     def create_export(self, context, volume, connector, vg=None):
         if vg is None:
             vg = self.configuration.volume_group
@@ -14,11 +14,14 @@
 """RADOS Block Device Driver"""
 
 from __future__ import absolute_import
+import collections
 import io
 import json
 import math
 import os
 import tempfile
+import threading
+import time
 
 from eventlet import tpool
 from oslo_config import cfg
@@ -88,7 +91,15 @@ rbd_opts = [
                       'failed.')),
     cfg.IntOpt('rados_connection_interval', default=5,
                help=_('Interval value (in seconds) between connection '
-                      'retries to ceph cluster.'))
+                      'retries to ceph cluster.')),
+    cfg.IntOpt('rados_connection_pool_size', default=0,
+               help=_('Maximum number of idle connections to the ceph '
+                      'cluster kept open for each pool, to be reused '
+                      'instead of connecting again for every operation. '
+                      'Set to 0 to disable connection pooling.')),
+    cfg.IntOpt('rados_connection_pool_idle_timeout', default=300,
+               help=_('Number of seconds after which an idle pooled '
+                      'connection to the ceph cluster is closed.'))
 ]
 
 CONF = cfg.CONF
@@ -203,6 +214,110 @@ class RBDImageIOWrapper(io.RawIOBase):
         pass
 
 
+class RADOSConnectionPool(object):
+    """Pool of open rados clients and ioctxs, keyed by pool.
+
+    get() hands out an idle connection to the requested pool, or opens a new
+    one with the given connect function, and put() gives it back. At most
+    max_size idle connections are kept for each key; connections which have
+    been idle for more than idle_timeout seconds, which are no longer
+    connected, or which are returned after an error are shut down instead of
+    being reused.
+    """
+
+    def __init__(self, max_size, idle_timeout):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = collections.defaultdict(collections.deque)
+        self._in_use = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _close(client, ioctx):
+        # closing an ioctx cannot raise an exception
+        ioctx.close()
+        client.shutdown()
+
+    @staticmethod
+    def _is_healthy(client, ioctx):
+        return (getattr(client, 'state', 'connected') == 'connected' and
+                getattr(ioctx, 'state', 'open') == 'open')
+
+    def _expire(self, idle, now):
+        """Remove the connections of idle which have been idle too long."""
+        expired = []
+        # Connections are given back at the right end and reused from there,
+        # so the ones idle for the longest time are on the left.
+        while idle and now - idle[0][2] > self.idle_timeout:
+            client, ioctx, _last_used = idle.popleft()
+            expired.append((client, ioctx))
+        return expired
+
+    def get(self, key, connect, *args):
+        """Return a (client, ioctx) tuple for key.
+
+        connect(*args) is called to open a new connection when no healthy
+        idle one is available.
+        """
+        unusable = []
+        connection = None
+        with self._lock:
+            idle = self._idle[key]
+            unusable.extend(self._expire(idle, time.time()))
+            while idle:
+                client, ioctx, _last_used = idle.pop()
+                if self._is_healthy(client, ioctx):
+                    connection = (client, ioctx)
+                    break
+                unusable.append((client, ioctx))
+
+        for client, ioctx in unusable:
+            self._close(client, ioctx)
+
+        if connection is None:
+            LOG.debug("No pooled connection to %s available, opening a new "
+                      "one.", key)
+            connection = connect(*args)
+
+        with self._lock:
+            self._in_use[id(connection[1])] = key
+        return connection
+
+    def put(self, client, ioctx, discard=False):
+        """Give back a connection obtained from get().
+
+        The connection is shut down rather than kept for reuse if discard is
+        True, e.g. because an error occurred while it was in use.
+        """
+        unusable = []
+        with self._lock:
+            key = self._in_use.pop(id(ioctx), None)
+            if key is None or discard or not self._is_healthy(client, ioctx):
+                unusable.append((client, ioctx))
+            else:
+                now = time.time()
+                idle = self._idle[key]
+                unusable.extend(self._expire(idle, now))
+                idle.append((client, ioctx, now))
+                while len(idle) > self.max_size:
+                    client, ioctx, _last_used = idle.popleft()
+                    unusable.append((client, ioctx))
+
+        for client, ioctx in unusable:
+            self._close(client, ioctx)
+
+    def close(self):
+        """Shut down all the idle connections."""
+        with self._lock:
+            unusable = [(client, ioctx)
+                        for idle in self._idle.values()
+                        for client, ioctx, _last_used in idle]
+            self._idle.clear()
+
+        for client, ioctx in unusable:
+            self._close(client, ioctx)
+
+
 class RBDVolumeProxy(object):
     """Context manager for dealing with an existing rbd volume.
 
@@ -238,7 +353,10 @@ class RBDVolumeProxy(object):
         try:
             self.volume.close()
         finally:
-            self.driver._disconnect_from_rados(self.client, self.ioctx)
+            # An error may have left the connection unusable, do not let it
+            # be pooled.
+            self.driver._disconnect_from_rados(self.client, self.ioctx,
+                                               discard=value is not None)
 
     def __getattr__(self, attrib):
         return getattr(self.volume, attrib)
@@ -254,7 +372,8 @@ class RADOSClient(object):
         return self
 
     def __exit__(self, type_, value, traceback):
-        self.driver._disconnect_from_rados(self.cluster, self.ioctx)
+        self.driver._disconnect_from_rados(self.cluster, self.ioctx,
+                                           discard=value is not None)
 
     @property
     def features(self):
@@ -278,6 +397,11 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
         # allow overrides for testing
         self.rados = kwargs.get('rados', rados)
         self.rbd = kwargs.get('rbd', rbd)
+        self._rados_pool = None
+        if self.configuration.rados_connection_pool_size > 0:
+            self._rados_pool = RADOSConnectionPool(
+                self.configuration.rados_connection_pool_size,
+                self.configuration.rados_connection_pool_idle_timeout)
 
         # All string args used with librbd must be None or utf-8 otherwise
         # librbd will break.
@@ -312,10 +436,21 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             args.extend(['--cluster', self.configuration.rbd_cluster_name])
         return args
 
+    def _connect_to_rados(self, pool=None):
+        if pool is not None:
+            pool = utils.convert_str(pool)
+        else:
+            pool = self.configuration.rbd_pool
+
+        if self._rados_pool is not None:
+            return self._rados_pool.get(pool, self._open_rados_connection,
+                                        pool)
+        return self._open_rados_connection(pool)
+
     @utils.retry(exception.VolumeBackendAPIException,
                  CONF.rados_connection_interval,
                  CONF.rados_connection_retries)
-    def _connect_to_rados(self, pool=None):
+    def _open_rados_connection(self, pool):
         LOG.debug("opening connection to ceph cluster (timeout=%s).",
                   self.configuration.rados_connect_timeout)
 
@@ -323,10 +458,6 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             rados_id=self.configuration.rbd_user,
             clustername=self.configuration.rbd_cluster_name,
             conffile=self.configuration.rbd_ceph_conf)
-        if pool is not None:
-            pool = utils.convert_str(pool)
-        else:
-            pool = self.configuration.rbd_pool
 
         try:
             if self.configuration.rados_connect_timeout >= 0:
@@ -342,7 +473,10 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             client.shutdown()
             raise exception.VolumeBackendAPIException(data=msg)
 
-    def _disconnect_from_rados(self, client, ioctx):
+    def _disconnect_from_rados(self, client, ioctx, discard=False):
+        if self._rados_pool is not None:
+            self._rados_pool.put(client, ioctx, discard=discard)
+            return
         # closing an ioctx cannot raise an exception
         ioctx.close()
         client.shutdown()
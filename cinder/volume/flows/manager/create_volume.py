@@ -726,7 +726,19 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                 image_meta
             )
             if not cloned:
-                should_create_cache_entry = True
+                # Only one request at a time creates the cache entry for
+                # an image, the others wait for it and clone from it.
+                should_create_cache_entry = (
+                    self.image_volume_cache.begin_fill(image_id,
+                                                       volume_ref['host']))
+                if not should_create_cache_entry:
+                    model_update, cloned = self._create_from_image_cache(
+                        context,
+                        internal_context,
+                        volume_ref,
+                        image_id,
+                        image_meta
+                    )
 
         # Fall back to default behavior of creating volume,
         # download the image data and copy it into the volume.
@@ -780,6 +792,9 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                                                               image_id,
                                                               image_meta)
         finally:
+            if should_create_cache_entry:
+                self.image_volume_cache.end_fill(image_id, volume_ref['host'])
+
             # If we created the volume as the minimal size, extend it back to
             # what was originally requested. If an exception has occurred we
             # still need to put this back before letting it be raised further
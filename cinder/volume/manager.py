@@ -37,6 +37,7 @@ intact.
 """
 
 
+import collections
 import time
 
 from oslo_config import cfg
@@ -93,6 +94,18 @@ volume_manager_opts = [
                 default=False,
                 help='Offload pending volume delete during '
                      'volume service startup'),
+    cfg.IntOpt('volume_service_inithost_export_workers',
+               default=1,
+               help='Number of volumes re-exported concurrently during '
+                    'volume service startup, among the ones the driver '
+                    'cannot restore in bulk'),
+    cfg.BoolOpt('volume_service_inithost_export_offload',
+                default=False,
+                help='Report the service capabilities during volume service '
+                     'startup before all volumes have been re-exported, the '
+                     'remaining exports complete in the background. The '
+                     'volumes are then re-exported one by one, skipping '
+                     'the ones no longer in use'),
     cfg.StrOpt('zoning_mode',
                default='none',
                help='FC Zoning mode configured'),
@@ -260,45 +273,108 @@ class VolumeManager(manager.SchedulerDependentManager):
     def _add_to_threadpool(self, func, *args, **kwargs):
         self._tp.spawn_n(func, *args, **kwargs)
 
-    def _count_allocated_capacity(self, ctxt, volume):
-        pool = vol_utils.extract_host(volume['host'], 'pool')
-        if pool is None:
-            # No pool name encoded in host, so this is a legacy
-            # volume created before pool is introduced, ask
-            # driver to provide pool info if it has such
-            # knowledge and update the DB.
-            try:
-                pool = self.driver.get_pool(volume)
-            except Exception:
-                LOG.exception(_LE('Fetch volume pool name failed.'),
-                              resource=volume)
-                return
-
-            if pool:
-                new_host = vol_utils.append_host(volume['host'],
-                                                 pool)
-                self.db.volume_update(ctxt, volume['id'],
-                                      {'host': new_host})
-            else:
-                # Otherwise, put them into a special fixed pool with
-                # volume_backend_name being the pool name, if
-                # volume_backend_name is None, use default pool name.
-                # This is only for counting purpose, doesn't update DB.
-                pool = (self.driver.configuration.safe_get(
-                    'volume_backend_name') or vol_utils.extract_host(
-                    volume['host'], 'pool', True))
-        try:
-            pool_stat = self.stats['pools'][pool]
-        except KeyError:
+    def _count_allocated_capacity(self, ctxt, volumes):
+        pool_sizes = collections.defaultdict(int)
+        host_updates = []
+        for volume in volumes:
+            pool = vol_utils.extract_host(volume['host'], 'pool')
+            if pool is None:
+                # No pool name encoded in host, so this is a legacy
+                # volume created before pool is introduced, ask
+                # driver to provide pool info if it has such
+                # knowledge and update the DB.
+                try:
+                    pool = self.driver.get_pool(volume)
+                except Exception:
+                    LOG.exception(_LE('Fetch volume pool name failed.'),
+                                  resource=volume)
+                    continue
+
+                if pool:
+                    new_host = vol_utils.append_host(volume['host'],
+                                                     pool)
+                    host_updates.append({'id': volume['id'],
+                                         'host': new_host})
+                else:
+                    # Otherwise, put them into a special fixed pool with
+                    # volume_backend_name being the pool name, if
+                    # volume_backend_name is None, use default pool name.
+                    # This is only for counting purpose, doesn't update DB.
+                    pool = (self.driver.configuration.safe_get(
+                        'volume_backend_name') or vol_utils.extract_host(
+                        volume['host'], 'pool', True))
+            pool_sizes[pool] += volume['size']
+
+        if host_updates:
+            self.db.volumes_update(ctxt, host_updates)
+
+        for pool, size in pool_sizes.items():
             # First volume in the pool
-            self.stats['pools'][pool] = dict(
-                allocated_capacity_gb=0)
-            pool_stat = self.stats['pools'][pool]
-        pool_sum = pool_stat['allocated_capacity_gb']
-        pool_sum += volume['size']
+            pool_stat = self.stats['pools'].setdefault(
+                pool, dict(allocated_capacity_gb=0))
+            pool_stat['allocated_capacity_gb'] += size
+            self.stats['allocated_capacity_gb'] += size
+
+    def _restore_exports(self, ctxt, volumes):
+        # The driver restores the exports in bulk once, only the volumes it
+        # then exports one by one are spread over the workers.
+        workers = CONF.volume_service_inithost_export_workers
+        try:
+            failures = self.driver.ensure_exports(ctxt, volumes,
+                                                  workers=workers)
+        except Exception as e:
+            LOG.exception(_LE("Failed to re-export volumes."))
+            failures = {volume['id']: e for volume in volumes}
 
-        self.stats['pools'][pool]['allocated_capacity_gb'] = pool_sum
-        self.stats['allocated_capacity_gb'] += volume['size']
+        for volume in volumes:
+            if volume['id'] in failures:
+                LOG.error(_LE("Failed to re-export volume, "
+                              "setting to ERROR: %(error)s"),
+                          {'error': failures[volume['id']]},
+                          resource=volume)
+                self.db.volume_update(ctxt,
+                                      volume['id'],
+                                      {'status': 'error'})
+        LOG.info(_LI("Re-exported %(count)d volumes."),
+                 {'count': len(volumes)})
+
+    def _restore_exports_in_background(self, ctxt, volumes):
+        # The service is already handling requests, the volumes may have
+        # been detached, deleted or migrated since startup. Each volume is
+        # re-exported on its own, holding its detach lock, if still in use.
+        def _restore_export(ctxt, volume):
+            @utils.synchronized('%s-detach_volume' % volume['id'],
+                                external=True)
+            def _restore_export_locked():
+                try:
+                    current = self.db.volume_get(ctxt, volume['id'])
+                except exception.VolumeNotFound:
+                    return
+                if (current['status'] != 'in-use' or
+                        current['migration_status']):
+                    LOG.info(_LI("Volume changed since startup, "
+                                 "not re-exporting it."), resource=current)
+                    return
+                try:
+                    self.driver.ensure_export(ctxt, current)
+                except Exception as e:
+                    LOG.error(_LE("Failed to re-export volume, "
+                                  "setting to ERROR: %(error)s"),
+                              {'error': e}, resource=current)
+                    self.db.volume_update(ctxt,
+                                          current['id'],
+                                          {'status': 'error'})
+            _restore_export_locked()
+
+        failures = vol_utils.ensure_exports_concurrently(
+            _restore_export, ctxt, [(volume,) for volume in volumes],
+            workers=CONF.volume_service_inithost_export_workers)
+        for volume_id, error in failures.items():
+            LOG.error(_LE("Failed to re-export volume %(volume_id)s: "
+                          "%(error)s"),
+                      {'volume_id': volume_id, 'error': error})
+        LOG.info(_LI("Re-exported %(count)d volumes."),
+                 {'count': len(volumes) - len(failures)})
 
     def _set_voldb_empty_at_startup_indicator(self, ctxt):
         """Determine if the Cinder volume DB is empty.
@@ -382,25 +458,17 @@ class VolumeManager(manager.SchedulerDependentManager):
         self._sync_provider_info(ctxt, volumes, snapshots)
         # FIXME volume count for exporting is wrong
 
+        exports = []
         try:
             self.stats['pools'] = {}
             self.stats.update({'allocated_capacity_gb': 0})
+            allocated = []
             for volume in volumes:
                 # available volume should also be counted into allocated
                 if volume['status'] in ['in-use', 'available']:
-                    # calculate allocated capacity for driver
-                    self._count_allocated_capacity(ctxt, volume)
-
-                    try:
-                        if volume['status'] in ['in-use']:
-                            self.driver.ensure_export(ctxt, volume)
-                    except Exception:
-                        LOG.exception(_LE("Failed to re-export volume, "
-                                          "setting to ERROR."),
-                                      resource=volume)
-                        self.db.volume_update(ctxt,
-                                              volume['id'],
-                                              {'status': 'error'})
+                    allocated.append(volume)
+                if volume['status'] in ['in-use']:
+                    exports.append(volume)
                 elif volume['status'] in ('downloading', 'creating'):
                     LOG.warning(_LW("Detected volume stuck "
                                     "in %s(curr_status)s "
@@ -415,6 +483,18 @@ class VolumeManager(manager.SchedulerDependentManager):
                                           {'status': 'error'})
                 else:
                     pass
+
+            # calculate allocated capacity for driver
+            self._count_allocated_capacity(ctxt, allocated)
+
+            if CONF.volume_service_inithost_export_offload:
+                # Re-export the volumes in the background so that the
+                # service reports its capabilities as soon as possible.
+                self._add_to_threadpool(self._restore_exports_in_background,
+                                        ctxt, exports)
+            else:
+                self._restore_exports(ctxt, exports)
+
             snapshots = objects.SnapshotList.get_by_host(
                 ctxt, self.host, {'status': 'creating'})
             for snapshot in snapshots:
@@ -467,6 +547,10 @@ class VolumeManager(manager.SchedulerDependentManager):
                  resource={'type': 'driver',
                            'id': self.driver.__class__.__name__})
 
+    def cleanup_host(self):
+        """Let the driver complete its deferred work before exiting."""
+        self.driver.do_teardown()
+
     def is_working(self):
         """Return if Manager is ready to accept requests.
 
@@ -15,6 +15,8 @@ import abc
 from oslo_config import cfg
 import six
 
+from cinder.volume import utils as volume_utils
+
 CONF = cfg.CONF
 
 
@@ -44,6 +46,22 @@ class Target(object):
         """Synchronously recreates an export for a volume."""
         pass
 
+    def teardown(self):
+        """Completes the work deferred by the target before it stops."""
+        pass
+
+    def ensure_exports(self, context, exports, workers=1):
+        """Synchronously recreates the exports of several volumes.
+
+        :param exports: list of (volume, volume_path) tuples
+        :param workers: number of volumes which can be exported one by one
+                        at the same time
+        :returns: dict of the exceptions raised by the volumes which could
+                  not be exported, by volume id
+        """
+        return volume_utils.ensure_exports_concurrently(
+            self.ensure_export, context, exports, workers)
+
     @abc.abstractmethod
     def create_export(self, context, volume, volume_path):
         """Exports a Target/Volume.
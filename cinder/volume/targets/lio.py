@@ -10,8 +10,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 from oslo_concurrency import processutils as putils
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import strutils
 
 from cinder import exception
 from cinder.i18n import _LE, _LI, _LW
@@ -22,6 +25,38 @@ from cinder.volume.targets import iscsi
 LOG = logging.getLogger(__name__)
 
 
+class _ConfigurationSaver(object):
+    """Saves the LIO configuration once for the changes of a time window.
+
+    The first change opens a window of delay seconds and the changes made
+    until it closes are saved together. Later changes do not extend the
+    window, so that a steady stream of changes is still saved every delay
+    seconds.
+    """
+
+    def __init__(self, save, delay):
+        self._save = save
+        self.delay = delay
+        self._vol_ids = []
+        self._timer = None
+
+    def request(self, vol_id):
+        if vol_id not in self._vol_ids:
+            self._vol_ids.append(vol_id)
+        if self._timer is None:
+            self._timer = eventlet.spawn_after(self.delay, self.flush)
+
+    def flush(self):
+        """Saves the pending changes at once."""
+        timer, self._timer = self._timer, None
+        if timer is not None:
+            # Does nothing when called by the timer itself
+            timer.cancel()
+        if self._vol_ids:
+            vol_ids, self._vol_ids = self._vol_ids, []
+            self._save(vol_ids)
+
+
 class LioAdm(iscsi.ISCSITarget):
     """iSCSI target administration for LIO using python-rtslib."""
     def __init__(self, *args, **kwargs):
@@ -31,6 +66,12 @@ class LioAdm(iscsi.ISCSITarget):
         self.iscsi_target_prefix =\
             self.configuration.safe_get('iscsi_target_prefix')
 
+        self._saver = None
+        persist_delay = self.configuration.safe_get('lio_persist_delay')
+        if persist_delay:
+            self._saver = _ConfigurationSaver(self._save_configuration,
+                                              persist_delay)
+
         self._verify_rtstool()
 
     def _verify_rtstool(self):
@@ -62,6 +103,20 @@ class LioAdm(iscsi.ISCSITarget):
 
         return None
 
+    def _get_targets(self):
+        (out, err) = self._execute('cinder-rtstool',
+                                   'get-targets',
+                                   run_as_root=True)
+        return set(line.strip() for line in out.split('\n') if line.strip())
+
+    def _restore_configuration(self):
+        try:
+            self._execute('cinder-rtstool', 'restore', run_as_root=True)
+        except putils.ProcessExecutionError:
+            LOG.warning(_LW("Failed to restore iscsi LIO configuration."))
+            return False
+        return True
+
     def _get_iscsi_target(self, context, vol_id):
         return 0
 
@@ -70,7 +125,7 @@ class LioAdm(iscsi.ISCSITarget):
         iscsi_target = 0  # NOTE: Not used by lio.
         return iscsi_target, lun
 
-    def _persist_configuration(self, vol_id):
+    def _save_configuration(self, vol_ids):
         try:
             self._execute('cinder-rtstool', 'save', run_as_root=True)
 
@@ -79,16 +134,19 @@ class LioAdm(iscsi.ISCSITarget):
         except putils.ProcessExecutionError:
             LOG.warning(_LW("Failed to save iscsi LIO configuration when "
                             "modifying volume id: %(vol_id)s."),
-                        {'vol_id': vol_id})
-
-    def create_iscsi_target(self, name, tid, lun, path,
-                            chap_auth=None, **kwargs):
-        # tid and lun are not used
+                        {'vol_id': ', '.join(vol_ids)})
 
-        vol_id = name.split(':')[1]
+    def _persist_configuration(self, vol_id):
+        if self._saver is not None:
+            self._saver.request(vol_id)
+        else:
+            self._save_configuration([vol_id])
 
-        LOG.info(_LI('Creating iscsi_target for volume: %s'), vol_id)
+    def teardown(self):
+        if self._saver is not None:
+            self._saver.flush()
 
+    def _get_create_args(self, name, path, chap_auth, **kwargs):
         chap_auth_userid = ""
         chap_auth_password = ""
         if chap_auth is not None:
@@ -101,14 +159,24 @@ class LioAdm(iscsi.ISCSITarget):
         if 'portals_ips' in kwargs:
             optional_args.append('-a' + ','.join(kwargs['portals_ips']))
 
+        return ['create',
+                path,
+                name,
+                chap_auth_userid,
+                chap_auth_password,
+                self.iscsi_protocol == 'iser'] + optional_args
+
+    def create_iscsi_target(self, name, tid, lun, path,
+                            chap_auth=None, **kwargs):
+        # tid and lun are not used
+
+        vol_id = name.split(':')[1]
+
+        LOG.info(_LI('Creating iscsi_target for volume: %s'), vol_id)
+
         try:
-            command_args = ['cinder-rtstool',
-                            'create',
-                            path,
-                            name,
-                            chap_auth_userid,
-                            chap_auth_password,
-                            self.iscsi_protocol == 'iser'] + optional_args
+            command_args = ['cinder-rtstool'] + self._get_create_args(
+                name, path, chap_auth, **kwargs)
             self._execute(*command_args, run_as_root=True)
         except putils.ProcessExecutionError:
             LOG.exception(_LE("Failed to create iscsi target for volume "
@@ -128,6 +196,70 @@ class LioAdm(iscsi.ISCSITarget):
 
         return tid
 
+    def ensure_exports(self, context, exports, workers=1):
+        """Recreates the exports of several volumes.
+
+        If there are no targets at all, as after a reboot, all of them are
+        restored in one go from the saved LIO configuration, along with
+        their initiators. The volumes still missing a target after that
+        are exported with a single cinder-rtstool run if there are several.
+        """
+        if not exports:
+            return {}
+
+        targets = self._get_targets()
+        if not targets:
+            LOG.info(_LI('Restoring iscsi targets from saved LIO '
+                         'configuration.'))
+            if self._restore_configuration():
+                targets = self._get_targets()
+
+        missing = [(volume, volume_path) for volume, volume_path in exports
+                   if self.iscsi_target_prefix + volume['name']
+                   not in targets]
+        LOG.debug('%(missing)d of %(total)d iscsi targets have to be '
+                  'recreated.',
+                  {'missing': len(missing), 'total': len(exports)})
+        if len(missing) > 1:
+            return self._create_iscsi_targets(context, missing)
+        return super(LioAdm, self).ensure_exports(context, missing, workers)
+
+    def _create_iscsi_targets(self, context, exports):
+        """Creates the targets of several volumes in one go."""
+        portals_config = self._get_portals_config()
+        commands = []
+        for volume, volume_path in exports:
+            name = self.iscsi_target_prefix + volume['name']
+            chap_auth = self._get_target_chap_auth(context, name)
+            args = self._get_create_args(name, volume_path, chap_auth,
+                                         **portals_config)
+            # Passed as they would be on the command line
+            commands.append(jsonutils.dumps([str(arg) for arg in args]))
+
+        try:
+            self._execute('cinder-rtstool', 'batch',
+                          process_input='\n'.join(commands),
+                          run_as_root=True)
+        except putils.ProcessExecutionError as err:
+            # The volumes without a target are found below
+            LOG.warning(_LW('Failed to create some of the iscsi targets: '
+                            '%s'), strutils.mask_password(err.stdout))
+
+        targets = self._get_targets()
+        failures = {}
+        created = []
+        for volume, _volume_path in exports:
+            if self.iscsi_target_prefix + volume['name'] in targets:
+                created.append(volume['id'])
+            else:
+                LOG.error(_LE("Failed to create iscsi target for volume "
+                              "id:%s."), volume['id'])
+                failures[volume['id']] = exception.ISCSITargetCreateFailed(
+                    volume_id=volume['id'])
+        if created:
+            self._save_configuration(created)
+        return failures
+
     def remove_iscsi_target(self, tid, lun, vol_id, vol_name, **kwargs):
         LOG.info(_LI('Removing iscsi_target: %s'), vol_id)
         vol_uuid_name = vol_name
@@ -48,8 +48,10 @@ class TgtAdm(iscsi.ISCSITarget):
     def __init__(self, *args, **kwargs):
         super(TgtAdm, self).__init__(*args, **kwargs)
 
-    def _get_target(self, iqn):
-        (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
+    def _get_target(self, iqn, out=None):
+        if out is None:
+            (out, err) = utils.execute('tgt-admin', '--show',
+                                       run_as_root=True)
         lines = out.split('\n')
         for line in lines:
             if iqn in line:
@@ -59,12 +61,14 @@ class TgtAdm(iscsi.ISCSITarget):
 
         return None
 
-    def _verify_backing_lun(self, iqn, tid):
+    def _verify_backing_lun(self, iqn, tid, out=None):
         backing_lun = True
         capture = False
         target_info = []
 
-        (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
+        if out is None:
+            (out, err) = utils.execute('tgt-admin', '--show',
+                                       run_as_root=True)
         lines = out.split('\n')
 
         for line in lines:
@@ -114,6 +118,23 @@ class TgtAdm(iscsi.ISCSITarget):
         iscsi_target = 0  # NOTE(jdg): Not used by tgtadm
         return iscsi_target, lun
 
+    def _get_volume_conf(self, name, path, chap_auth):
+        write_cache = self.configuration.get('iscsi_write_cache', 'on')
+        driver = self.iscsi_protocol
+        chap_str = ''
+
+        if chap_auth is not None:
+            chap_str = 'incominguser %s %s' % chap_auth
+
+        target_flags = self.configuration.get('iscsi_target_flags', '')
+        if target_flags:
+            target_flags = 'bsoflags ' + target_flags
+
+        return self.VOLUME_CONF % {
+            'name': name, 'path': path, 'driver': driver,
+            'chap_auth': chap_str, 'target_flags': target_flags,
+            'write_cache': write_cache}
+
     @utils.retry(putils.ProcessExecutionError)
     def _do_tgt_update(self, name):
         (out, err) = utils.execute('tgt-admin', '--update', name,
@@ -142,21 +163,7 @@ class TgtAdm(iscsi.ISCSITarget):
         fileutils.ensure_tree(self.volumes_dir)
 
         vol_id = name.split(':')[1]
-        write_cache = self.configuration.get('iscsi_write_cache', 'on')
-        driver = self.iscsi_protocol
-        chap_str = ''
-
-        if chap_auth is not None:
-            chap_str = 'incominguser %s %s' % chap_auth
-
-        target_flags = self.configuration.get('iscsi_target_flags', '')
-        if target_flags:
-            target_flags = 'bsoflags ' + target_flags
-
-        volume_conf = self.VOLUME_CONF % {
-            'name': name, 'path': path, 'driver': driver,
-            'chap_auth': chap_str, 'target_flags': target_flags,
-            'write_cache': write_cache}
+        volume_conf = self._get_volume_conf(name, path, chap_auth)
 
         LOG.debug('Creating iscsi_target for Volume ID: %s', vol_id)
         volumes_dir = self.volumes_dir
@@ -249,6 +256,46 @@ class TgtAdm(iscsi.ISCSITarget):
 
         return tid
 
+    def ensure_exports(self, context, exports, workers=1):
+        """Recreates the exports of several volumes.
+
+        The persistence files of all the volumes are written first, then a
+        single tgt-admin update creates all their targets. Only the volumes
+        whose target or backing lun is missing after that are exported one
+        by one.
+        """
+        if not exports:
+            return {}
+
+        fileutils.ensure_tree(self.volumes_dir)
+        for volume, volume_path in exports:
+            name = self.iscsi_target_prefix + volume['name']
+            chap_auth = None
+            if volume.get('provider_auth'):
+                # 'provider_auth': 'CHAP user_id password'
+                chap_auth = tuple(volume['provider_auth'].split(' ', 3)[1:])
+            vol_id = name.split(':')[1]
+            with open(os.path.join(self.volumes_dir, vol_id), 'w+') as f:
+                f.write(self._get_volume_conf(name, volume_path, chap_auth))
+
+        try:
+            self._do_tgt_update('ALL')
+        except putils.ProcessExecutionError as e:
+            LOG.warning(_LW('Failed to create iscsi targets in bulk, will '
+                            'create them one by one: %s'), e)
+
+        (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
+        missing = []
+        for volume, volume_path in exports:
+            iqn = self.iscsi_target_prefix + volume['name']
+            tid = self._get_target(iqn, out=out)
+            if tid is None or not self._verify_backing_lun(iqn, tid, out=out):
+                missing.append((volume, volume_path))
+        LOG.debug('%(missing)d of %(total)d iscsi targets have to be '
+                  'recreated.',
+                  {'missing': len(missing), 'total': len(exports)})
+        return super(TgtAdm, self).ensure_exports(context, missing, workers)
+
     def remove_iscsi_target(self, tid, lun, vol_id, vol_name, **kwargs):
         LOG.info(_LI('Removing iscsi_target for Volume ID: %s'), vol_id)
         vol_uuid_file = vol_name
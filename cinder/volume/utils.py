@@ -16,6 +16,7 @@
 
 
 import ast
+import io
 import math
 import re
 import time
@@ -23,6 +24,7 @@ import uuid
 
 from Crypto.Random import random
 import eventlet
+from eventlet import greenpool
 from eventlet import tpool
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -368,38 +370,110 @@ def _open_volume_with_path(path, mode):
         LOG.error(_LE("Failed to open volume from %(path)s."), {'path': path})
 
 
-def _transfer_data(src, dest, length, chunk_size):
-    """Transfer data between files (Python IO objects)."""
+def _is_seekable(handle):
+    try:
+        return handle.seekable()
+    except (AttributeError, IOError, OSError, ValueError):
+        return False
 
-    chunks = int(math.ceil(length / chunk_size))
-    remaining_length = length
 
-    LOG.debug("%(chunks)s chunks of %(bytes)s bytes to be transferred.",
-              {'chunks': chunks, 'bytes': chunk_size})
+def _readinto(src, view):
+    """Read into a preallocated buffer, copying only if src cannot."""
+    try:
+        count = src.readinto(view)
+    except (AttributeError, NotImplementedError):
+        data = src.read(len(view))
+        count = len(data)
+        view[:count] = data
+    return count or 0
+
+
+def _write_all(dest, view):
+    written = 0
+    while written < len(view):
+        try:
+            count = dest.write(view[written:])
+        except TypeError:
+            # Some handles, such as librbd's, only accept byte strings.
+            count = dest.write(view[written:].tobytes())
+        if count is None:
+            # Buffered and most wrapper handles write everything or raise.
+            break
+        written += count
 
-    for chunk in xrange(0, chunks):
-        before = time.time()
-        data = tpool.execute(src.read, min(chunk_size, remaining_length))
 
-        # If we have reached end of source, discard any extraneous bytes from
-        # destination volume if trim is enabled and stop writing.
-        if data == '':
-            break
+def _transfer_data(src, dest, length, chunk_size, sparse=False):
+    """Transfer data between files (Python IO objects).
+
+    Two preallocated buffers are used in turn so that the next chunk is read
+    while the previous one is written, without allocating a new string per
+    chunk. With sparse set, chunks of zeroes are skipped on seekable
+    destinations rather than written, leaving holes in them.
+    """
+
+    chunks = int(math.ceil(length / float(chunk_size)))
 
-        tpool.execute(dest.write, data)
-        remaining_length -= len(data)
-        delta = (time.time() - before)
-        rate = (chunk_size / delta) / units.Ki
-        LOG.debug("Transferred chunk %(chunk)s of %(chunks)s (%(rate)dK/s).",
-                  {'chunk': chunk + 1, 'chunks': chunks, 'rate': rate})
+    LOG.debug("%(chunks)s chunks of %(bytes)s bytes to be transferred.",
+              {'chunks': chunks, 'bytes': chunk_size})
+
+    sparse = sparse and _is_seekable(dest)
+    buffers = [memoryview(bytearray(chunk_size)),
+               memoryview(bytearray(chunk_size))]
+    zeroes = memoryview(bytearray(chunk_size)) if sparse else None
 
-        # yield to any other pending operations
-        eventlet.sleep(0)
+    remaining_length = length
+    pending = eventlet.spawn(tpool.execute, _readinto, src,
+                             buffers[0][:min(chunk_size, remaining_length)])
+    chunk = 0
+    try:
+        while pending is not None:
+            before = time.time()
+            count = pending.wait()
+
+            # If we have reached end of source, discard any extraneous bytes
+            # from destination volume if trim is enabled and stop writing.
+            if count == 0:
+                break
+
+            data = buffers[chunk % 2][:count]
+            remaining_length -= count
+            pending = None
+            if remaining_length > 0:
+                # Read the next chunk into the other buffer while this one is
+                # being written.
+                next_buffer = buffers[(chunk + 1) % 2]
+                pending = eventlet.spawn(
+                    tpool.execute, _readinto, src,
+                    next_buffer[:min(chunk_size, remaining_length)])
+
+            # The last chunk is always written so that the destination ends
+            # up with the full length even when it ends in zeroes.
+            if sparse and pending is not None and data == zeroes[:count]:
+                dest.seek(count, io.SEEK_CUR)
+            else:
+                tpool.execute(_write_all, dest, data)
+            delta = max(time.time() - before, 0.000001)
+            rate = (count / delta) / units.Ki
+            LOG.debug("Transferred chunk %(chunk)s of %(chunks)s "
+                      "(%(rate)dK/s).",
+                      {'chunk': chunk + 1, 'chunks': chunks, 'rate': rate})
+            chunk += 1
+
+            # yield to any other pending operations
+            eventlet.sleep(0)
+    finally:
+        if pending is not None:
+            # Do not leave the next read running into the buffers when a
+            # write failed, its own error does not matter then.
+            try:
+                pending.wait()
+            except Exception:
+                pass
 
     tpool.execute(dest.flush)
 
 
-def _copy_volume_with_file(src, dest, size_in_m):
+def _copy_volume_with_file(src, dest, size_in_m, sparse=False):
     src_handle = src
     if isinstance(src, six.string_types):
         src_handle = _open_volume_with_path(src, 'rb')
@@ -418,7 +492,8 @@ def _copy_volume_with_file(src, dest, size_in_m):
 
     start_time = timeutils.utcnow()
 
-    _transfer_data(src_handle, dest_handle, size_in_m * units.Mi, units.Mi * 4)
+    _transfer_data(src_handle, dest_handle, size_in_m * units.Mi, units.Mi * 4,
+                   sparse=sparse)
 
     duration = max(1, timeutils.delta_seconds(start_time, timeutils.utcnow()))
 
@@ -447,6 +522,8 @@ def copy_volume(src, dest, size_in_m, blocksize, sync=False,
     of type RawIOBase or any derivative that supports file operations such as
     read and write.  In this case, the handles are treated as file handles
     instead of file paths and, at present moment, throttling is unavailable.
+    With 'sparse' set, runs of zeroes are skipped rather than written to
+    seekable handles.
     """
 
     if (isinstance(src, six.string_types) and
@@ -459,7 +536,7 @@ def copy_volume(src, dest, size_in_m, blocksize, sync=False,
                                    execute=execute, ionice=ionice,
                                    sparse=sparse)
     else:
-        _copy_volume_with_file(src, dest, size_in_m)
+        _copy_volume_with_file(src, dest, size_in_m, sparse=sparse)
 
 
 def clear_volume(volume_size, volume_path, volume_clear=None,
@@ -509,6 +586,34 @@ def clear_volume(volume_size, volume_path, volume_clear=None,
     LOG.info(_LI('Elapsed time for clear volume: %.2f sec'), duration)
 
 
+def ensure_exports_concurrently(ensure_export, context, exports, workers=1):
+    """Call ensure_export(context, *export) for each of the exports.
+
+    The first item of each export is the volume. Up to workers exports are
+    recreated at the same time.
+
+    :returns: dict of the exceptions raised by the volumes which could not
+              be exported, by volume id
+    """
+    failures = {}
+
+    def _ensure_export(export):
+        try:
+            ensure_export(context, *export)
+        except Exception as e:
+            failures[export[0]['id']] = e
+
+    if workers > 1 and len(exports) > 1:
+        pool = greenpool.GreenPool(min(workers, len(exports)))
+        for export in exports:
+            pool.spawn_n(_ensure_export, export)
+        pool.waitall()
+    else:
+        for export in exports:
+            _ensure_export(export)
+    return failures
+
+
 def supports_thin_provisioning():
     return brick_lvm.LVM.supports_thin_provisioning(
         utils.get_root_helper())
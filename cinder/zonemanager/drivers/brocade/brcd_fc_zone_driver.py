@@ -64,9 +64,10 @@ class BrcdFCZoneDriver(fc_zone_driver.FCZoneDriver):
     Version history:
         1.0 - Initial Brocade FC zone driver
         1.1 - Implements performance enhancements
+        1.2 - Uses the zone set cache and applies each request at once
     """
 
-    VERSION = "1.1"
+    VERSION = "1.2"
 
     def __init__(self, **kwargs):
         super(BrcdFCZoneDriver, self).__init__(**kwargs)
@@ -138,15 +139,16 @@ class BrcdFCZoneDriver(fc_zone_driver.FCZoneDriver):
 
         LOG.info(_LI("Zoning policy for Fabric %s"), zoning_policy)
         cli_client = self._get_cli_client(fabric)
-        cfgmap_from_fabric = self._get_active_zone_set(cli_client)
+        cfgmap_from_fabric = self._get_zone_set(
+            fabric, lambda: self._get_active_zone_set(cli_client))
 
         zone_names = []
         if cfgmap_from_fabric.get('zones'):
             zone_names = cfgmap_from_fabric['zones'].keys()
         # based on zoning policy, create zone member list and
-        # push changes to fabric.
+        # push changes to fabric, all initiators at once.
+        zone_map = {}
         for initiator_key in initiator_target_map.keys():
-            zone_map = {}
             initiator = initiator_key.lower()
             t_list = initiator_target_map[initiator_key]
             if zoning_policy == 'initiator-target':
@@ -185,21 +187,23 @@ class BrcdFCZoneDriver(fc_zone_driver.FCZoneDriver):
                 LOG.error(msg)
                 raise exception.FCZoneDriverException(msg)
 
-            LOG.info(_LI("Zone map to add: %s"), zone_map)
+        LOG.info(_LI("Zone map to add: %s"), zone_map)
 
-            if len(zone_map) > 0:
-                try:
-                    cli_client.add_zones(
-                        zone_map, zone_activate,
-                        cfgmap_from_fabric)
-                    cli_client.cleanup()
-                except exception.BrocadeZoningCliException as brocade_ex:
-                    raise exception.FCZoneDriverException(brocade_ex)
-                except Exception:
-                    msg = _("Failed to add zoning configuration.")
-                    LOG.exception(msg)
-                    raise exception.FCZoneDriverException(msg)
-            LOG.debug("Zones added successfully: %s", zone_map)
+        if len(zone_map) > 0:
+            try:
+                cli_client.add_zones(
+                    zone_map, zone_activate,
+                    cfgmap_from_fabric)
+                cli_client.cleanup()
+            except exception.BrocadeZoningCliException as brocade_ex:
+                raise exception.FCZoneDriverException(brocade_ex)
+            except Exception:
+                msg = _("Failed to add zoning configuration.")
+                LOG.exception(msg)
+                raise exception.FCZoneDriverException(msg)
+            finally:
+                self._invalidate_zone_set(fabric)
+        LOG.debug("Zones added successfully: %s", zone_map)
 
     @lockutils.synchronized('brcd', 'fcfabric-', True)
     def delete_connection(self, fabric, initiator_target_map):
@@ -229,7 +233,8 @@ class BrcdFCZoneDriver(fc_zone_driver.FCZoneDriver):
 
         LOG.info(_LI("Zoning policy for fabric %s"), zoning_policy)
         conn = self._get_cli_client(fabric)
-        cfgmap_from_fabric = self._get_active_zone_set(conn)
+        cfgmap_from_fabric = self._get_zone_set(
+            fabric, lambda: self._get_active_zone_set(conn))
 
         zone_names = []
         if cfgmap_from_fabric.get('zones'):
@@ -237,13 +242,14 @@ class BrcdFCZoneDriver(fc_zone_driver.FCZoneDriver):
 
         # Based on zoning policy, get zone member list and push changes to
         # fabric. This operation could result in an update for zone config
-        # with new member list or deleting zones from active cfg.
+        # with new member list or deleting zones from active cfg. The changes
+        # of all initiators are pushed at once.
         LOG.debug("zone config from Fabric: %s", cfgmap_from_fabric)
+        zone_map = {}
+        zones_to_delete = []
         for initiator_key in initiator_target_map.keys():
             initiator = initiator_key.lower()
             formatted_initiator = self.get_formatted_wwn(initiator)
-            zone_map = {}
-            zones_to_delete = []
             t_list = initiator_target_map[initiator_key]
             if zoning_policy == 'initiator-target':
                 # In this case, zone needs to be deleted.
@@ -292,35 +298,38 @@ class BrcdFCZoneDriver(fc_zone_driver.FCZoneDriver):
             else:
                 LOG.info(_LI("Zoning Policy: %s, not "
                              "recognized"), zoning_policy)
-            LOG.debug("Final Zone map to update: %s", zone_map)
-            LOG.debug("Final Zone list to delete: %s", zones_to_delete)
-            try:
-                # Update zone membership.
-                if zone_map:
-                    conn.add_zones(
-                        zone_map, zone_activate,
-                        cfgmap_from_fabric)
-                # Delete zones ~sk.
-                if zones_to_delete:
-                    zone_name_string = ''
-                    num_zones = len(zones_to_delete)
-                    for i in range(0, num_zones):
-                        if i == 0:
-                            zone_name_string = (
-                                '%s%s' % (
-                                    zone_name_string, zones_to_delete[i]))
-                        else:
-                            zone_name_string = '%s;%s' % (
-                                zone_name_string, zones_to_delete[i])
-
-                    conn.delete_zones(
-                        zone_name_string, zone_activate,
-                        cfgmap_from_fabric)
-                conn.cleanup()
-            except Exception:
-                msg = _("Failed to update or delete zoning configuration")
-                LOG.exception(msg)
-                raise exception.FCZoneDriverException(msg)
+        LOG.debug("Final Zone map to update: %s", zone_map)
+        LOG.debug("Final Zone list to delete: %s", zones_to_delete)
+        try:
+            # Update zone membership.
+            if zone_map:
+                conn.add_zones(
+                    zone_map, zone_activate,
+                    cfgmap_from_fabric)
+            # Delete zones ~sk.
+            if zones_to_delete:
+                zone_name_string = ''
+                num_zones = len(zones_to_delete)
+                for i in range(0, num_zones):
+                    if i == 0:
+                        zone_name_string = (
+                            '%s%s' % (
+                                zone_name_string, zones_to_delete[i]))
+                    else:
+                        zone_name_string = '%s;%s' % (
+                            zone_name_string, zones_to_delete[i])
+
+                conn.delete_zones(
+                    zone_name_string, zone_activate,
+                    cfgmap_from_fabric)
+            conn.cleanup()
+        except Exception:
+            msg = _("Failed to update or delete zoning configuration")
+            LOG.exception(msg)
+            raise exception.FCZoneDriverException(msg)
+        finally:
+            if zone_map or zones_to_delete:
+                self._invalidate_zone_set(fabric)
 
     def get_san_context(self, target_wwn_list):
         """Lookup SAN context for visible end devices.
@@ -61,9 +61,10 @@ class CiscoFCZoneDriver(fc_zone_driver.FCZoneDriver):
 
     Version history:
         1.0 - Initial Cisco FC zone driver
+        1.1 - Uses the zone set cache and applies each request at once
     """
 
-    VERSION = "1.0.0"
+    VERSION = "1.1.0"
 
     def __init__(self, **kwargs):
         super(CiscoFCZoneDriver, self).__init__(**kwargs)
@@ -148,15 +149,17 @@ class CiscoFCZoneDriver(fc_zone_driver.FCZoneDriver):
 
         if statusmap_from_fabric.get('session') == 'none':
 
-            cfgmap_from_fabric = self.get_active_zone_set(
-                fabric_ip, fabric_user, fabric_pwd, fabric_port, zoning_vsan)
+            cfgmap_from_fabric = self._get_zone_set(
+                fabric, lambda: self.get_active_zone_set(
+                    fabric_ip, fabric_user, fabric_pwd, fabric_port,
+                    zoning_vsan))
             zone_names = []
             if cfgmap_from_fabric.get('zones'):
                 zone_names = cfgmap_from_fabric['zones'].keys()
                 # based on zoning policy, create zone member list and
-                # push changes to fabric.
+                # push changes to fabric, all initiators at once.
+                zone_map = {}
                 for initiator_key in initiator_target_map.keys():
-                    zone_map = {}
                     initiator = initiator_key.lower()
                     t_list = initiator_target_map[initiator_key]
                     if zoning_policy == 'initiator-target':
@@ -223,6 +226,8 @@ class CiscoFCZoneDriver(fc_zone_driver.FCZoneDriver):
                         msg = _("Failed to add zoning configuration.")
                         LOG.exception(msg)
                         raise exception.FCZoneDriverException(msg)
+                    finally:
+                        self._invalidate_zone_set(fabric)
                 LOG.debug("Zones added successfully: %s", zone_map)
             else:
                 LOG.debug("Zoning session exists VSAN: %s", zoning_vsan)
@@ -264,8 +269,10 @@ class CiscoFCZoneDriver(fc_zone_driver.FCZoneDriver):
             fabric_ip, fabric_user, fabric_pwd, fabric_port, zoning_vsan)
 
         if statusmap_from_fabric.get('session') == 'none':
-            cfgmap_from_fabric = self.get_active_zone_set(
-                fabric_ip, fabric_user, fabric_pwd, fabric_port, zoning_vsan)
+            cfgmap_from_fabric = self._get_zone_set(
+                fabric, lambda: self.get_active_zone_set(
+                    fabric_ip, fabric_user, fabric_pwd, fabric_port,
+                    zoning_vsan))
 
             zone_names = []
             if cfgmap_from_fabric.get('zones'):
@@ -274,14 +281,14 @@ class CiscoFCZoneDriver(fc_zone_driver.FCZoneDriver):
             # Based on zoning policy, get zone member list and push
             # changes to fabric. This operation could result in an update
             # for zone config with new member list or deleting zones from
-            # active cfg.
+            # active cfg. The changes of all initiators are pushed at once.
 
             LOG.debug("zone config from Fabric: %s", cfgmap_from_fabric)
+            zone_map = {}
+            zones_to_delete = []
             for initiator_key in initiator_target_map.keys():
                 initiator = initiator_key.lower()
                 formatted_initiator = zm_utils.get_formatted_wwn(initiator)
-                zone_map = {}
-                zones_to_delete = []
                 t_list = initiator_target_map[initiator_key]
                 if zoning_policy == 'initiator-target':
                     # In this case, zone needs to be deleted.
@@ -332,50 +339,51 @@ class CiscoFCZoneDriver(fc_zone_driver.FCZoneDriver):
                 else:
                     LOG.info(_LI("Zoning Policy: %s, not recognized"),
                              zoning_policy)
-                LOG.debug("Final Zone map to update: %s", zone_map)
-                LOG.debug("Final Zone list to delete: %s", zones_to_delete)
-                conn = None
-                try:
-                    conn = importutils.import_object(
-                        self.configuration.cisco_sb_connector,
-                        ipaddress=fabric_ip,
-                        username=fabric_user,
-                        password=fabric_pwd,
-                        port=fabric_port,
-                        vsan=zoning_vsan)
-                    # Update zone membership.
-                    if zone_map:
-                        conn.add_zones(
-                            zone_map, self.configuration.cisco_zone_activate,
-                            zoning_vsan, cfgmap_from_fabric,
-                            statusmap_from_fabric)
-                    # Delete zones ~sk.
-                    if zones_to_delete:
-                        zone_name_string = ''
-                        num_zones = len(zones_to_delete)
-                        for i in range(0, num_zones):
-                            if i == 0:
-                                zone_name_string = ('%s%s' % (
-                                                    zone_name_string,
-                                                    zones_to_delete[i]))
-                            else:
-                                zone_name_string = ('%s%s%s' % (
-                                                    zone_name_string, ';',
-                                                    zones_to_delete[i]))
-
-                        conn.delete_zones(zone_name_string,
-                                          self.configuration.
-                                          cisco_zone_activate,
-                                          zoning_vsan, cfgmap_from_fabric,
-                                          statusmap_from_fabric)
-                    conn.cleanup()
-                except Exception:
-                    msg = _("Failed to update or delete zoning configuration")
-                    LOG.exception(msg)
-                    raise exception.FCZoneDriverException(msg)
-                LOG.debug("Zones deleted successfully: %s", zone_map)
-            else:
-                LOG.debug("Zoning session exists VSAN: %s", zoning_vsan)
+            LOG.debug("Final Zone map to update: %s", zone_map)
+            LOG.debug("Final Zone list to delete: %s", zones_to_delete)
+            conn = None
+            try:
+                conn = importutils.import_object(
+                    self.configuration.cisco_sb_connector,
+                    ipaddress=fabric_ip,
+                    username=fabric_user,
+                    password=fabric_pwd,
+                    port=fabric_port,
+                    vsan=zoning_vsan)
+                # Update zone membership.
+                if zone_map:
+                    conn.add_zones(
+                        zone_map, self.configuration.cisco_zone_activate,
+                        zoning_vsan, cfgmap_from_fabric,
+                        statusmap_from_fabric)
+                # Delete zones ~sk.
+                if zones_to_delete:
+                    zone_name_string = ''
+                    num_zones = len(zones_to_delete)
+                    for i in range(0, num_zones):
+                        if i == 0:
+                            zone_name_string = ('%s%s' % (
+                                zone_name_string, zones_to_delete[i]))
+                        else:
+                            zone_name_string = ('%s%s%s' % (
+                                zone_name_string, ';', zones_to_delete[i]))
+
+                    conn.delete_zones(zone_name_string,
+                                      self.configuration.
+                                      cisco_zone_activate,
+                                      zoning_vsan, cfgmap_from_fabric,
+                                      statusmap_from_fabric)
+                conn.cleanup()
+            except Exception:
+                msg = _("Failed to update or delete zoning configuration")
+                LOG.exception(msg)
+                raise exception.FCZoneDriverException(msg)
+            finally:
+                if zone_map or zones_to_delete:
+                    self._invalidate_zone_set(fabric)
+            LOG.debug("Zones deleted successfully: %s", zone_map)
+        else:
+            LOG.debug("Zoning session exists VSAN: %s", zoning_vsan)
 
     def get_san_context(self, target_wwn_list):
         """Lookup SAN context for visible end devices.
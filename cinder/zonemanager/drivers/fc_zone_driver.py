@@ -42,6 +42,9 @@ class FCZoneDriver(fc_common.FCCommon):
     def __init__(self, **kwargs):
         super(FCZoneDriver, self).__init__(**kwargs)
         LOG.debug("Initializing FCZoneDriver")
+        # Cache of the active zone sets shared with the zone manager, None
+        # if zone sets are read from the fabric every time.
+        self.zone_set_cache = kwargs.get('zone_set_cache')
 
     def add_connection(self, fabric, initiator_target_map):
         """Add connection control.
@@ -90,3 +93,21 @@ class FCZoneDriver(fc_common.FCCommon):
         ':' separated strings
         """
         raise NotImplementedError()
+
+    def _get_zone_set(self, fabric, fetch):
+        """Read the active zone set of fabric before changing its zoning.
+
+        The zone set is always read from the fabric, other processes may have
+        changed it since it was cached. Callers must hold the fabric lock.
+
+        :param fabric: Fabric name from cinder.conf file
+        :param fetch: Function reading the active zone set from the fabric
+        """
+        if self.zone_set_cache is None:
+            return fetch()
+        return self.zone_set_cache.refresh(fabric, fetch)
+
+    def _invalidate_zone_set(self, fabric):
+        """Drop the cached zone set of fabric after changing its zoning."""
+        if self.zone_set_cache is not None:
+            self.zone_set_cache.invalidate(fabric)
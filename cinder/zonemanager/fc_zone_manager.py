@@ -31,13 +31,19 @@ detach operation.
 
 """
 
+import copy
+import itertools
+import time
+
+import eventlet
+from eventlet import event
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
 import six
 
 from cinder import exception
-from cinder.i18n import _, _LI
+from cinder.i18n import _, _LI, _LW
 from cinder.volume import configuration as config
 from cinder.zonemanager import fc_common
 
@@ -61,24 +67,78 @@ zone_manager_opts = [
                default='cinder.zonemanager.drivers.brocade'
                '.brcd_fc_san_lookup_service.BrcdFCSanLookupService',
                help='FC SAN Lookup Service'),
+    cfg.IntOpt('zone_set_cache_ttl',
+               default=0,
+               help='Number of seconds the active zone set of a fabric is '
+               'cached for. Zone drivers still read the active zone set '
+               'from the switch, while holding the fabric lock, before '
+               'adding or deleting zones, since other processes may have '
+               'changed it. The cache only saves reads between those '
+               'changes. Set to 0 to disable the cache.'),
+    cfg.FloatOpt('zoning_batch_window',
+                 default=0,
+                 help='Number of seconds zoning requests for a fabric are '
+                 'collected for before being applied together, with a '
+                 'single zone set activation. Set to 0 to apply each '
+                 'request on its own.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(zone_manager_opts, group='fc-zone-manager')
 
 
+class ZoneSetCache(object):
+    """Active zone sets of the fabrics, kept for ttl seconds.
+
+    The cache is per process and is not told about zoning changes made by
+    other processes. Zone drivers refresh it from the switch before changing
+    the zoning of a fabric and invalidate it once they changed it.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # (time fetched, zone set) by fabric name
+        self._zone_sets = {}
+
+    def get(self, fabric, fetch):
+        """Return the zone set of fabric, calling fetch() if not cached."""
+        cached = self._zone_sets.get(fabric)
+        if cached and time.time() - cached[0] < self.ttl:
+            LOG.debug("Using cached zone set of fabric %s", fabric)
+            # Callers may change the zone set they get
+            return copy.deepcopy(cached[1])
+
+        return self.refresh(fabric, fetch)
+
+    def refresh(self, fabric, fetch):
+        """Return the zone set of fabric from fetch(), caching it."""
+        zone_set = fetch()
+        if zone_set is not None:
+            self._zone_sets[fabric] = (time.time(), copy.deepcopy(zone_set))
+        return zone_set
+
+    def invalidate(self, fabric):
+        self._zone_sets.pop(fabric, None)
+
+
 class ZoneManager(fc_common.FCCommon):
     """Manages Connection control during attach/detach.
 
        Version History:
            1.0 - Initial version
            1.0.1 - Added __new__ for singleton
+           1.1 - Added zone set cache and batching of zoning requests
 
     """
 
-    VERSION = "1.0.1"
+    VERSION = "1.1"
     driver = None
     fabric_names = []
+    # The drivers are rebuilt every time the singleton is initialized, the
+    # cache and pending requests must outlive them.
+    zone_set_cache = None
+    # Zoning requests waiting to be applied, by fabric
+    _pending = None
 
     def __new__(class_, *args, **kwargs):
         if not hasattr(class_, "_instance"):
@@ -91,6 +151,10 @@ class ZoneManager(fc_common.FCCommon):
 
         self.configuration = config.Configuration(zone_manager_opts,
                                                   'fc-zone-manager')
+        if self._pending is None:
+            self._pending = {}
+            self.zone_set_cache = ZoneSetCache(0)
+        self.zone_set_cache.ttl = self.configuration.zone_set_cache_ttl
 
         self._build_driver()
 
@@ -98,10 +162,14 @@ class ZoneManager(fc_common.FCCommon):
         zone_driver = self.configuration.zone_driver
         LOG.debug("Zone Driver from config: {%s}", zone_driver)
 
+        zone_set_cache = None
+        if self.zone_set_cache.ttl > 0:
+            zone_set_cache = self.zone_set_cache
         # Initialize vendor specific implementation of  FCZoneDriver
         self.driver = importutils.import_object(
             zone_driver,
-            configuration=self.configuration)
+            configuration=self.configuration,
+            zone_set_cache=zone_set_cache)
 
     def get_zoning_state_ref_count(self, initiator_wwn, target_wwn):
         """Zone management state check.
@@ -127,6 +195,7 @@ class ZoneManager(fc_common.FCCommon):
         """
         connected_fabric = None
         try:
+            fabric_i_t_maps = {}
             for initiator in initiator_target_map.keys():
                 target_list = initiator_target_map[initiator]
                 LOG.debug("Target List: %s", target_list)
@@ -144,9 +213,20 @@ class ZoneManager(fc_common.FCCommon):
                         i_t_map, True)
                     LOG.info(_LI("Final filtered map for fabric: %s"),
                              valid_i_t_map)
-
-                    # Call driver to add connection control
-                    self.driver.add_connection(fabric, valid_i_t_map)
+                    self._merge_i_t_map(
+                        fabric_i_t_maps.setdefault(fabric, {}), valid_i_t_map)
+
+            # Call driver to add connection control, once per fabric
+            waiters = []
+            for fabric, i_t_map in fabric_i_t_maps.items():
+                connected_fabric = fabric
+                if self.configuration.zoning_batch_window > 0:
+                    waiters.append(
+                        (fabric, self._submit('add', fabric, i_t_map)))
+                else:
+                    self.driver.add_connection(fabric, i_t_map)
+            for connected_fabric, waiter in waiters:
+                waiter.wait()
 
             LOG.info(_LI("Add Connection: Finished iterating "
                          "over all target list"))
@@ -170,6 +250,7 @@ class ZoneManager(fc_common.FCCommon):
         """
         connected_fabric = None
         try:
+            fabric_i_t_maps = {}
             for initiator in initiator_target_map.keys():
                 target_list = initiator_target_map[initiator]
                 LOG.info(_LI("Delete connection Target List: %s"),
@@ -191,9 +272,22 @@ class ZoneManager(fc_common.FCCommon):
                     LOG.info(_LI("Final filtered map for delete "
                                  "connection: %s"), valid_i_t_map)
 
-                    # Call driver to delete connection control
                     if len(valid_i_t_map) > 0:
-                        self.driver.delete_connection(fabric, valid_i_t_map)
+                        self._merge_i_t_map(
+                            fabric_i_t_maps.setdefault(fabric, {}),
+                            valid_i_t_map)
+
+            # Call driver to delete connection control, once per fabric
+            waiters = []
+            for fabric, i_t_map in fabric_i_t_maps.items():
+                connected_fabric = fabric
+                if self.configuration.zoning_batch_window > 0:
+                    waiters.append(
+                        (fabric, self._submit('delete', fabric, i_t_map)))
+                else:
+                    self.driver.delete_connection(fabric, i_t_map)
+            for connected_fabric, waiter in waiters:
+                waiter.wait()
 
             LOG.debug("Delete Connection - Finished iterating over all"
                       " target list")
@@ -204,6 +298,74 @@ class ZoneManager(fc_common.FCCommon):
             LOG.error(msg)
             raise exception.ZoneManagerException(reason=msg)
 
+    @staticmethod
+    def _merge_i_t_map(i_t_map, other_i_t_map):
+        """Add the initiator-target pairs of other_i_t_map to i_t_map."""
+        for initiator, t_list in other_i_t_map.items():
+            targets = i_t_map.setdefault(initiator, [])
+            targets.extend(t for t in t_list if t not in targets)
+
+    def _submit(self, operation, fabric, i_t_map):
+        """Queue a zoning request for the next transaction of the fabric.
+
+        Returns an event sent once the request is applied, which raises the
+        error of the driver if it failed.
+        """
+        pending = self._pending.get(fabric)
+        if pending is None:
+            pending = self._pending[fabric] = []
+            eventlet.spawn_after(self.configuration.zoning_batch_window,
+                                 self._apply_pending, fabric)
+        done = event.Event()
+        pending.append((operation, i_t_map, done))
+        return done
+
+    def _apply_pending(self, fabric):
+        """Apply the requests queued for fabric, merged by operation.
+
+        Consecutive requests with the same operation are merged into one
+        driver call so that the fabric only gets one update and activation
+        for them. If a merged call fails, its requests are retried one at a
+        time so that a single bad request does not fail the others.
+        """
+        requests = self._pending.pop(fabric)
+        for operation, group in itertools.groupby(requests,
+                                                  lambda r: r[0]):
+            group = list(group)
+            i_t_map = {}
+            for _operation, request_i_t_map, _done in group:
+                self._merge_i_t_map(i_t_map, request_i_t_map)
+            LOG.debug("Applying %(count)d zoning requests to fabric "
+                      "%(fabric)s: %(operation)s %(map)s",
+                      {'count': len(group), 'fabric': fabric,
+                       'operation': operation, 'map': i_t_map})
+            try:
+                self._call_driver(operation, fabric, i_t_map)
+            except Exception as e:
+                if len(group) == 1:
+                    group[0][2].send_exception(e)
+                    continue
+                LOG.warning(_LW("Merged zoning requests failed for fabric "
+                                "%(fabric)s, applying them one at a time: "
+                                "%(err)s"),
+                            {'fabric': fabric, 'err': six.text_type(e)})
+                for _operation, request_i_t_map, done in group:
+                    try:
+                        self._call_driver(operation, fabric, request_i_t_map)
+                    except Exception as e:
+                        done.send_exception(e)
+                    else:
+                        done.send()
+            else:
+                for _operation, _i_t_map, done in group:
+                    done.send()
+
+    def _call_driver(self, operation, fabric, i_t_map):
+        if operation == 'add':
+            self.driver.add_connection(fabric, i_t_map)
+        else:
+            self.driver.delete_connection(fabric, i_t_map)
+
     def get_san_context(self, target_wwn_list):
         """SAN lookup for end devices.
 
@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the rate limit checks of the API limiters.
+
+Each limiter checks --checks requests of --users users against the default
+limits, in --workers processes at once, e.g.:
+
+    limiter_bench.py --workers 4 --users 1000
+
+The shared limiters use one file in --dir for all the workers.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from cinder.api.v2 import limits
+
+LIMITERS = {
+    'memory': limits.Limiter,
+    'bucket': limits.BucketLimiter,
+    'shm': limits.SharedMemoryLimiter,
+    'file': limits.FileLimiter,
+}
+REQUESTS = [('POST', '/volumes'), ('PUT', '/volumes/1'),
+            ('GET', '/volumes/detail'), ('DELETE', '/volumes/1')]
+
+
+def _run(args, name, path, results):
+    limiter = LIMITERS[name](limits.DEFAULT_LIMITS, limiter_path=path,
+                             limiter_slots=args.slots)
+    start = time.time()
+    for i in range(args.checks):
+        verb, url = REQUESTS[i % len(REQUESTS)]
+        limiter.check_for_delay(verb, url, 'user%d' % (i % args.users))
+    results.put(time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=100000,
+                        help='Number of checks made by each worker')
+    parser.add_argument('--users', type=int, default=100,
+                        help='Number of users making the requests')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes checking at once')
+    parser.add_argument('--slots', type=int, default=4096,
+                        help='Number of slots of the shared tables')
+    parser.add_argument('--dir', default=None,
+                        help='Directory of the shared tables, /dev/shm for '
+                             'the shm limiter and a temporary one otherwise')
+    parser.add_argument('--limiter', action='append', choices=LIMITERS,
+                        help='Limiter to measure, all by default')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in args.limiter or sorted(LIMITERS):
+            directory = args.dir or tmpdir
+            if name == 'shm' and not args.dir:
+                directory = os.path.dirname(
+                    limits.SharedMemoryLimiter.DEFAULT_PATH)
+            path = os.path.join(directory, 'limiter-bench-%s' % name)
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(
+                target=_run, args=(args, name, path, results))
+                for _worker in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            elapsed = max(results.get() for _worker in workers)
+            for worker in workers:
+                worker.join()
+            if os.path.exists(path):
+                os.unlink(path)
+            print('%(name)-6s %(rate)10.0f checks/s' %
+                  {'name': name,
+                   'rate': args.checks * args.workers / elapsed})
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the LVM calls of volume lookups and stats updates.
+
+A fake executor answers the LVM commands for a volume group of --lvs LVs,
+taking --lvs-cost seconds per thousand LVs listed by lvs. Stats updates
+and volume lookups are run with and without the LV inventory, e.g.:
+
+    lvm_inventory_bench.py --lvs 10000 --lvs-cost 0.5
+"""
+
+import argparse
+import time
+
+from oslo_concurrency import processutils
+
+from cinder.brick.local_dev import lvm
+
+VG_NAME = 'cinder-volumes'
+
+
+class FakeExecutor(object):
+    """Answers the LVM commands for a VG of many LVs."""
+
+    def __init__(self, lv_count, lvs_cost):
+        self.lvs_cost = lvs_cost
+        self.lvs = ['volume-%08d' % i for i in range(lv_count)]
+        self.calls = {}
+
+    def __call__(self, *cmd, **kwargs):
+        command = [arg for arg in cmd if arg not in ('env', 'LC_ALL=C')][0]
+        self.calls[command] = self.calls.get(command, 0) + 1
+        if command == 'vgs':
+            if 'name,size,free,lv_count,uuid' in cmd:
+                return ('  %s:%d.00:100.00:%d:fake-uuid\n' %
+                        (VG_NAME, len(self.lvs) + 100, len(self.lvs)), '')
+            return ('  %s\n' % VG_NAME, '')
+        if command == 'pvs':
+            return ('  %s|/dev/sda|%d.00|100.00\n' %
+                    (VG_NAME, len(self.lvs) + 100), '')
+        if command == 'lvs':
+            target = cmd[-1]
+            if '/' in target:
+                names = [target.split('/')[-1]]
+            else:
+                names = self.lvs
+            time.sleep(self.lvs_cost * len(names) / 1000.0)
+            return (''.join('  %s %s 1.00\n' % (VG_NAME, name)
+                            for name in names), '')
+        return ('', '')
+
+
+def _run(args, interval):
+    executor = FakeExecutor(args.lvs, args.lvs_cost)
+    # The static LVM methods do not use the executor of the object
+    processutils.execute = executor
+    vg = lvm.LVM(VG_NAME, 'sudo', executor=executor,
+                 inventory_resync_interval=interval)
+    executor.calls.clear()
+
+    start = time.time()
+    for _i in range(args.updates):
+        vg.update_volume_group_info()
+        len(vg.get_volumes())
+        for lookup in range(args.lookups):
+            vg.get_volume(executor.lvs[lookup * 7 % len(executor.lvs)])
+    elapsed = time.time() - start
+    print('resync interval %(interval)4ds: %(elapsed).2fs, '
+          '%(lvs)d lvs calls, %(vgs)d vgs calls' %
+          {'interval': interval, 'elapsed': elapsed,
+           'lvs': executor.calls.get('lvs', 0),
+           'vgs': executor.calls.get('vgs', 0)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lvs', type=int, default=10000,
+                        help='Number of LVs in the volume group')
+    parser.add_argument('--lvs-cost', type=float, default=0.1,
+                        help='Seconds lvs takes per thousand LVs listed')
+    parser.add_argument('--updates', type=int, default=10,
+                        help='Number of stats updates')
+    parser.add_argument('--lookups', type=int, default=10,
+                        help='Number of volume lookups per stats update')
+    parser.add_argument('--interval', type=int, default=600,
+                        help='Resync interval of the inventory')
+    args = parser.parse_args()
+
+    _run(args, 0)
+    _run(args, args.interval)
+
+
+if __name__ == '__main__':
+    main()
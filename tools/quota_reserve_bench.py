@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the throughput of concurrent quota reservations.
+
+Every worker reserves volumes and gigabytes of its own volume type in the
+same project, the way concurrent volume creates do. Run it once with and
+once without --batched to compare both quota_reserve modes, e.g.:
+
+    quota_reserve_bench.py --connection mysql+pymysql://u:p@localhost/bench
+    quota_reserve_bench.py --connection mysql+pymysql://u:p@localhost/bench \\
+        --batched
+
+The database is created with the cinder schema if needed.
+"""
+
+import argparse
+import datetime
+import threading
+import time
+
+from oslo_config import cfg
+
+from cinder import context
+from cinder import db
+from cinder.db import migration
+from cinder import quota
+
+CONF = cfg.CONF
+
+
+def _worker(index, args, errors):
+    ctxt = context.get_admin_context()
+    vtype = {'id': 'bench-type-%d' % index, 'name': 'bench%d' % index}
+    resources = {}
+    for part_name in ('volumes', 'gigabytes'):
+        resource = quota.VolumeTypeResource(part_name, vtype)
+        resources[resource.name] = resource
+    if args.shared:
+        for part_name in ('volumes', 'gigabytes'):
+            resources[part_name] = quota.ReservableResource(
+                part_name, '_sync_%s' % part_name)
+    quotas = {name: -1 for name in resources}
+    deltas = {name: 1 for name in resources}
+
+    for _i in range(args.requests):
+        expire = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        try:
+            db.quota_reserve(ctxt, resources, quotas, deltas, expire,
+                             0, 0, project_id=args.project)
+        except Exception as e:
+            errors.append(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connection',
+                        default='sqlite:////tmp/cinder-quota-bench.sqlite',
+                        help='SQLAlchemy URL of the database to use')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of concurrent workers')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='Number of reservations made by each worker')
+    parser.add_argument('--project', default='quota-bench',
+                        help='Project the reservations are made for')
+    parser.add_argument('--shared', action='store_true',
+                        help='Also reserve the project wide volumes and '
+                             'gigabytes, which all the workers share')
+    parser.add_argument('--batched', action='store_true',
+                        help='Enable the quota_reserve_batched option')
+    args = parser.parse_args()
+
+    CONF([], project='cinder')
+    CONF.set_override('connection', args.connection, group='database')
+    CONF.set_override('quota_reserve_batched', args.batched)
+    migration.db_sync()
+
+    errors = []
+    threads = [threading.Thread(target=_worker, args=(i, args, errors))
+               for i in range(args.workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    total = args.workers * args.requests - len(errors)
+    print('%(total)d reservations in %(elapsed).2fs: %(rate).1f/s '
+          '(%(errors)d errors)' % {'total': total, 'elapsed': elapsed,
+                                   'rate': total / elapsed,
+                                   'errors': len(errors)})
+    if errors:
+        print('First error: %s' % errors[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the throughput of the Swift backup driver.
+
+The driver writes then reads back --objects objects of --object-size bytes
+through a fake Swift WSGI application served locally, which holds the
+objects in memory and answers each request after --latency seconds. This
+is done for each --concurrency value, e.g.:
+
+    swift_backup_bench.py --concurrency 1 --concurrency 8 --latency 0.05
+"""
+
+import argparse
+import hashlib
+import os
+import time
+
+import eventlet
+from eventlet import wsgi
+from oslo_config import cfg
+
+eventlet.monkey_patch()
+
+from cinder.backup import chunkeddriver  # noqa
+from cinder.backup.drivers import swift  # noqa
+# Need to register global_opts
+from cinder.common import config  # noqa
+from cinder import context  # noqa
+
+CONF = cfg.CONF
+
+
+class FakeSwift(object):
+    """Swift API subset used by the backup driver, in memory."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.objects = {}
+
+    def __call__(self, environ, start_response):
+        eventlet.sleep(self.latency)
+        method = environ['REQUEST_METHOD']
+        path = environ['PATH_INFO']
+        if method == 'PUT':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            data = environ['wsgi.input'].read(length)
+            self.objects[path] = data
+            start_response('201 Created',
+                           [('Etag', hashlib.md5(data).hexdigest()),
+                            ('Content-Length', '0')])
+            return [b'']
+        if method == 'GET' and path in self.objects:
+            data = self.objects[path]
+            start_response('200 OK',
+                           [('Etag', hashlib.md5(data).hexdigest()),
+                            ('Content-Length', str(len(data)))])
+            return [data]
+        if method == 'DELETE' and self.objects.pop(path, None) is not None:
+            start_response('204 No Content', [('Content-Length', '0')])
+            return [b'']
+        start_response('404 Not Found', [('Content-Length', '0')])
+        return [b'']
+
+
+def _backup(service, container, names, data):
+    pipeline = service._create_pipeline()
+    for name in names:
+        if pipeline is None:
+            service._write_chunk(container, name, {}, data, None)
+        else:
+            pipeline.submit(container, name, {}, data, None, None)
+    if pipeline is not None:
+        pipeline.wait()
+
+
+def _restore(service, container, names):
+    def _read(name):
+        with service.get_object_reader(container, name) as reader:
+            return reader.read()
+
+    for _body in chunkeddriver._prefetch(_read, names,
+                                         service.restore_prefetch_depth):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--objects', type=int, default=64,
+                        help='Number of objects written and read')
+    parser.add_argument('--object-size', type=int, default=4 * 1024 * 1024,
+                        help='Size in bytes of the objects')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Seconds the fake Swift takes for a request')
+    parser.add_argument('--concurrency', type=int, action='append',
+                        help='backup_swift_concurrency values to measure, '
+                             '1, 4 and 16 by default')
+    args = parser.parse_args()
+
+    app = FakeSwift(args.latency)
+    sock = eventlet.listen(('127.0.0.1', 0))
+    eventlet.spawn_n(wsgi.server, sock, app, log_output=False)
+    url = 'http://127.0.0.1:%d/v1/AUTH_' % sock.getsockname()[1]
+
+    CONF([], project='cinder')
+    CONF.set_override('backup_swift_url', url)
+    CONF.set_override('backup_swift_object_size', args.object_size)
+    CONF.set_override('backup_swift_block_size', args.object_size)
+    CONF.set_override('backup_compression_algorithm', 'none')
+    ctxt = context.RequestContext('bench', 'bench', auth_token='bench')
+    data = os.urandom(args.object_size)
+    names = ['bench-%05d' % i for i in range(args.objects)]
+    total = args.objects * args.object_size / float(1024 * 1024)
+
+    for concurrency in args.concurrency or [1, 4, 16]:
+        CONF.set_override('backup_swift_concurrency', concurrency)
+        service = swift.SwiftBackupDriver(ctxt)
+        container = 'bench-%d' % concurrency
+        service.put_container(container)
+
+        start = time.time()
+        _backup(service, container, names, data)
+        backup_time = time.time() - start
+        start = time.time()
+        _restore(service, container, names)
+        restore_time = time.time() - start
+        print('concurrency %(concurrency)3d: backup %(backup).1f MiB/s, '
+              'restore %(restore).1f MiB/s' %
+              {'concurrency': concurrency,
+               'backup': total / backup_time,
+               'restore': total / restore_time})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure volume listings filtered on metadata.
+
+The database is filled with --volumes volumes carrying --keys metadata
+pairs each, key<n> having one of --values values. Listings are then timed
+with filters on one to three of those pairs, e.g.:
+
+    volume_metadata_filter_bench.py \\
+        --connection mysql+pymysql://u:p@localhost/bench
+
+The database is created with the cinder schema if needed, --no-populate
+reuses the volumes of a previous run.
+"""
+
+import argparse
+import datetime
+import time
+import uuid
+
+from oslo_config import cfg
+
+from cinder import context
+from cinder import db
+from cinder.db import migration
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
+
+CONF = cfg.CONF
+BATCH_SIZE = 1000
+
+
+def _populate(args):
+    session = sqlalchemy_api.get_session()
+    now = datetime.datetime.utcnow()
+    for start in range(0, args.volumes, BATCH_SIZE):
+        volumes = []
+        metadata = []
+        for i in range(start, min(start + BATCH_SIZE, args.volumes)):
+            volume_id = str(uuid.uuid4())
+            volumes.append({'id': volume_id, 'project_id': args.project,
+                            'size': 1, 'status': 'available',
+                            'created_at': now, 'deleted': False})
+            for key in range(args.keys):
+                metadata.append({'volume_id': volume_id,
+                                 'key': 'key%d' % key,
+                                 'value': 'value%d' % ((i + key) %
+                                                       args.values),
+                                 'created_at': now, 'deleted': False})
+        with session.begin():
+            session.execute(models.Volume.__table__.insert(), volumes)
+            session.execute(models.VolumeMetadata.__table__.insert(),
+                            metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connection',
+                        default='sqlite:////tmp/cinder-metadata-bench.sqlite',
+                        help='SQLAlchemy URL of the database to use')
+    parser.add_argument('--volumes', type=int, default=100000,
+                        help='Number of volumes to create')
+    parser.add_argument('--keys', type=int, default=10,
+                        help='Number of metadata pairs of each volume')
+    parser.add_argument('--values', type=int, default=100,
+                        help='Number of distinct values of each key')
+    parser.add_argument('--limit', type=int, default=1000,
+                        help='Page size of the listings')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of times each listing is run')
+    parser.add_argument('--project', default='metadata-bench',
+                        help='Project owning the volumes')
+    parser.add_argument('--no-populate', dest='populate',
+                        action='store_false',
+                        help='Do not create the volumes')
+    args = parser.parse_args()
+
+    CONF([], project='cinder')
+    CONF.set_override('connection', args.connection, group='database')
+    migration.db_sync()
+    if args.populate:
+        start = time.time()
+        _populate(args)
+        print('Created %d volumes in %.2fs' % (args.volumes,
+                                               time.time() - start))
+
+    ctxt = context.get_admin_context()
+    for pairs in range(1, 4):
+        # key<n> = value<n> pairs, which the same volumes all have
+        metadata = {'key%d' % key: 'value%d' % key for key in range(pairs)}
+        filters = {'metadata': metadata, 'project_id': args.project}
+        start = time.time()
+        for _i in range(args.repeat):
+            volumes = db.volume_get_all(ctxt, None, args.limit,
+                                        filters=filters, columns_to_join=[])
+        elapsed = (time.time() - start) / args.repeat
+        print('%(pairs)d metadata pairs: %(count)d volumes in %(ms).1fms' %
+              {'pairs': pairs, 'count': len(volumes), 'ms': elapsed * 1000})
+
+
+if __name__ == '__main__':
+    main()